@@ -1,17 +1,28 @@
 """Single Flask app with all API services."""
-from flask import Flask, request, jsonify, redirect, render_template_string
+from flask import Flask, Response, request, jsonify, redirect, render_template_string
 from typing import Dict, Any
 from base_api import BaseAPI
+from route_dispatch import compile_endpoint
+from rate_limiter import rate_limit_levels
+from http_transport import pool_stats
+from metrics import register_collector, render as render_metrics, start_flusher
+from conditional_cache import validator_families
+from status_snapshot import StatusSnapshot
+from service_registry import ServiceRegistry, deferred_warm_up
+from async_http import close_shared_client
 from apis.spotify.spotify_api import SpotifyAPI
 from apis.google.google_api import GoogleAPI
 from apis.whatsapp.whatsapp_server_api import WhatsAppServerAPI
+from apis.whatsapp.whatsapp_proxy_api import WhatsAppProxyAPI
 print("=== WHATSAPP_SERVER_API IMPORTED SUCCESSFULLY ===")
 from apis.meta.facebook_api import FacebookAPI
 from apis.meta.instagram_api import InstagramAPI
 from apis.files.files_base_api import FilesBaseAPI
+import atexit
 import json
 import sys
 import os
+import time
 
 # Set UTF-8 encoding for stdout/stderr
 if sys.stdout.encoding != 'utf-8':
@@ -48,30 +59,60 @@ def load_meta_credentials():
     
     return services
 
-# Initialize all services
-meta_services = load_meta_credentials()
+def load_whatsapp_service():
+    """Create the WhatsApp Personal service for this process.
+    
+    WHATSAPP_MODE selects how it is served:
+    - local: run the Selenium scraper in this process (single-process servers)
+    - sidecar: proxy to the one process that owns the browser (WHATSAPP_SIDECAR_URL)
+    - disabled: do not register WhatsApp routes
+    """
+    mode = os.environ.get('WHATSAPP_MODE', 'local')
+    if mode == 'disabled':
+        print("=== WHATSAPP_PERSONAL DISABLED ===")
+        return None
+    if mode == 'sidecar':
+        sidecar_url = os.environ.get('WHATSAPP_SIDECAR_URL', 'http://127.0.0.1:8082')
+        print(f"=== WHATSAPP_PERSONAL PROXIED TO SIDECAR: {sidecar_url} ===")
+        return WhatsAppProxyAPI(sidecar_url)
+    
+    print("=== INITIALIZING WHATSAPP_PERSONAL ===")
+    try:
+        whatsapp_personal = WhatsAppServerAPI()
+        print("=== WHATSAPP_PERSONAL INITIALIZED SUCCESSFULLY ===")
+        return whatsapp_personal
+    except Exception as e:
+        print(f"=== ERROR INITIALIZING WHATSAPP_PERSONAL: {e} ===")
+        import traceback
+        print(f"=== TRACEBACK: {traceback.format_exc()} ===")
+        return None
 
-# Initialize personal WhatsApp API
-print("=== INITIALIZING WHATSAPP_PERSONAL ===")
-try:
-    whatsapp_personal = WhatsAppServerAPI()
-    print("=== WHATSAPP_PERSONAL INITIALIZED SUCCESSFULLY ===")
-except Exception as e:
-    print(f"=== ERROR INITIALIZING WHATSAPP_PERSONAL: {e} ===")
-    import traceback
-    print(f"=== TRACEBACK: {traceback.format_exc()} ===")
-    whatsapp_personal = None
+# Initialize all services. Construction only reads config and saved tokens; the
+# slow part (token refresh, WhatsApp session restore) runs in the background.
+with deferred_warm_up():
+    meta_services = load_meta_credentials()
+    whatsapp_personal = load_whatsapp_service()
+    files_api = FilesBaseAPI()
 
-# Initialize Files API
-files_api = FilesBaseAPI()
+    services: Dict[str, Any] = {
+        'spotify': SpotifyAPI(),
+        'google': GoogleAPI(),
+        **({'whatsapp_personal': whatsapp_personal} if whatsapp_personal else {}),
+        'files': files_api,
+        **meta_services
+    }
+
+service_registry = ServiceRegistry()
+for name in services:
+    service_registry.add(name, services[name])
+service_registry.start()
+# Close the worker's long-lived async HTTP client on exit (gunicorn workers exit via sys.exit)
+service_registry.on_shutdown(close_shared_client)
+atexit.register(service_registry.shutdown)
 
-services: Dict[str, Any] = {
-    'spotify': SpotifyAPI(),
-    'google': GoogleAPI(),
-    'whatsapp_personal': whatsapp_personal,
-    'files': files_api,
-    **meta_services
-}
+# /health and the dashboard read service status from here, never from the services
+status_snapshot = StatusSnapshot(services, registry=service_registry)
+status_snapshot.start()
 
 def setup_routes():
     """Setup all routes dynamically."""
@@ -95,6 +136,23 @@ def setup_routes():
         """Health check endpoint."""
         return jsonify(get_health_status())
     
+    @app.route('/livez')
+    def livez():
+        """Liveness: the process is up and serving requests."""
+        return jsonify({"status": "alive", "uptime_seconds": round(time.time() - service_registry.started_at, 1)})
+    
+    @app.route('/readyz')
+    def readyz():
+        """Readiness: 503 while any service is still constructing or restoring."""
+        overall = service_registry.overall()
+        body = {"status": overall, "services": service_registry.readiness()}
+        return jsonify(body), 503 if overall == 'starting' else 200
+    
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus text exposition of route, upstream, cache and WhatsApp metrics."""
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+    
     
     
     # Setup routes for each service
@@ -102,99 +160,19 @@ def setup_routes():
         print(f"=== SETTING UP ROUTES FOR: {service_name} ===")
         setup_service_routes(service_name, service)
 
-def create_api_route_handler(handler, service, service_name: str):
-    """Create a generic API route handler with common authentication logic."""
-    def route_handler():
-        """Generic API route handler."""
-        print(f"=== CREATE_API_ROUTE_HANDLER CALLED for {service_name} ===")
-        # Special handling for WhatsApp Personal API
-        if service_name == 'whatsapp_personal':
-            # Extract query parameters for WhatsApp Personal API
-            if hasattr(handler, '__name__'):
-                if 'get_last_messages' in handler.__name__:
-                    print(f"=== FLASK ROUTE: get_last_messages called ===")
-                    limit = request.args.get('limit', 1, type=int)
-                    chat = request.args.get('chat')
-                    print(f"=== FLASK ROUTE: limit={limit}, chat='{chat}' ===")
-                    # Properly decode URL-encoded chat names (especially Hebrew)
-                    if chat:
-                        import urllib.parse
-                        chat = urllib.parse.unquote(chat)
-                        print(f"=== FLASK ROUTE: decoded chat='{chat}' ===")
-                    print(f"=== FLASK ROUTE: calling handler ===")
-                    result = handler(limit=limit, chat=chat)
-                    print(f"=== FLASK ROUTE: handler returned = {result} ===")
-                elif 'get_chats' in handler.__name__:
-                    limit = request.args.get('limit', 5, type=int)
-                    result = handler(limit=limit)
-                else:
-                    result = handler()
-            else:
-                result = handler()
-            
-            # Check if result is a string (HTML) or dict (JSON)
-            if isinstance(result, str):
-                return result, 200
-            else:
-                status_code = 200 if 'error' not in result else 500
-                return jsonify(result), status_code
-        
-        # Special handling for Files API (no OAuth required)
-        if service_name == 'files':
-            # Extract query parameters for Files API
-            if hasattr(handler, '__name__'):
-                if 'read' in handler.__name__:
-                    filename = request.args.get('filename')
-                    if not filename:
-                        return jsonify({"success": False, "error": "filename parameter required"}), 400
-                    result = handler(filename)
-                elif 'search' in handler.__name__:
-                    query = request.args.get('query')
-                    if not query:
-                        return jsonify({"success": False, "error": "query parameter required"}), 400
-                    result = handler(query)
-                elif 'list' in handler.__name__:
-                    extension = request.args.get('extension')
-                    result = handler(extension)
-                elif 'create' in handler.__name__ or 'update' in handler.__name__:
-                    data = request.get_json()
-                    if not data:
-                        return jsonify({"success": False, "error": "JSON data required"}), 400
-                    filename = data.get('filename')
-                    content = data.get('content')
-                    if not filename or content is None:
-                        return jsonify({"success": False, "error": "filename and content required"}), 400
-                    result = handler(filename, content)
-                elif 'delete' in handler.__name__:
-                    filename = request.args.get('filename')
-                    if not filename:
-                        return jsonify({"success": False, "error": "filename parameter required"}), 400
-                    result = handler(filename)
-                else:
-                    result = handler()
-            else:
-                result = handler()
-            status_code = 200 if 'error' not in result else 500
-            return jsonify(result), status_code
-        
-        # Standard OAuth API handling
-        if not service.is_authenticated():
-            return jsonify({"error": f"{service_name.title()} authentication required"}), 401
-        
-        result = handler()
-        status_code = 200 if 'error' not in result else 500
-        return jsonify(result), status_code
-    
-    return route_handler
-
 def setup_service_routes(service_name: str, service):
     """Setup routes for a specific service."""
     
+    ready_guard = service_registry.readiness_guard(service_name)
+    
     # Special handling for WhatsApp Personal API (no OAuth)
     if service_name == 'whatsapp_personal':
         # Add QR code endpoint
         def qr_code_handler():
             """Get QR code for WhatsApp Web authentication."""
+            denied = ready_guard()
+            if denied is not None:
+                return denied
             try:
                 result = service.get_qr_code()
                 if 'qr_code' in result and result.get('success'):
@@ -214,6 +192,9 @@ def setup_service_routes(service_name: str, service):
         # Add page info endpoint
         def page_info_handler():
             """Get detailed page information for debugging."""
+            denied = ready_guard()
+            if denied is not None:
+                return denied
             try:
                 result = service.get_page_info()
                 return jsonify(result)
@@ -275,36 +256,19 @@ def setup_service_routes(service_name: str, service):
         callback_handler.__name__ = f"{service_name}_callback_route"
         app.add_url_rule(f'/{service_name}/callback', f"{service_name}_callback_route", callback_handler)
     
-    # Setup API endpoints for this service
+    # Setup API endpoints for this service, compiling each into a dispatcher once
     endpoints = service.get_endpoints()
     for endpoint_path, endpoint_config in endpoints.items():
-        method = endpoint_config['method'].lower()
-        handler = endpoint_config['handler']
-        
+        method = endpoint_config['method'].upper()
         route_path = f'/{service_name}/{endpoint_path}'
         
         # Create unique function name for each route
-        func_name = f"{service_name}_{endpoint_path.replace('/', '_')}_{method}"
+        func_name = f"{service_name}_{endpoint_path.replace('/', '_')}_{method.lower()}"
+        dispatcher = compile_endpoint(service_name, service, endpoint_path, endpoint_config, func_name,
+                                      ready_guard=ready_guard, route_path=route_path)
         
-        # Create the route handler function dynamically
-        def make_route_handler(h=handler, s=service, sn=service_name):
-            def route_handler():
-                return create_api_route_handler(h, s, sn)()
-            route_handler.__name__ = func_name
-            return route_handler
-        
-        if method == 'get':
-            print(f"=== REGISTERING ROUTE: {route_path} with handler {func_name} ===")
-            app.add_url_rule(route_path, func_name, make_route_handler(), methods=['GET'])
-        elif method == 'post':
-            print(f"=== REGISTERING ROUTE: {route_path} with handler {func_name} ===")
-            app.add_url_rule(route_path, func_name, make_route_handler(), methods=['POST'])
-        elif method == 'put':
-            print(f"=== REGISTERING ROUTE: {route_path} with handler {func_name} ===")
-            app.add_url_rule(route_path, func_name, make_route_handler(), methods=['PUT'])
-        elif method == 'delete':
-            print(f"=== REGISTERING ROUTE: {route_path} with handler {func_name} ===")
-            app.add_url_rule(route_path, func_name, make_route_handler(), methods=['DELETE'])
+        print(f"=== REGISTERING ROUTE: {route_path} with handler {func_name} ===")
+        app.add_url_rule(route_path, func_name, dispatcher, methods=[method])
     
     # Documentation route
     def docs_handler():
@@ -359,11 +323,12 @@ def render_dashboard() -> str:
             <div class="service" style="border-left: 4px solid {{ service.get_service_info().color }};">
                 <h2><span class="service-icon">{{ service.get_service_info().icon }}</span>{{ service.get_service_info().name }} API</h2>
                 <p>{{ service.get_service_info().description }}</p>
-                <p>Status: <span class="status {{ 'authenticated' if service.is_authenticated() else 'not-authenticated' }}">
-                    {{ 'Authenticated' if service.is_authenticated() else 'Not Authenticated' }}
+                {% set authenticated = statuses.get(service_name, {}).get('authenticated') %}
+                <p>Status: <span class="status {{ 'authenticated' if authenticated else 'not-authenticated' }}">
+                    {{ 'Authenticated' if authenticated else 'Not Authenticated' }}
                 </span></p>
                 
-                {% if service.is_authenticated() %}
+                {% if authenticated %}
                     <p>✅ Ready to use - All {{ service.get_service_info().name }} endpoints available</p>
                     {% if service_name == 'whatsapp_personal' %}
                         <a href="/whatsapp_personal/get_status" class="button" style="background: #17a2b8;">📊 Check Status</a>
@@ -388,27 +353,11 @@ def render_dashboard() -> str:
                             <span class="method {{ endpoint_config.method.lower() }}">{{ endpoint_config.method }}</span> 
                             /{{ service_name }}/{{ endpoint_path }} - {{ endpoint_config.description }}
                         </div>
-                        {% if 'params' in endpoint_config %}
+                        {% if endpoint_config.get('params') %}
                         <div class="params">
                             <strong>Parameters:</strong>
-                            {% for param_name, param_desc in endpoint_config.params.items() %}
-                            {% if 'Required:' in param_desc %}
-                            <span class="param required" title="{{ param_desc }}">{{ param_name }}</span>
-                            {% else %}
-                            <span class="param optional" title="{{ param_desc }}">{{ param_name }}</span>
-                            {% endif %}
-                            {% endfor %}
-                        </div>
-                        {% endif %}
-                        {% if endpoint_config.get('parameters') %}
-                        <div class="params">
-                            <strong>Parameters:</strong>
-                            {% for param_name, param_desc in endpoint_config.parameters.items() %}
-                            {% if 'Required:' in param_desc %}
-                            <span class="param required" title="{{ param_desc }}">{{ param_name }}</span>
-                            {% else %}
-                            <span class="param optional" title="{{ param_desc }}">{{ param_name }}</span>
-                            {% endif %}
+                            {% for param_name, param in endpoint_config.params.items() %}
+                            <span class="param {{ 'required' if param.required else 'optional' }}" title="{{ param }}">{{ param_name }}</span>
                             {% endfor %}
                         </div>
                         {% endif %}
@@ -628,7 +577,7 @@ def render_dashboard() -> str:
     </html>
     """
     
-    return render_template_string(template, services=services)
+    return render_template_string(template, services=services, statuses=status_snapshot.get()['services'])
 
 def render_service_docs(service_info: Dict[str, Any], endpoints: Dict[str, Dict[str, Any]], service_name: str) -> str:
     """Render service-specific documentation."""
@@ -655,23 +604,30 @@ def render_service_docs(service_info: Dict[str, Any], endpoints: Dict[str, Dict[
     return template
 
 def get_health_status() -> Dict[str, Any]:
-    """Get overall health status."""
-    service_statuses = {}
-    overall_healthy = True
-    
-    for service_name, service in services.items():
-        status = service.get_status()
-        service_statuses[service_name] = status
-        if not status['authenticated']:
-            overall_healthy = False
-    
+    """Get overall health status from the status snapshot."""
+    snapshot = status_snapshot.get()
+    overall = service_registry.overall()
     return {
-        "status": "healthy" if overall_healthy else "degraded",
-        "services": service_statuses,
+        "status": {"ready": "healthy", "starting": "starting"}.get(overall, "degraded"),
+        "services": snapshot['services'],
         "total_services": len(services),
-        "authenticated_services": sum(1 for s in service_statuses.values() if s['authenticated'])
+        "authenticated_services": snapshot['authenticated_services'],
+        "readiness": service_registry.readiness(),
+        "status_age_seconds": snapshot['age_seconds'],
+        "status_stale": snapshot['stale'],
+        "rate_limits": rate_limit_levels(),
+        "http_pools": pool_stats()
     }
 
+def collect_validator_metrics():
+    """Conditional (ETag / Last-Modified) request outcomes per service for ``/metrics``."""
+    return validator_families({name: dict(service.validators.stats) for name, service in services.items()
+                               if hasattr(service, 'validators')})
+
+register_collector(collect_validator_metrics)
+# Share this worker's samples with the others (gunicorn multi-worker runs only)
+start_flusher()
+
 # Setup all routes
 setup_routes()
 
@@ -683,5 +639,6 @@ if __name__ == '__main__':
         service_info = service.get_service_info()
         print(f"{service_info['icon']} {service_info['name']}: http://127.0.0.1:8081/{service_name}/")
     print("Press Ctrl+C to stop the server")
+    print("ℹ️ Development server - use 'gunicorn -c gunicorn.conf.py wsgi:app' for production")
     
-    app.run(host='0.0.0.0', port=8081, debug=False)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=int(os.environ.get('API_PORT', 8081)), debug=False)
\ No newline at end of file
@@ -0,0 +1,344 @@
+"""
+In-memory metadata catalog for the Files directory
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+from stat import S_ISREG
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Seconds between directory rescans when inotify is unavailable
+CATALOG_POLL_INTERVAL = float(os.environ.get('FILES_CATALOG_POLL_INTERVAL', 2))
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+               IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')
+
+# (mtime_ns, ctime_ns, size): a file whose key is unchanged is not re-read
+StatKey = Tuple[int, int, int]
+
+
+def _inotify_watch(path: Path) -> Optional[int]:
+    """inotify descriptor watching ``path``, or None where inotify isn't available."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(str(path)), _WATCH_MASK) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+def _parse_events(data: bytes) -> List[Tuple[int, str]]:
+    """``(mask, name)`` for each event in an inotify read buffer."""
+    events = []
+    offset = 0
+    while offset + _EVENT_HEADER.size <= len(data):
+        _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+        offset += _EVENT_HEADER.size
+        name = data[offset:offset + length].rstrip(b'\0')
+        offset += length
+        events.append((mask, os.fsdecode(name)))
+    return events
+
+
+class FileCatalog:
+    """Name, size, timestamps and extension of every file in a directory.
+
+    Loaded with one ``scandir`` on first use, then kept current by inotify
+    (or by rescanning every ``CATALOG_POLL_INTERVAL`` seconds) and by
+    ``refresh`` calls for writes made through FilesAPI. If the inotify watch
+    is lost (the directory was removed or replaced, or reading events
+    failed) the watcher switches to polling and ``watch_mode`` says so. Total size and
+    extension counts are updated incrementally, and sorted listings are
+    cached until the next change, so reads never touch the filesystem.
+    ``on_change(name, exists, forced)`` is called, outside the lock, for
+    every file that was added, changed or removed; ``forced`` is set for
+    ``refresh(force=True)``, i.e. writes made by this process.
+    """
+
+    def __init__(self, base_path: Path, on_change: Optional[Callable[[str, bool, bool], None]] = None,
+                 watch: bool = True, poll_interval: float = CATALOG_POLL_INTERVAL):
+        self.base_path = base_path
+        self.on_change = on_change
+        self.watch = watch
+        self.poll_interval = poll_interval
+        self.watch_mode: Optional[str] = None
+        self._entries: Dict[str, Tuple[StatKey, Dict[str, Any]]] = {}
+        self._total_size = 0
+        self._extensions: Dict[str, int] = {}
+        self._listings: Dict[Optional[str], List[Dict[str, Any]]] = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+        self._wake: Optional[Tuple[int, int]] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _key(stat: os.stat_result) -> StatKey:
+        return stat.st_mtime_ns, stat.st_ctime_ns, stat.st_size
+
+    def _info(self, name: str, stat: os.stat_result) -> Dict[str, Any]:
+        suffix = os.path.splitext(name)[1]
+        return {
+            "name": name,
+            "size": stat.st_size,
+            "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
+            "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "extension": suffix,
+            "path": name
+        }
+
+    def start(self) -> None:
+        """Load the catalog and start watching (idempotent)."""
+        self._ensure_loaded()
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            # Watch before scanning, so changes made during the scan are not missed
+            if self.watch:
+                self._start_watcher()
+            for name, stat in self._scan().items():
+                self._put(name, stat)
+            self._loaded = True
+        print(f"📂 Files: Catalog ready ({len(self._entries)} files, {self.watch_mode or 'not watching'})")
+
+    def _scan(self) -> Dict[str, os.stat_result]:
+        files = {}
+        with os.scandir(self.base_path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        files[entry.name] = entry.stat()
+                except OSError:
+                    continue
+        return files
+
+    def _put(self, name: str, stat: os.stat_result) -> None:
+        self._drop(name)
+        info = self._info(name, stat)
+        self._entries[name] = (self._key(stat), info)
+        self._total_size += info["size"]
+        extension = info["extension"] or 'no_extension'
+        self._extensions[extension] = self._extensions.get(extension, 0) + 1
+        self._listings.clear()
+
+    def _drop(self, name: str) -> None:
+        entry = self._entries.pop(name, None)
+        if entry is None:
+            return
+        info = entry[1]
+        self._total_size -= info["size"]
+        extension = info["extension"] or 'no_extension'
+        self._extensions[extension] -= 1
+        if not self._extensions[extension]:
+            del self._extensions[extension]
+        self._listings.clear()
+
+    def _notify(self, changes: List[Tuple[str, bool]], forced: bool = False) -> None:
+        if self.on_change is None:
+            return
+        for name, exists in changes:
+            try:
+                self.on_change(name, exists, forced)
+            except Exception as e:
+                print(f"⚠️ Files: Catalog listener failed for {name}: {e}")
+
+    # Updates
+
+    def refresh(self, name: str, force: bool = False) -> None:
+        """Re-stat one file; listeners hear about it if it changed, or always with ``force``."""
+        self._ensure_loaded()
+        file_path = self.base_path / name
+        try:
+            stat = file_path.stat()
+            exists = S_ISREG(stat.st_mode)
+        except OSError:
+            stat, exists = None, False
+        with self._lock:
+            entry = self._entries.get(name)
+            if exists:
+                changed = entry is None or entry[0] != self._key(stat)
+                if changed:
+                    self._put(name, stat)
+            else:
+                changed = entry is not None
+                self._drop(name)
+        if changed or force:
+            self._notify([(name, exists)], force)
+
+    def rescan(self) -> None:
+        """Diff the whole directory against the catalog (polling, or after an inotify overflow)."""
+        self._ensure_loaded()
+        try:
+            files = self._scan()
+        except OSError:
+            return
+        changes = []
+        with self._lock:
+            for name in list(self._entries):
+                if name not in files:
+                    self._drop(name)
+                    changes.append((name, False))
+            for name, stat in files.items():
+                entry = self._entries.get(name)
+                if entry is None or entry[0] != self._key(stat):
+                    self._put(name, stat)
+                    changes.append((name, True))
+        self._notify(changes)
+
+    # Watching
+
+    def _start_watcher(self) -> None:
+        fd = _inotify_watch(self.base_path)
+        if fd is not None:
+            self.watch_mode = 'inotify'
+            # stop() writes to this pipe to interrupt the poll
+            self._wake = os.pipe()
+        else:
+            self.watch_mode = 'polling'
+        self._thread = threading.Thread(target=self._watch, args=(fd,), name='files-catalog', daemon=True)
+        self._thread.start()
+
+    def _watch(self, fd: Optional[int]) -> None:
+        if fd is not None:
+            self._watch_inotify(fd)
+            if self._stopped.is_set():
+                return
+            # Changes may have been missed while the watch was failing
+            self.watch_mode = 'polling'
+            print(f"⚠️ Files: Catalog watch lost, polling every {self.poll_interval:g}s")
+            try:
+                self.rescan()
+            except Exception as e:
+                print(f"⚠️ Files: Catalog rescan failed: {e}")
+        self._watch_polling()
+
+    def _watch_inotify(self, fd: int) -> None:
+        """Apply inotify events until stopped, or until the watch is gone or fails."""
+        wake_read, wake_write = self._wake
+        try:
+            # poll, unlike select, accepts descriptors above FD_SETSIZE
+            poller = select.poll()
+            poller.register(fd, select.POLLIN)
+            poller.register(wake_read, select.POLLIN)
+            while True:
+                poller.poll()
+                if self._stopped.is_set():
+                    return
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                names = {}
+                for mask, name in _parse_events(data):
+                    if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                        return  # the directory itself is gone, or the watch was removed
+                    if mask & IN_Q_OVERFLOW:
+                        names = None
+                        break
+                    if name:
+                        names[name] = True
+                if names is None:
+                    # Events were dropped; only a full diff is reliable
+                    self.rescan()
+                    continue
+                for name in names:
+                    self.refresh(name)
+        except Exception as e:
+            print(f"⚠️ Files: Catalog watcher failed: {e}")
+        finally:
+            with self._lock:
+                self._wake = None
+                for descriptor in (fd, wake_read, wake_write):
+                    os.close(descriptor)
+
+    def _watch_polling(self) -> None:
+        while not self._stopped.wait(self.poll_interval):
+            if not self.base_path.is_dir():
+                continue  # removed; picked up again if it is recreated
+            try:
+                self.rescan()
+            except Exception as e:
+                print(f"⚠️ Files: Catalog rescan failed: {e}")
+
+    def stop(self) -> None:
+        """Stop the watcher thread and wait for it to exit."""
+        self._stopped.set()
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        with self._lock:
+            if self._wake is not None:
+                os.write(self._wake[1], b'\0')
+        thread.join(timeout=5)
+
+    # Reads
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """A copy of one file's info, looking it up on disk if the catalog hasn't seen it yet."""
+        self._ensure_loaded()
+        entry = self._entries.get(name)
+        if entry is None:
+            self.refresh(name)
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+        return dict(entry[1])
+
+    def names(self) -> List[str]:
+        """Names of every file in the catalog."""
+        self._ensure_loaded()
+        return list(self._entries)
+
+    def listing(self, extension: Optional[str] = None) -> List[Dict[str, Any]]:
+        """File infos, newest first, optionally only one extension (cached until the next change)."""
+        self._ensure_loaded()
+        with self._lock:
+            files = self._listings.get(extension)
+            if files is None:
+                files = [info for _, info in self._entries.values()
+                         if extension is None or info["extension"] == extension]
+                files.sort(key=lambda x: x.get('modified', ''), reverse=True)
+                self._listings[extension] = files
+        return list(files)
+
+    def stats(self) -> Dict[str, Any]:
+        """File count, total size and extension counts."""
+        self._ensure_loaded()
+        with self._lock:
+            return {
+                "total_files": len(self._entries),
+                "total_size_bytes": self._total_size,
+                "total_size_mb": round(self._total_size / (1024 * 1024), 2),
+                "extensions": dict(self._extensions)
+            }
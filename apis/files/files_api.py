@@ -3,19 +3,33 @@ Files API - CRUD operations on local files
 """
 
 import os
+import re
 import json
 from pathlib import Path
-from typing import Dict, List, Any, Optional
-from datetime import datetime
+from typing import Dict, Iterator, List, Any, Optional
+from .file_catalog import FileCatalog
+from .parallel_scan import PATTERN_MODES, SEARCH_TIMEOUT, ScanTimeout, can_scan_bytes, query_pattern, scan_files
+from .search_index import DEFAULT_INDEX_PATH, INDEXED_SUFFIX, SearchIndex
 
 
 class FilesAPI:
     """API for CRUD operations on local files in the local-data directory."""
     
-    def __init__(self, base_path: str = "local-data"):
+    def __init__(self, base_path: str = "local-data", index_path: str = DEFAULT_INDEX_PATH):
         self.base_path = Path(base_path)
         self.base_path.mkdir(exist_ok=True)
+        self.search_index = SearchIndex(self.base_path, index_path)
+        self.catalog = FileCatalog(self.base_path, on_change=self._on_file_change)
+        # Loaded up front: changes are only reported once the catalog has a baseline
+        self.catalog.start()
         
+    def _on_file_change(self, filename: str, exists: bool, forced: bool = False) -> None:
+        """Keep the search index in step with the catalog, including edits made outside the API."""
+        if exists:
+            self.search_index.update(filename, force=forced)
+        else:
+            self.search_index.remove(filename)
+    
     def _get_file_path(self, filename: str) -> Path:
         """Get the full path for a file, ensuring it's within the base directory."""
         # Prevent directory traversal attacks
@@ -29,31 +43,13 @@ class FilesAPI:
     
     def _get_file_info(self, file_path: Path) -> Dict[str, Any]:
         """Get file information."""
-        if not file_path.exists():
-            return {}
-            
-        stat = file_path.stat()
-        return {
-            "name": file_path.name,
-            "size": stat.st_size,
-            "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-            "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-            "extension": file_path.suffix,
-            "path": str(file_path.relative_to(self.base_path))
-        }
+        return self.catalog.get(file_path.name) or {}
     
     def list_files(self, extension: Optional[str] = None) -> Dict[str, Any]:
         """List all files in the local-data directory."""
         try:
-            files = []
-            for file_path in self.base_path.iterdir():
-                if file_path.is_file():
-                    if extension is None or file_path.suffix == extension:
-                        file_info = self._get_file_info(file_path)
-                        files.append(file_info)
-            
-            # Sort by modified date (newest first)
-            files.sort(key=lambda x: x.get('modified', ''), reverse=True)
+            # Newest first
+            files = self.catalog.listing(extension)
             
             return {
                 "success": True,
@@ -119,6 +115,7 @@ class FilesAPI:
             
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(content)
+            self.catalog.refresh(filename, force=True)
             
             file_info = self._get_file_info(file_path)
             
@@ -152,6 +149,7 @@ class FilesAPI:
             
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(content)
+            self.catalog.refresh(filename, force=True)
             
             file_info = self._get_file_info(file_path)
             
@@ -184,6 +182,7 @@ class FilesAPI:
                 }
             
             file_path.unlink()
+            self.catalog.refresh(filename, force=True)
             
             return {
                 "success": True,
@@ -195,36 +194,105 @@ class FilesAPI:
                 "error": f"Failed to delete file: {str(e)}"
             }
     
-    def search_files(self, query: str) -> Dict[str, Any]:
-        """Search for files containing the query string."""
+    def _match_file(self, file_path: Path, query_lower: str,
+                    line_numbers: Optional[List[int]] = None) -> Optional[Dict[str, Any]]:
+        """File info with its lines containing the query (only ``line_numbers`` if given)."""
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                lines = f.read().split('\n')
+        except Exception:
+            # Skip files that can't be read
+            return None
+        
+        if line_numbers is None:
+            line_numbers = range(1, len(lines) + 1)
+        matching_lines = []
+        for i in line_numbers:
+            if i <= len(lines) and query_lower in lines[i - 1].lower():
+                matching_lines.append({
+                    "line_number": i,
+                    "line": lines[i - 1].strip()
+                })
+        if not matching_lines:
+            return None
+        
+        file_info = self._get_file_info(file_path)
+        file_info["matching_lines"] = matching_lines
+        file_info["match_count"] = len(matching_lines)
+        return file_info
+    
+    def _text_files(self, extensions: Optional[List[str]] = None) -> List[Path]:
+        """Every searchable file in the directory (``.txt``, or the given extensions)."""
+        suffixes = set(extensions or [INDEXED_SUFFIX])
+        return [self.base_path / name for name in self.catalog.names()
+                if os.path.splitext(name)[1] in suffixes]
+    
+    def _scan_results(self, pattern: bytes, flags: int, limit: Optional[int],
+                      extensions: Optional[List[str]] = None,
+                      timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Search results from a parallel byte scan of every searchable file."""
+        for file_path, lines in scan_files(self._text_files(extensions), pattern, flags, limit, timeout):
+            file_info = self._get_file_info(file_path)
+            file_info["matching_lines"] = [{"line_number": i, "line": line} for i, line in lines]
+            file_info["match_count"] = len(lines)
+            yield file_info
+    
+    def iter_search_results(self, query: str, limit: Optional[int] = None, mode: str = "substring",
+                            extensions: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield search results one file at a time, unsorted, stopping after ``limit`` files.
+        
+        Substring queries on ``.txt`` files only read the files and lines
+        the search index points at. Queries the index cannot narrow (no word
+        characters, or only words found in most files), other extensions,
+        ``scan`` mode and ``regex``/``glob`` patterns scan every file in
+        parallel. Patterns run under the ``SEARCH_TIMEOUT`` budget and raise
+        ``ScanTimeout`` when it runs out.
+        """
+        query_lower = query.lower()
+        extensions = self._normalize_extensions(extensions)
+        candidates = None
+        if mode == "substring" and set(extensions or [INDEXED_SUFFIX]) == {INDEXED_SUFFIX}:
+            candidates = self.search_index.candidates(query)
+        
+        if candidates is not None:
+            results = (self._match_file(self.base_path / name, query_lower, line_numbers)
+                       for name, line_numbers in candidates.items())
+        elif mode in PATTERN_MODES:
+            pattern, flags = query_pattern(query, mode)
+            results = self._scan_results(pattern, flags, limit, extensions, SEARCH_TIMEOUT)
+        elif can_scan_bytes(query):
+            results = self._scan_results(re.escape(query.encode()), re.IGNORECASE, limit, extensions)
+        else:
+            results = (self._match_file(file_path, query_lower) for file_path in self._text_files(extensions))
+        
+        found = 0
+        for file_info in results:
+            if file_info is None:
+                continue
+            yield file_info
+            found += 1
+            if limit is not None and found >= limit:
+                return
+    
+    @staticmethod
+    def _normalize_extensions(extensions: Optional[List[str]]) -> Optional[List[str]]:
+        """``['txt', '.md']`` -> ``['.txt', '.md']``; None or empty means ``.txt`` only."""
+        if not extensions:
+            return None
+        return [ext if ext.startswith('.') else f".{ext}" for ext in extensions]
+    
+    def search_files(self, query: str, limit: Optional[int] = None, mode: str = "substring",
+                     extensions: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Search for files containing the query string, regex or glob."""
         try:
             results = []
-            query_lower = query.lower()
-            
-            for file_path in self.base_path.iterdir():
-                if file_path.is_file() and file_path.suffix == '.txt':
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                        
-                        if query_lower in content.lower():
-                            file_info = self._get_file_info(file_path)
-                            # Find the line containing the query
-                            lines = content.split('\n')
-                            matching_lines = []
-                            for i, line in enumerate(lines, 1):
-                                if query_lower in line.lower():
-                                    matching_lines.append({
-                                        "line_number": i,
-                                        "line": line.strip()
-                                    })
-                            
-                            file_info["matching_lines"] = matching_lines
-                            file_info["match_count"] = len(matching_lines)
-                            results.append(file_info)
-                    except Exception:
-                        # Skip files that can't be read
-                        continue
+            timed_out = False
+            try:
+                for file_info in self.iter_search_results(query, limit, mode, extensions):
+                    results.append(file_info)
+            except ScanTimeout:
+                # Keep what was found within the budget
+                timed_out = True
             
             # Sort by match count (most matches first)
             results.sort(key=lambda x: x.get('match_count', 0), reverse=True)
@@ -233,7 +301,13 @@ class FilesAPI:
                 "success": True,
                 "query": query,
                 "results": results,
-                "total_matches": len(results)
+                "total_matches": len(results),
+                "timed_out": timed_out
+            }
+        except re.error as e:
+            return {
+                "success": False,
+                "error": f"Invalid search pattern: {str(e)}"
             }
         except Exception as e:
             return {
@@ -241,30 +315,55 @@ class FilesAPI:
                 "error": f"Failed to search files: {str(e)}"
             }
     
-    def get_file_stats(self) -> Dict[str, Any]:
-        """Get statistics about files in the directory."""
+    def ranked_search(self, query: str, offset: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """BM25-ranked search with ``"phrase"`` and ``prefix*`` clauses, one page at a time."""
         try:
-            files = list(self.base_path.iterdir())
-            file_count = len([f for f in files if f.is_file()])
+            total, hits = self.search_index.rank(query, offset, limit)
             
-            total_size = 0
-            extensions = {}
+            results = []
+            for name, score, line_numbers in hits:
+                file_path = self.base_path / name
+                file_info = self._match_lines(file_path, line_numbers)
+                file_info["score"] = round(score, 4)
+                results.append(file_info)
             
-            for file_path in files:
-                if file_path.is_file():
-                    total_size += file_path.stat().st_size
-                    ext = file_path.suffix or 'no_extension'
-                    extensions[ext] = extensions.get(ext, 0) + 1
+            return {
+                "success": True,
+                "query": query,
+                "mode": "ranked",
+                "results": results,
+                "total_matches": total,
+                "offset": offset,
+                "limit": limit
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Failed to search files: {str(e)}"
+            }
+    
+    def _match_lines(self, file_path: Path, line_numbers: List[int]) -> Dict[str, Any]:
+        """File info with the text of ``line_numbers`` (the hits of a ranked result)."""
+        file_info = self._get_file_info(file_path)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                lines = f.read().split('\n')
+        except Exception:
+            lines = []
+        file_info["matching_lines"] = [{"line_number": i, "line": lines[i - 1].strip()}
+                                       for i in line_numbers if i <= len(lines)]
+        file_info["match_count"] = len(line_numbers)
+        return file_info
+    
+    def get_file_stats(self) -> Dict[str, Any]:
+        """Get statistics about files in the directory."""
+        try:
+            stats = self.catalog.stats()
+            stats["base_path"] = str(self.base_path)
             
             return {
                 "success": True,
-                "stats": {
-                    "total_files": file_count,
-                    "total_size_bytes": total_size,
-                    "total_size_mb": round(total_size / (1024 * 1024), 2),
-                    "extensions": extensions,
-                    "base_path": str(self.base_path)
-                }
+                "stats": stats
             }
         except Exception as e:
             return {
@@ -2,8 +2,11 @@
 Files Base API - Integration with the main API server
 """
 
-from typing import Dict, List, Any
+import re
+from typing import Dict, Iterator, List, Any, Union
+from param_schema import Param, ParamError
 from .files_api import FilesAPI
+from .parallel_scan import PATTERN_MODES, query_pattern
 
 
 class FilesBaseAPI:
@@ -25,7 +28,7 @@ class FilesBaseAPI:
                 "description": "List all files in local-data directory",
                 "handler": self.list_files,
                 "params": {
-                    "extension": "Optional: File extension filter (e.g., '.txt')"
+                    "extension": Param(str, description="File extension filter (e.g., '.txt')")
                 }
             },
             "read": {
@@ -33,7 +36,7 @@ class FilesBaseAPI:
                 "description": "Read content of a specific file",
                 "handler": self.read_file,
                 "params": {
-                    "filename": "Required: Name of the file to read"
+                    "filename": Param(str, required=True, description="Name of the file to read")
                 }
             },
             "create": {
@@ -41,8 +44,8 @@ class FilesBaseAPI:
                 "description": "Create a new file with content",
                 "handler": self.create_file,
                 "params": {
-                    "filename": "Required: Name of the file to create",
-                    "content": "Required: Content to write to the file"
+                    "filename": Param(str, required=True, description="Name of the file to create"),
+                    "content": Param(str, required=True, allow_empty=True, description="Content to write to the file")
                 }
             },
             "update": {
@@ -50,8 +53,8 @@ class FilesBaseAPI:
                 "description": "Update content of an existing file",
                 "handler": self.update_file,
                 "params": {
-                    "filename": "Required: Name of the file to update",
-                    "content": "Required: New content for the file"
+                    "filename": Param(str, required=True, description="Name of the file to update"),
+                    "content": Param(str, required=True, allow_empty=True, description="New content for the file")
                 }
             },
             "delete": {
@@ -59,7 +62,7 @@ class FilesBaseAPI:
                 "description": "Delete a file",
                 "handler": self.delete_file,
                 "params": {
-                    "filename": "Required: Name of the file to delete"
+                    "filename": Param(str, required=True, description="Name of the file to delete")
                 }
             },
             "search": {
@@ -67,7 +70,16 @@ class FilesBaseAPI:
                 "description": "Search for files containing specific text",
                 "handler": self.search_files,
                 "params": {
-                    "query": "Required: Text to search for in files"
+                    "query": Param(str, required=True, description="Text to search for in files"),
+                    "stream": Param(bool, default=False, description="Stream matches as they are found (unsorted)"),
+                    "mode": Param(str, default="substring", choices=("substring", "ranked", "scan", "regex", "glob"),
+                                  description="'ranked': BM25 over words, with \"phrase\" and prefix* clauses; "
+                                              "'scan': substring search without the index; "
+                                              "'regex'/'glob': match lines against a pattern"),
+                    "extensions": Param(str, description="Comma-separated extensions to search (default '.txt')"),
+                    "offset": Param(int, default=0, min=0, description="Skip this many ranked results"),
+                    "limit": Param(int, min=1, max=100,
+                                   description="Ranked results per page (default 20), or stop after this many files")
                 }
             },
             "stats": {
@@ -133,9 +145,25 @@ class FilesBaseAPI:
         """Delete file endpoint."""
         return self.files_api.delete_file(filename)
     
-    def search_files(self, query: str) -> Dict[str, Any]:
-        """Search files endpoint."""
-        return self.files_api.search_files(query)
+    def search_files(self, query: str, stream: bool = False, mode: str = "substring", extensions: str = None,
+                     offset: int = 0, limit: int = None) -> Union[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        """Search files endpoint (ranked pages, or matches streamed when ``stream`` is set)."""
+        if mode == "ranked":
+            # Ranked results come from the .txt index as one scored page
+            if stream or extensions:
+                raise ParamError("stream and extensions are not supported with mode=ranked")
+            return self.files_api.ranked_search(query, offset, limit or 20)
+        if mode in PATTERN_MODES:
+            # Reject a bad pattern before a stream has sent its 200
+            try:
+                query_pattern(query, mode)
+            except re.error as e:
+                raise ParamError(f"Invalid search pattern: {e}")
+        if extensions:
+            extensions = [ext.strip() for ext in extensions.split(',') if ext.strip()]
+        if stream:
+            return self.files_api.iter_search_results(query, limit, mode, extensions)
+        return self.files_api.search_files(query, limit, mode, extensions)
     
     def get_file_stats(self) -> Dict[str, Any]:
         """Get file stats endpoint."""
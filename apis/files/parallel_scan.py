@@ -0,0 +1,319 @@
+"""
+Parallel mmap scan for Files search
+"""
+
+import mmap
+import multiprocessing
+import os
+import re
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Scan processes per server process: gunicorn workers share the cores between them
+SCAN_WORKERS = int(os.environ.get('FILES_SCAN_WORKERS',
+                                  max(1, (os.cpu_count() or 1) // max(int(os.environ.get('API_WORKERS', 1)), 1))))
+# Bytes handed to one worker task: big files are split on line boundaries,
+# small files are batched together
+SCAN_CHUNK_BYTES = int(os.environ.get('FILES_SCAN_CHUNK_BYTES', 4 * 1024 * 1024))
+# Smaller files are read as bytes in one call; mapping them costs more
+MMAP_MIN_BYTES = 256 * 1024
+# Below this many bytes in total, pool round-trips cost more than they save
+PARALLEL_MIN_BYTES = int(os.environ.get('FILES_SCAN_PARALLEL_MIN_BYTES', 8 * 1024 * 1024))
+# Seconds a regex or glob search may run before it is abandoned
+SEARCH_TIMEOUT = float(os.environ.get('FILES_SEARCH_TIMEOUT', 5))
+# Compiled patterns kept per process
+PATTERN_CACHE_SIZE = int(os.environ.get('FILES_PATTERN_CACHE_SIZE', 128))
+PATTERN_MODES = ('regex', 'glob')
+
+# (path, start offset, end offset)
+Range = Tuple[str, int, int]
+# (path, start offset, newlines in the range, [(line index within the range, line bytes)])
+ChunkResult = Tuple[str, int, int, List[Tuple[int, bytes]]]
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class ScanTimeout(Exception):
+    """Raised when a scan runs past its time budget."""
+
+
+def can_scan_bytes(query: str) -> bool:
+    """Byte patterns only fold ASCII case; other queries need the decoded scan."""
+    return query.isascii()
+
+
+@lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def compile_pattern(pattern: bytes, flags: int) -> 're.Pattern[bytes]':
+    """Compile a byte pattern once per process; raises ``re.error`` for bad patterns."""
+    return re.compile(pattern, flags)
+
+
+def glob_to_regex(query: str) -> bytes:
+    """Translate a glob (``*``, ``?``, ``[...]``, ``[!...]``) into an unanchored single-line byte regex."""
+    parts = []
+    i, n = 0, len(query)
+    while i < n:
+        char = query[i]
+        i += 1
+        if char == '*':
+            parts.append(r'[^\n]*')
+        elif char == '?':
+            parts.append(r'[^\n]')
+        elif char == '[':
+            # A ']' right after '[' or '[!' is part of the set
+            first = i + 1 if query[i:i + 1] == '!' else i
+            end = query.find(']', first + 1 if query[first:first + 1] == ']' else first)
+            if end == -1:
+                parts.append(re.escape(char))
+                continue
+            body = query[i:end]
+            i = end + 1
+            negate = body.startswith('!')
+            body = body[1:] if negate else body
+            body = body.replace('\\', r'\\').replace('^', r'\^').replace('[', r'\[').replace(']', r'\]')
+            parts.append(f"[^\\n{body}]" if negate else f"[{body}]")
+        else:
+            parts.append(re.escape(char))
+    return ''.join(parts).encode()
+
+
+def query_pattern(query: str, mode: str) -> Tuple[bytes, int]:
+    """Byte pattern and flags for a ``regex``, ``glob`` or substring query, validated.
+
+    Matching is case-insensitive for ASCII letters. ``^`` and ``$`` anchor
+    at line boundaries.
+    """
+    if mode == 'regex':
+        pattern = query.encode()
+    elif mode == 'glob':
+        pattern = glob_to_regex(query)
+    else:
+        pattern = re.escape(query.encode())
+    flags = re.IGNORECASE | re.MULTILINE
+    compile_pattern(pattern, flags)
+    return pattern, flags
+
+
+def scan_chunk(path: str, start: int, end: int, pattern: bytes, flags: int = re.IGNORECASE) -> ChunkResult:
+    """Lines in ``[start, end)`` of ``path`` matching ``pattern``, without decoding the file.
+
+    ``start`` must be 0 or just past a newline. Large files are mapped and
+    only matching lines are copied out; newlines are counted so the caller
+    can number lines.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return path, start, 0, []
+        if size < MMAP_MIN_BYTES:
+            return path, start, *_scan_buffer(f.read(), start, min(end, size), pattern, flags)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return path, start, *_scan_buffer(mm, start, min(end, size), pattern, flags)
+
+
+def _scan_buffer(data, start: int, end: int, pattern: bytes, flags: int) -> Tuple[int, List[Tuple[int, bytes]]]:
+    """Newlines in ``data[start:end]`` and the matching lines, for a bytes object or a mapping."""
+    regex = compile_pattern(pattern, flags)
+    hits: List[Tuple[int, bytes]] = []
+    line, counted, pos = 0, start, start
+    while pos < end:
+        match = regex.search(data, pos, end)
+        if match is None:
+            break
+        line_start = data.rfind(b'\n', start, match.start()) + 1 or start
+        line_end = data.find(b'\n', match.end(), end)
+        if line_end == -1:
+            line_end = end
+        line += data[counted:line_start].count(b'\n')
+        counted = line_start
+        hits.append((line, data[line_start:line_end]))
+        # One hit per line, as the line-based search reports
+        pos = line_end + 1
+    line += data[counted:end].count(b'\n')
+    return line, hits
+
+
+def _chunks(path: Path, size: int) -> List[Tuple[int, int]]:
+    """Split a file into byte ranges of about ``SCAN_CHUNK_BYTES`` ending on newlines."""
+    if size <= SCAN_CHUNK_BYTES:
+        return [(0, size)]
+    ranges = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            boundary = mm.find(b'\n', min(start + SCAN_CHUNK_BYTES, size))
+            end = size if boundary == -1 else boundary + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Forking a threaded server process can copy a lock another thread holds;
+            # forkserver children come from a clean single-threaded process instead
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context('spawn')
+            _executor = ProcessPoolExecutor(max_workers=max(SCAN_WORKERS, 1), mp_context=context)
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    """Drop a broken pool so the next scan starts a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def scan_files(paths: List[Path], pattern: bytes, flags: int = re.IGNORECASE,
+               limit: Optional[int] = None,
+               timeout: Optional[float] = None) -> Iterator[Tuple[Path, List[Tuple[int, str]]]]:
+    """Yield ``(path, [(line number, line)])`` for files with matching lines, unordered.
+
+    Large scans run ``scan_chunk`` across a process pool; small ones run
+    inline. Stops, and cancels queued chunks, once ``limit`` files matched.
+    With a ``timeout`` the scan always runs in the pool, where workers can
+    be interrupted, and raises ``ScanTimeout`` once the budget is spent.
+    """
+    batches: List[List[Range]] = [[]]
+    batch_bytes = 0
+    chunk_counts: Dict[str, int] = {}
+    total = 0
+    for path in paths:
+        try:
+            size = path.stat().st_size
+            ranges = _chunks(path, size)
+        except (OSError, ValueError):
+            # Skip files that can't be read
+            continue
+        total += size
+        chunk_counts[str(path)] = len(ranges)
+        for start, end in ranges:
+            if batch_bytes >= SCAN_CHUNK_BYTES:
+                batches.append([])
+                batch_bytes = 0
+            batches[-1].append((str(path), start, end))
+            batch_bytes += end - start
+
+    if timeout is None and (total < PARALLEL_MIN_BYTES or SCAN_WORKERS <= 1):
+        results = (scan_batch(batch, pattern, flags) for batch in batches)
+    else:
+        results = _pooled(batches, pattern, flags, timeout)
+
+    partial: Dict[str, List[ChunkResult]] = {}
+    found = 0
+    try:
+        for result in (result for batch in results for result in batch):
+            chunks = partial.setdefault(result[0], [])
+            chunks.append(result)
+            if len(chunks) < chunk_counts[result[0]]:
+                continue
+            lines = _number_lines(partial.pop(result[0]))
+            if lines:
+                yield Path(result[0]), lines
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+    finally:
+        close = getattr(results, 'close', None)
+        if close is not None:
+            close()
+
+
+def scan_batch(ranges: List[Range], pattern: bytes, flags: int = re.IGNORECASE,
+               deadline: Optional[float] = None) -> List[ChunkResult]:
+    """``scan_chunk`` over several ranges in one worker task, skipping unreadable files.
+
+    With a ``deadline`` (``time.monotonic()``), raises ``ScanTimeout`` when
+    it passes, even in the middle of a regex match. Deadlines rely on
+    SIGALRM, so they are only set inside pool workers.
+    """
+    if deadline is not None:
+        _arm_deadline(deadline)
+    try:
+        results = []
+        for path, start, end in ranges:
+            try:
+                results.append(scan_chunk(path, start, end, pattern, flags))
+            except (OSError, ValueError):
+                continue
+        return results
+    finally:
+        if deadline is not None:
+            _disarm_deadline()
+
+
+def _raise_timeout(signum, frame):
+    raise ScanTimeout("Search timed out")
+
+
+def _arm_deadline(deadline: float) -> None:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise ScanTimeout("Search timed out")
+    if hasattr(signal, 'setitimer'):
+        # The regex engine checks for signals, so the handler can stop a runaway match
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, remaining)
+
+
+def _disarm_deadline() -> None:
+    if hasattr(signal, 'setitimer'):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def _pooled(batches: List[List[Range]], pattern: bytes, flags: int,
+            timeout: Optional[float] = None) -> Iterator[List[ChunkResult]]:
+    """Batch results in completion order; unfinished batches are cancelled on close."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    executor = _get_executor()
+    try:
+        pending = {executor.submit(scan_batch, batch, pattern, flags, deadline) for batch in batches}
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory) before this scan; retry on a fresh pool
+        _discard_executor(executor)
+        executor = _get_executor()
+        pending = {executor.submit(scan_batch, batch, pattern, flags, deadline) for batch in batches}
+    try:
+        while pending:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                # Running batches stop themselves at the same deadline
+                raise ScanTimeout(f"Search timed out after {timeout:g}s")
+            for future in done:
+                try:
+                    yield future.result()
+                except ScanTimeout:
+                    raise ScanTimeout(f"Search timed out after {timeout:g}s") from None
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _number_lines(chunks: List[ChunkResult]) -> List[Tuple[int, str]]:
+    """Absolute 1-based line numbers and decoded text for one file's chunk hits."""
+    lines = []
+    first_line = 1
+    for _, _, newlines, hits in sorted(chunks, key=lambda chunk: chunk[1]):
+        for line, text in hits:
+            lines.append((first_line + line, text.decode('utf-8', errors='replace').strip()))
+        first_line += newlines
+    return lines
@@ -0,0 +1,372 @@
+"""
+Inverted index for Files search
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from bisect import bisect_right
+from operator import itemgetter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+DEFAULT_INDEX_PATH = os.environ.get('FILES_INDEX_PATH', 'cache/files_index.sqlite')
+INDEXED_SUFFIX = '.txt'
+# A query word found in more than this share of files does not narrow the
+# search; if every word is that broad, scanning the files is cheaper
+BROAD_WORD_SHARE = 0.5
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD = re.compile(r'\w+')
+_CLAUSE = re.compile(r'"([^"]*)"|(\S+)')
+
+# ('term', [word]) | ('prefix', [stem]) | ('phrase', [word, ...])
+Clause = Tuple[str, List[str]]
+
+
+class DocumentIndex:
+    """Word positions of one file and the position each of its lines starts at."""
+
+    __slots__ = ('positions', 'line_starts', 'length')
+
+    def __init__(self, positions: Dict[str, List[int]], line_starts: List[int]):
+        self.positions = positions
+        self.line_starts = line_starts
+        self.length = sum(len(p) for p in positions.values())
+
+    @classmethod
+    def from_content(cls, content: str) -> 'DocumentIndex':
+        positions: Dict[str, List[int]] = {}
+        line_starts = []
+        position = 0
+        for line in content.lower().split('\n'):
+            line_starts.append(position)
+            for term in _WORD.findall(line):
+                positions.setdefault(term, []).append(position)
+                position += 1
+        return cls(positions, line_starts)
+
+    @classmethod
+    def from_json(cls, text: str) -> 'DocumentIndex':
+        data = json.loads(text)
+        return cls(data['positions'], data['line_starts'])
+
+    def to_json(self) -> str:
+        return json.dumps({'positions': self.positions, 'line_starts': self.line_starts},
+                          separators=(',', ':'))
+
+    def lines_of(self, positions: Iterable[int]) -> Set[int]:
+        """1-based line numbers holding the given word positions."""
+        # Empty lines share their start with the next line; bisect_right picks the latter
+        return {bisect_right(self.line_starts, p) for p in positions}
+
+
+def parse_query(query: str) -> List[Clause]:
+    """Split a ranked query into ``"phrase"``, ``prefix*`` and plain term clauses.
+
+    An unquoted token with several words (``mars-colony``) is a phrase.
+    """
+    clauses: List[Clause] = []
+    for phrase, token in _CLAUSE.findall(query.lower()):
+        if token.endswith('*') and _WORD.fullmatch(token[:-1]):
+            clauses.append(('prefix', [token[:-1]]))
+            continue
+        words = _WORD.findall(phrase or token)
+        if len(words) == 1:
+            clauses.append(('term', words))
+        elif words:
+            clauses.append(('phrase', words))
+    return clauses
+
+
+def _trigrams(term: str) -> Set[str]:
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+class SearchIndex:
+    """Term -> {file: word positions} postings over the ``.txt`` files of one directory.
+
+    The postings live in memory. Each file's ``DocumentIndex`` is also kept
+    in SQLite with the file's mtime and size, so a restart re-reads only
+    files that changed. The index is loaded on first search; ``FilesAPI``
+    updates it on every create, update and delete. An update whose mtime
+    and size match the stored row (another worker got there first) reuses
+    that row instead of re-reading the file.
+
+    ``candidates()`` backs substring search. Each word of the query maps to
+    postings: inner words must match a term exactly, while a word at the
+    start or end of the query may be the tail or head of a longer term.
+    Those partial words are resolved through a trigram map of the vocabulary.
+    The result is a superset of the matching lines; callers confirm each line.
+
+    ``rank()`` scores term, prefix and phrase clauses with BM25 from the
+    postings alone and keeps the top results in a heap.
+    """
+
+    def __init__(self, base_path: Path, index_path: str = DEFAULT_INDEX_PATH):
+        self.base_path = Path(base_path)
+        self.index_path = Path(index_path)
+        self._base_key = str(self.base_path.resolve())
+        self._docs: Dict[str, DocumentIndex] = {}
+        self._postings: Dict[str, Dict[str, List[int]]] = {}
+        self._trigram_terms: Dict[str, Set[str]] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._conn: Optional[sqlite3.Connection] = None
+
+    # Persistence
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.index_path), check_same_thread=False, timeout=5)
+            with self._conn:
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._conn.execute('CREATE TABLE IF NOT EXISTS documents (base TEXT, name TEXT, mtime_ns INTEGER, '
+                                   'size INTEGER, doc TEXT, PRIMARY KEY (base, name))')
+        return self._conn
+
+    def _store(self, rows: List[Tuple[str, os.stat_result, DocumentIndex]]) -> None:
+        with self._db() as conn:
+            conn.executemany('INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)',
+                             [(self._base_key, name, stat.st_mtime_ns, stat.st_size, doc.to_json())
+                              for name, stat, doc in rows])
+
+    def _unstore(self, names: Iterable[str]) -> None:
+        with self._db() as conn:
+            conn.executemany('DELETE FROM documents WHERE base = ? AND name = ?',
+                             [(self._base_key, name) for name in names])
+
+    def _ensure_loaded(self) -> None:
+        """Load stored documents, re-indexing files whose mtime or size changed."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            stored: Dict[str, Tuple[int, int, str]] = {
+                name: (mtime_ns, size, doc) for name, mtime_ns, size, doc in self._db().execute(
+                    'SELECT name, mtime_ns, size, doc FROM documents WHERE base = ?', (self._base_key,))
+            }
+            reindexed = []
+            for file_path in self.base_path.iterdir():
+                if not (file_path.is_file() and file_path.suffix == INDEXED_SUFFIX):
+                    continue
+                stat = file_path.stat()
+                row = stored.pop(file_path.name, None)
+                if row is not None and row[:2] == (stat.st_mtime_ns, stat.st_size):
+                    self._add(file_path.name, DocumentIndex.from_json(row[2]))
+                    continue
+                doc = self._read_document(file_path)
+                if doc is not None:
+                    self._add(file_path.name, doc)
+                    reindexed.append((file_path.name, stat, doc))
+            if reindexed:
+                self._store(reindexed)
+            if stored:
+                self._unstore(stored)
+            self._loaded = True
+            print(f"📇 Files: Search index ready ({len(self._docs)} files, {len(reindexed)} re-indexed)")
+
+    @staticmethod
+    def _read_document(file_path: Path) -> Optional[DocumentIndex]:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return DocumentIndex.from_content(f.read())
+        except (OSError, UnicodeDecodeError):
+            # Unreadable files are skipped, as the scan did
+            return None
+
+    # In-memory postings
+
+    def _add(self, name: str, doc: DocumentIndex) -> None:
+        self._docs[name] = doc
+        self._total_length += doc.length
+        for term, positions in doc.positions.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                for trigram in _trigrams(term):
+                    self._trigram_terms.setdefault(trigram, set()).add(term)
+            postings[name] = positions
+
+    def _discard(self, name: str) -> None:
+        doc = self._docs.pop(name, None)
+        if doc is None:
+            return
+        self._total_length -= doc.length
+        for term in doc.positions:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(name, None)
+            if not postings:
+                del self._postings[term]
+                for trigram in _trigrams(term):
+                    terms = self._trigram_terms.get(trigram)
+                    if terms is not None:
+                        terms.discard(term)
+                        if not terms:
+                            del self._trigram_terms[trigram]
+
+    # Write path
+
+    def update(self, filename: str, force: bool = False) -> None:
+        """Re-index one file after it was created or rewritten; ``force`` re-reads it even if the stored row matches."""
+        if not self._loaded:
+            return  # the lazy load will pick it up by mtime
+        file_path = self.base_path / filename
+        if file_path.suffix != INDEXED_SUFFIX:
+            return
+        try:
+            with self._lock:
+                self._discard(filename)
+                try:
+                    stat = file_path.stat()
+                except OSError:
+                    self._unstore([filename])
+                    return
+                if not force:
+                    # Every worker's watcher sees the same outside edit; the first to index it stores it.
+                    # Writes through the API always re-read: two quick same-size writes can share an mtime
+                    row = self._db().execute('SELECT mtime_ns, size, doc FROM documents WHERE base = ? AND name = ?',
+                                             (self._base_key, filename)).fetchone()
+                    if row is not None and row[:2] == (stat.st_mtime_ns, stat.st_size):
+                        self._add(filename, DocumentIndex.from_json(row[2]))
+                        return
+                doc = self._read_document(file_path)
+                if doc is None:
+                    self._unstore([filename])
+                    return
+                self._add(filename, doc)
+                self._store([(filename, stat, doc)])
+        except Exception as e:
+            print(f"⚠️ Files: Could not index {filename}: {e}")
+
+    def remove(self, filename: str) -> None:
+        """Drop a deleted file from the index."""
+        if not self._loaded:
+            return
+        try:
+            with self._lock:
+                self._discard(filename)
+                self._unstore([filename])
+        except Exception as e:
+            print(f"⚠️ Files: Could not unindex {filename}: {e}")
+
+    # Substring search
+
+    def _matching_terms(self, word: str, open_left: bool, open_right: bool) -> Iterable[str]:
+        if not (open_left or open_right):
+            return (word,) if word in self._postings else ()
+        if len(word) >= 3:
+            sets = sorted((self._trigram_terms.get(t, set()) for t in _trigrams(word)), key=len)
+            pool = set.intersection(*sets) if sets[0] else set()
+        else:
+            pool = self._postings.keys()
+        if open_left and open_right:
+            return [term for term in pool if word in term]
+        if open_left:
+            return [term for term in pool if term.endswith(word)]
+        return [term for term in pool if term.startswith(word)]
+
+    def _word_lines(self, word: str, open_left: bool, open_right: bool) -> Optional[Dict[str, Set[int]]]:
+        """Lines of each file holding ``word``, or None when the word is too broad to help."""
+        terms = self._matching_terms(word, open_left, open_right)
+        if sum(len(self._postings[term]) for term in terms) > len(self._docs) * BROAD_WORD_SHARE:
+            return None
+        lines: Dict[str, Set[int]] = {}
+        for term in terms:
+            for name, positions in self._postings[term].items():
+                lines.setdefault(name, set()).update(self._docs[name].lines_of(positions))
+        return lines
+
+    def candidates(self, query: str) -> Optional[Dict[str, List[int]]]:
+        """Files and line numbers that may contain ``query``.
+
+        None means the index cannot narrow the search (no words, or only
+        very common ones) and the caller should scan.
+        """
+        query = query.lower()
+        words = list(_WORD.finditer(query))
+        if not words:
+            return None
+        self._ensure_loaded()
+        with self._lock:
+            result: Optional[Dict[str, Set[int]]] = None
+            for match in words:
+                lines = self._word_lines(match.group(), match.start() == 0, match.end() == len(query))
+                if lines is None:
+                    continue
+                if result is None:
+                    result = lines
+                else:
+                    result = {name: result[name] & numbers for name, numbers in lines.items() if name in result}
+                    result = {name: numbers for name, numbers in result.items() if numbers}
+                if not result:
+                    return {}
+        if result is None:
+            return None
+        return {name: sorted(numbers) for name, numbers in result.items()}
+
+    # Ranked search
+
+    def _clause_hits(self, kind: str, words: List[str]) -> Dict[str, List[int]]:
+        """Positions where a clause matches, per file (phrase: first word's position)."""
+        if kind == 'term':
+            return self._postings.get(words[0], {})
+        if kind == 'prefix':
+            hits: Dict[str, List[int]] = {}
+            for term in self._matching_terms(words[0], False, True):
+                for name, positions in self._postings[term].items():
+                    hits.setdefault(name, []).extend(positions)
+            return hits
+        postings = [self._postings.get(word) for word in words]
+        if not all(postings):
+            return {}
+        # Walk the rarest word's files; check the others by offset
+        rarest = min(postings, key=len)
+        hits = {}
+        for name in rarest:
+            if not all(name in p for p in postings):
+                continue
+            following = [set(p[name]) for p in postings[1:]]
+            starts = [start for start in postings[0][name]
+                      if all(start + i in positions for i, positions in enumerate(following, 1))]
+            if starts:
+                hits[name] = starts
+        return hits
+
+    def rank(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[Tuple[str, float, List[int]]]]:
+        """BM25-ranked files matching any clause of ``query``.
+
+        Returns the number of matching files and the ``(name, score, line
+        numbers)`` of results ``offset`` to ``offset + limit``.
+        """
+        clauses = parse_query(query)
+        self._ensure_loaded()
+        with self._lock:
+            count = len(self._docs)
+            if not clauses or not count:
+                return 0, []
+            average_length = self._total_length / count or 1
+            scores: Dict[str, float] = {}
+            matched: Dict[str, List[int]] = {}
+            for kind, words in clauses:
+                hits = self._clause_hits(kind, words)
+                idf = math.log(1 + (count - len(hits) + 0.5) / (len(hits) + 0.5))
+                for name, positions in hits.items():
+                    tf = len(positions)
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._docs[name].length / average_length)
+                    scores[name] = scores.get(name, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+                    matched.setdefault(name, []).extend(positions)
+            top = heapq.nlargest(offset + limit, scores.items(), key=itemgetter(1))[offset:]
+            return len(scores), [(name, score, sorted(self._docs[name].lines_of(matched[name])))
+                                 for name, score in top]
@@ -0,0 +1,66 @@
+"""Google API batch requests (multipart/mixed over ``/batch/<api>/<version>``).
+
+Up to ``BATCH_LIMIT`` GET calls are packed into one HTTP request. Each part
+is an embedded HTTP request, and the response is a multipart/mixed body
+with one embedded HTTP response per part, matched back by Content-ID.
+"""
+import email.parser
+import email.policy
+import json
+from typing import Any, Dict, List
+
+BATCH_LIMIT = 100
+
+
+def build_batch_body(paths: List[str], boundary: str) -> bytes:
+    """Multipart body with one embedded ``GET path`` per part."""
+    parts = []
+    for index, path in enumerate(paths):
+        parts.append(
+            f"--{boundary}\r\n"
+            f"Content-Type: application/http\r\n"
+            f"Content-ID: <item-{index}>\r\n"
+            f"\r\n"
+            f"GET {path}\r\n"
+            f"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n")
+    return ''.join(parts).encode()
+
+
+def _parse_embedded_response(payload: bytes) -> Dict[str, Any]:
+    """Turn one embedded HTTP response into its JSON body or an error dict."""
+    head, _, body = payload.replace(b'\r\n', b'\n').partition(b'\n\n')
+    status_line = head.split(b'\n', 1)[0].decode('latin-1')
+    try:
+        status = int(status_line.split()[1])
+    except (IndexError, ValueError):
+        return {"error": f"Malformed batch part: {status_line!r}"}
+
+    try:
+        data = json.loads(body) if body.strip() else {}
+    except ValueError:
+        data = {"raw": body.decode('utf-8', 'replace')}
+
+    if 200 <= status < 300:
+        return data
+    message = data.get('error', {}).get('message') if isinstance(data.get('error'), dict) else None
+    return {"error": message or f"HTTP {status}", "status": status}
+
+
+def parse_batch_response(content: bytes, content_type: str, count: int) -> List[Dict[str, Any]]:
+    """Split a multipart/mixed batch response into ``count`` results, in request order."""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + content)
+    if not message.is_multipart():
+        raise ValueError("Batch response is not multipart")
+
+    results: List[Dict[str, Any]] = [{"error": "Missing from batch response"} for _ in range(count)]
+    for position, part in enumerate(message.iter_parts()):
+        content_id = (part.get('Content-ID') or '').strip('<>')
+        index = position
+        if content_id.startswith('response-item-'):
+            index = int(content_id[len('response-item-'):])
+        if 0 <= index < count:
+            results[index] = _parse_embedded_response(part.get_payload(decode=True) or b'')
+    return results
@@ -1,11 +1,31 @@
 """Google API implementation with only unique logic."""
-from typing import Dict, Any, List
-from base_api import BaseAPI
+from typing import Dict, Any, Iterator, List, Tuple
+import asyncio
 import json
+import uuid
+from base_api import BaseAPI
+from rate_limiter import RateLimit
+from retry_policy import error_result
+from param_schema import Param
+from pagination import PAGINATION_PARAMS, PageTokenCursor
+from .batch import BATCH_LIMIT, build_batch_body, parse_batch_response
+
+GMAIL_METADATA_QUERY = ''.join(f'&metadataHeaders={h}' for h in ('Subject', 'From', 'To', 'Date'))
+
 
 class GoogleAPI(BaseAPI):
     """Google API service implementation with only unique logic."""
     
+    # Per-product quotas: YouTube search costs 100 units of a small daily quota
+    cursor_style = PageTokenCursor()
+    rate_limits = {
+        '': RateLimit(10, 20),
+        '/gmail': RateLimit(40, 50),
+        '/drive': RateLimit(20, 40),
+        '/calendar': RateLimit(5, 10),
+        '/youtube': RateLimit(1, 5),
+    }
+    
     def __init__(self):
         """Initialize Google API service."""
         credentials = self._load_credentials('google')
@@ -34,29 +54,47 @@ class GoogleAPI(BaseAPI):
             "gmail/profile": {
                 "method": "GET",
                 "description": "Get Gmail profile",
-                "handler": self.get_gmail_profile
+                "handler": self.get_gmail_profile,
+                "cache_ttl": 300,
+                "stale_while_revalidate": 3600
             },
             "gmail/messages": {
                 "method": "GET",
                 "description": "List Gmail messages",
-                "handler": self.get_gmail_messages
+                "handler": self.get_gmail_messages,
+                "params": {
+                    "q": Param(str, default='', description="Gmail search query"),
+                    "max_results": Param(int, default=10, min=1, max=500, description="Number of messages per page"),
+                    "expand": Param(str, choices=('metadata',), description="'metadata' adds headers and snippet via batch requests"),
+                    **PAGINATION_PARAMS
+                }
             },
             "drive/files": {
                 "method": "GET",
                 "description": "List Drive files",
-                "handler": self.get_drive_files
+                "handler": self.get_drive_files,
+                "params": {
+                    "q": Param(str, description="Drive search query"),
+                    "page_size": Param(int, default=10, min=1, max=1000, description="Number of files per page"),
+                    **PAGINATION_PARAMS
+                }
             },
             "calendar/events": {
                 "method": "GET",
                 "description": "List Calendar events",
-                "handler": self.get_calendar_events
+                "handler": self.get_calendar_events,
+                "params": {
+                    "max_results": Param(int, default=10, min=1, max=2500, description="Number of events per page"),
+                    **PAGINATION_PARAMS
+                }
             },
             "youtube/search": {
                 "method": "GET",
                 "description": "Search YouTube videos",
                 "handler": self.search_youtube,
                 "params": {
-                    "q": "Required: Search query for YouTube videos"
+                    "q": Param(str, required=True, description="Search query for YouTube videos"),
+                    "max_results": Param(int, default=10, min=0, max=50, description="Number of videos")
                 }
             }
         }
@@ -77,28 +115,104 @@ class GoogleAPI(BaseAPI):
         """Get Gmail profile."""
         return self._handle_api_call('GET', '/gmail/v1/users/me/profile')
     
-    def get_gmail_messages(self) -> Dict[str, Any]:
-        """Get Gmail messages."""
-        query = self._get_request_param('q', '')
-        max_results = self._get_request_param('max_results', 10, int)
-        return self._handle_api_call('GET', f'/gmail/v1/users/me/messages?q={query}&maxResults={max_results}')
+    async def get_gmail_messages(self, q: str = '', max_results: int = 10, all: bool = False,
+                                 max_items: int = None, expand: str = None) -> Dict[str, Any]:
+        """Get Gmail messages, optionally expanded with metadata via concurrent batch requests."""
+        url = f'/gmail/v1/users/me/messages?q={q}&maxResults={max_results}'
+        if all or max_items:
+            result = await asyncio.to_thread(self._paginate, url, 'messages', max_items)
+        else:
+            result = await self._handle_api_call_async('GET', url)
+        if expand != 'metadata' or (isinstance(result, dict) and 'error' in result):
+            return result
+        if not isinstance(result, dict):
+            # Streamed listings are expanded batch by batch as the response is written
+            return self._iter_expanded_messages(result)
+        try:
+            result['messages'] = await self._expand_messages_async(result.get('messages', []))
+        except Exception as e:
+            return error_result(e)
+        return result
+    
+    @staticmethod
+    def _metadata_paths(messages: List[Dict[str, Any]]) -> List[str]:
+        return [f'/gmail/v1/users/me/messages/{m["id"]}?format=metadata' + GMAIL_METADATA_QUERY for m in messages]
+    
+    @staticmethod
+    def _merge_expanded(messages: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [{"id": message["id"], **result} if 'error' in result else result
+                for message, result in zip(messages, results)]
+    
+    def _expand_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Resolve listed message IDs to metadata (headers, snippet) in batches."""
+        return self._merge_expanded(messages, self._batch_get(self._metadata_paths(messages)))
+    
+    async def _expand_messages_async(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """``_expand_messages`` with every batch in flight at once."""
+        return self._merge_expanded(messages, await self._batch_get_async(self._metadata_paths(messages)))
+    
+    def _iter_expanded_messages(self, messages: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Expand a streamed message listing one batch at a time."""
+        pending = []
+        for message in messages:
+            pending.append(message)
+            if len(pending) == BATCH_LIMIT:
+                yield from self._expand_messages(pending)
+                pending = []
+        if pending:
+            yield from self._expand_messages(pending)
+    
+    @staticmethod
+    def _batch_request(chunk: List[str]) -> Tuple[bytes, Dict[str, str]]:
+        """Multipart body and headers for one batch POST."""
+        boundary = f'batch_{uuid.uuid4().hex}'
+        return build_batch_body(chunk, boundary), {'Content-Type': f'multipart/mixed; boundary={boundary}'}
+    
+    def _batch_get(self, paths: List[str], batch_path: str = '/batch/gmail/v1') -> List[Dict[str, Any]]:
+        """GET many API paths through Google's multipart batch endpoint, in order."""
+        results = []
+        for start in range(0, len(paths), BATCH_LIMIT):
+            chunk = paths[start:start + BATCH_LIMIT]
+            # Every sub-request counts against its API's quota, in one reservation;
+            # the batch POST itself is not charged again
+            self.rate_limiter.acquire_many(chunk)
+            body, headers = self._batch_request(chunk)
+            response = self._make_request('POST', batch_path, rate_limited=False, data=body, headers=headers)
+            results.extend(parse_batch_response(response.content, response.headers.get('Content-Type', ''), len(chunk)))
+        return results
+    
+    async def _batch_get_async(self, paths: List[str], batch_path: str = '/batch/gmail/v1') -> List[Dict[str, Any]]:
+        """``_batch_get`` with the batch POSTs sent concurrently; a failed chunk cancels the rest."""
+        async def send(chunk: List[str]) -> List[Dict[str, Any]]:
+            await self.rate_limiter.acquire_many_async(chunk)
+            body, headers = self._batch_request(chunk)
+            response = await self._make_request_async('POST', batch_path, rate_limited=False,
+                                                      content=body, headers=headers)
+            return parse_batch_response(response.content, response.headers.get('Content-Type', ''), len(chunk))
+        
+        tasks = [asyncio.ensure_future(send(paths[start:start + BATCH_LIMIT]))
+                 for start in range(0, len(paths), BATCH_LIMIT)]
+        try:
+            chunks = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return [result for chunk in chunks for result in chunk]
     
-    def get_drive_files(self) -> Dict[str, Any]:
+    def get_drive_files(self, q: str = None, page_size: int = 10, all: bool = False,
+                        max_items: int = None) -> Dict[str, Any]:
         """Get Drive files."""
-        page_size = self._get_request_param('page_size', 10, int)
-        query = self._get_request_param('q')
         url = f'/drive/v3/files?pageSize={page_size}'
-        if query:
-            url += f'&q={query}'
-        return self._handle_api_call('GET', url)
+        if q:
+            url += f'&q={q}'
+        return self._handle_list_call(url, 'files', all, max_items)
     
-    def get_calendar_events(self) -> Dict[str, Any]:
+    def get_calendar_events(self, max_results: int = 10, all: bool = False, max_items: int = None) -> Dict[str, Any]:
         """Get Calendar events."""
-        max_results = self._get_request_param('max_results', 10, int)
-        return self._handle_api_call('GET', f'/calendar/v3/calendars/primary/events?maxResults={max_results}')
+        return self._handle_list_call(f'/calendar/v3/calendars/primary/events?maxResults={max_results}',
+                                      'items', all, max_items)
     
-    def search_youtube(self) -> Dict[str, Any]:
+    def search_youtube(self, q: str, max_results: int = 10) -> Dict[str, Any]:
         """Search YouTube."""
-        query = self._validate_required_param('q')
-        max_results = self._get_request_param('max_results', 10, int)
-        return self._handle_api_call('GET', f'/youtube/v3/search?part=snippet&q={query}&maxResults={max_results}')
\ No newline at end of file
+        return self._handle_api_call('GET', f'/youtube/v3/search?part=snippet&q={q}&maxResults={max_results}')
\ No newline at end of file
@@ -1,28 +1,78 @@
 """Base Meta API class with shared authentication for Facebook, WhatsApp, and Instagram."""
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Sequence, Union
 import requests
 import time
 import json
 import os
+import sqlite3
 from pathlib import Path
+from urllib.parse import urlencode
+from async_http import AsyncRequestMixin
+from conditional_cache import ValidatorCache
+from http_transport import mount_shared_pools, plain_session
+from metrics import UPSTREAM_RETRIES, UPSTREAM_SECONDS
+from pagination import GraphCursor, PaginationMixin
+from rate_limiter import RateLimit, get_rate_limiter
+from response_cache import token_identity
+from retry_policy import RetryPolicy, UpstreamUnavailable, error_result, parse_retry_after
+from token_refresh import TokenRefreshMixin, watch_token
+from token_store import open_token_store
+from service_registry import report_progress, warm_up_deferred
 
-class BaseMetaAPI(ABC):
+GRAPH_BATCH_LIMIT = 50
+# App-level Graph quota, shared by every Meta endpoint
+GRAPH_RATE_LIMIT = RateLimit(1, 30)
+# A client batch fits in one burst, so it waits no longer than a single call
+# (RATE_LIMIT_MAX_WAIT) or is shed, and never drains the bucket for other routes
+MAX_BATCH_REQUESTS = min(GRAPH_BATCH_LIMIT, GRAPH_RATE_LIMIT.burst)
+
+
+class GraphEdge:
+    """A nested edge in a Graph ``fields`` list, e.g. ``comments.limit(5){id,text}``.
+    
+    Field expansion lets one request return a node together with its edges,
+    instead of one extra call per edge per item.
+    """
+    
+    def __init__(self, name: str, fields: Sequence[Union[str, 'GraphEdge']], limit: Optional[int] = None):
+        self.name = name
+        self.fields = tuple(fields)
+        self.limit = limit
+    
+    def __str__(self) -> str:
+        modifier = f".limit({self.limit})" if self.limit is not None else ""
+        return f"{self.name}{modifier}{{{graph_fields(self.fields)}}}"
+
+
+def graph_fields(fields: Sequence[Union[str, GraphEdge]]) -> str:
+    """Render a field list (plain names and ``GraphEdge`` expansions) for ``?fields=``."""
+    return ','.join(str(field) for field in fields)
+
+class BaseMetaAPI(AsyncRequestMixin, PaginationMixin, TokenRefreshMixin, ABC):
     """Base class for all Meta APIs (Facebook, WhatsApp, Instagram) with shared authentication."""
     
+    retry_policy = RetryPolicy()
+    rate_limits: Dict[str, RateLimit] = {'': GRAPH_RATE_LIMIT}
+    cursor_style = GraphCursor()
+    
     def __init__(self, app_id: str, app_secret: str, service_name: str, api_version: str = "v18.0"):
         """Initialize Meta API with shared components."""
         self.app_id = app_id
         self.app_secret = app_secret
         self.service_name = service_name
         self.api_version = api_version
+        self.rate_limiter = get_rate_limiter(service_name, self.rate_limits)
+        self.validators = ValidatorCache()
         self.tokens_file = self._get_tokens_file_path()
+        self.token_store = open_token_store(self.service_name, self.tokens_file)
         self._tokens = self._load_tokens()
-        self.session = requests.Session()
+        self.session = mount_shared_pools(requests.Session())
         self._setup_session()
         
-        # Try to restore authentication on startup
-        self._try_restore_authentication()
+        # Try to restore authentication on startup, unless the server warms up in the background
+        if not warm_up_deferred():
+            self.warm_up()
     
     def _get_tokens_file_path(self) -> Path:
         """Get path to tokens file."""
@@ -30,23 +80,21 @@ class BaseMetaAPI(ABC):
         return current_dir / 'auth' / f'{self.service_name}_tokens.json'
     
     def _load_tokens(self) -> Dict[str, Any]:
-        """Load tokens from file."""
+        """Load tokens from the token store."""
         try:
-            if self.tokens_file.exists():
-                with open(self.tokens_file, 'r') as f:
-                    return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            return self.token_store.load()
+        except (OSError, ValueError, sqlite3.Error) as e:
             print(f"Warning: Could not load tokens: {e}")
         return {}
     
     def _save_tokens(self) -> None:
-        """Save tokens to file."""
-        try:
-            self.tokens_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.tokens_file, 'w') as f:
-                json.dump(self._tokens, f, indent=2)
-        except Exception as e:
-            print(f"Warning: Could not save tokens: {e}")
+        """Persist tokens in the background (debounced, atomic)."""
+        self.token_store.save(self._tokens)
+    
+    def warm_up(self) -> None:
+        """Restore saved authentication (may refresh the token over the network)."""
+        self._try_restore_authentication()
+        watch_token(self)
     
     def _try_restore_authentication(self) -> None:
         """Try to restore authentication on startup."""
@@ -69,6 +117,7 @@ class BaseMetaAPI(ABC):
                 print(f"🔄 {self.service_name}: Token expired, attempting refresh...")
                 
                 # Try to refresh the token
+                report_progress("refreshing token")
                 if self._refresh_token():
                     print(f"✅ {self.service_name}: Token refreshed successfully!")
                 else:
@@ -122,7 +171,7 @@ class BaseMetaAPI(ABC):
         }
         
         try:
-            response = requests.post(
+            response = plain_session().post(
                 f'https://graph.facebook.com/{self.api_version}/oauth/access_token',
                 data=data,
                 timeout=30
@@ -152,12 +201,18 @@ class BaseMetaAPI(ABC):
     
     def get_access_token(self) -> Optional[str]:
         """Get current access token."""
+        self._sync_tokens()
         return self._tokens.get('access_token')
     
     def is_authenticated(self) -> bool:
         """Check if API is authenticated."""
         return bool(self.get_access_token())
     
+    def cache_identity(self) -> str:
+        """Identify the authenticated account for response cache keys."""
+        self._sync_tokens()
+        return token_identity(self._tokens)
+    
     def _refresh_token(self) -> bool:
         """Refresh access token using refresh token."""
         refresh_token = self._tokens.get('refresh_token')
@@ -172,7 +227,7 @@ class BaseMetaAPI(ABC):
         }
         
         try:
-            response = self.session.post(
+            response = plain_session().post(
                 f'https://graph.facebook.com/{self.api_version}/oauth/access_token',
                 data=data,
                 timeout=30
@@ -206,22 +261,46 @@ class BaseMetaAPI(ABC):
             'Accept': 'application/json'
         }
     
-    def _make_request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
-        """Make authenticated request to Meta Graph API."""
-        url = f"https://graph.facebook.com/{self.api_version}{endpoint}"
-        headers = self._get_headers()
+    def _build_url(self, endpoint: str) -> str:
+        """Build full Graph API URL for an endpoint (or pass through a paging URL)."""
+        if endpoint.startswith('https://graph.facebook.com/'):
+            return endpoint
+        return f"https://graph.facebook.com/{self.api_version}{endpoint}"
+    
+    def _make_request(self, method: str, endpoint: str, rate_limited: bool = True, **kwargs) -> requests.Response:
+        """Make authenticated request to Meta Graph API (``rate_limited=False`` for pre-charged batches)."""
+        url = self._build_url(endpoint)
+        validator_key = self.validators.key(self.cache_identity(), url, kwargs.get('params')) if method == 'GET' else None
+        cached = self.validators.get(validator_key) if validator_key else None
+        headers = {**self._get_headers(), **(cached.conditional_headers() if cached else {})}
         
+        if rate_limited:
+            self.rate_limiter.acquire(endpoint)
+        started = time.perf_counter()
         try:
             response = self.session.request(
                 method=method,
                 url=url,
                 headers=headers,
-                timeout=30,
+                timeout=self.retry_policy.request_timeout,
                 **kwargs
             )
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, self.service_name, method,
+                                     str(response.status_code))
+            if response.status_code == 304 and cached is not None:
+                return self.validators.not_modified(cached, url)
+            if response.status_code == 429:
+                UPSTREAM_RETRIES.inc(self.service_name, '429')
+                raise UpstreamUnavailable("Rate limited by Graph API",
+                                          parse_retry_after(response.headers.get('Retry-After')))
             response.raise_for_status()
+            if validator_key:
+                self.validators.store(validator_key, response)
             return response
         except requests.exceptions.RequestException as e:
+            if e.response is None:
+                outcome = 'timeout' if isinstance(e, requests.exceptions.Timeout) else 'error'
+                UPSTREAM_SECONDS.observe(time.perf_counter() - started, self.service_name, method, outcome)
             raise Exception(f"Request failed: {e}")
     
     def _handle_api_call(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
@@ -230,37 +309,91 @@ class BaseMetaAPI(ABC):
             response = self._make_request(method, endpoint, **kwargs)
             return response.json()
         except Exception as e:
-            return {"error": str(e)}
+            return error_result(e)
     
-    def _get_request_param(self, param_name: str, default_value: Any = None, param_type: type = str) -> Any:
-        """Get request parameter with common handling."""
+    def _batch_call(self, sub_requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run Graph sub-requests through ``batch=[...]`` calls of up to 50 each.
+        
+        Each sub-request is ``{"method": "GET", "relative_url": "me/posts?limit=5"}``
+        (``body`` may be a dict for POSTs). Returns one ``{"code", "body"}`` or
+        ``{"code", "error"}`` dict per sub-request, in order.
+        
+        Graph counts every sub-request against the app's rate limit, so the
+        tokens for the whole batch are reserved up front in one step. If
+        they can't be had within the usual ``RATE_LIMIT_MAX_WAIT`` the batch
+        is shed (``UpstreamUnavailable``, 503 + Retry-After) before anything
+        is sent.
+        """
+        normalized = [self._graph_sub_request(sub) for sub in sub_requests]
+        self.rate_limiter.acquire_many(['/' + sub['relative_url'] for sub in normalized])
+        results = []
+        for start in range(0, len(normalized), GRAPH_BATCH_LIMIT):
+            chunk = normalized[start:start + GRAPH_BATCH_LIMIT]
+            response = self._make_request('POST', '/', rate_limited=False,
+                                          json={"batch": chunk, "include_headers": False})
+            results.extend(self._parse_batch_item(item) for item in response.json())
+        return results
+    
+    @staticmethod
+    def _graph_sub_request(sub: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalize one sub-request to Graph's batch format."""
+        if not isinstance(sub, dict) or not isinstance(sub.get('relative_url'), str):
+            raise ValueError("Each batch item needs a relative_url")
+        method = str(sub.get('method', 'GET')).upper()
+        if method not in ('GET', 'POST', 'DELETE'):
+            raise ValueError(f"Unsupported batch method: {method}")
+        item = {"method": method, "relative_url": sub['relative_url'].lstrip('/')}
+        if sub.get('body') is not None:
+            item['body'] = urlencode(sub['body']) if isinstance(sub['body'], dict) else str(sub['body'])
+        if sub.get('name'):
+            item['name'] = sub['name']
+        return item
+    
+    @staticmethod
+    def _parse_batch_item(item: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Decode one batch response entry into a result or an error."""
+        if item is None:
+            return {"code": None, "error": "No response (timed out or a dependency failed)"}
         try:
-            from flask import request
-            value = request.args.get(param_name, default_value)
-            if param_type == int and value is not None:
-                return int(value)
-            return value
-        except (ValueError, TypeError):
-            return default_value
-    
-    def _validate_required_param(self, param_name: str) -> str:
-        """Validate required parameter."""
+            body = json.loads(item.get('body') or 'null')
+        except ValueError:
+            body = item.get('body')
+        code = item.get('code')
+        if code is not None and 200 <= code < 300:
+            return {"code": code, "body": body}
+        error = body.get('error', {}) if isinstance(body, dict) else {}
+        return {"code": code, "error": error.get('message', f"HTTP {code}") if isinstance(error, dict) else str(error)}
+    
+    def _chained_call(self, first: str, then: str) -> Dict[str, Any]:
+        """Run two dependent GETs in one round trip.
+        
+        ``then`` may reference the first result with Graph's JSONPath syntax,
+        e.g. ``{result=first:$.data.0.id}/recent_media``.
+        """
         try:
-            from flask import request
-            value = request.args.get(param_name) or (request.json.get(param_name) if request.is_json else None)
-            if not value:
-                raise ValueError(f"Missing required parameter: {param_name}")
-            return str(value)
-        except (ValueError, TypeError) as e:
-            raise ValueError(f"Invalid parameter {param_name}: {e}")
-    
-    def _get_request_json(self) -> Dict[str, Any]:
-        """Get request JSON data."""
+            results = self._batch_call([{"relative_url": first, "name": "first"}, {"relative_url": then}])
+        except Exception as e:
+            return error_result(e)
+        head, result = results
+        if 'body' in result:
+            return result['body']
+        # A successful named request is omitted from the response (code None);
+        # a failed one carries the error that explains the dependent failure
+        return {"error": head['error'] if head['code'] is not None and 'error' in head else result['error']}
+    
+    def run_batch(self, batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Run several Graph calls in one round trip; per-item results and errors."""
         try:
-            from flask import request
-            return request.get_json() or {}
-        except Exception:
-            return {}
+            results = self._batch_call(batch)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+        except Exception as e:
+            return error_result(e)
+        return {
+            "success": True,
+            "results": results,
+            "errors": sum(1 for result in results if 'error' in result)
+        }
     
     def _get_service_urls(self) -> Dict[str, str]:
         """Get service-specific URLs."""
@@ -274,7 +407,8 @@ class BaseMetaAPI(ABC):
         return {
             "service": self.service_name,
             "authenticated": self.is_authenticated(),
-            "status": "ready" if self.is_authenticated() else "not_authenticated"
+            "status": "ready" if self.is_authenticated() else "not_authenticated",
+            "conditional_requests": dict(self.validators.stats)
         }
     
     @abstractmethod
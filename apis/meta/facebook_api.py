@@ -1,6 +1,8 @@
 """Facebook Graph API implementation with all free endpoints."""
 from typing import Dict, Any, List
-from .base_meta_api import BaseMetaAPI
+from param_schema import Param
+from pagination import PAGINATION_PARAMS
+from .base_meta_api import BaseMetaAPI, MAX_BATCH_REQUESTS
 
 class FacebookAPI(BaseMetaAPI):
     """Facebook Graph API service implementation."""
@@ -26,22 +28,36 @@ class FacebookAPI(BaseMetaAPI):
             "profile": {
                 "method": "GET",
                 "description": "Get user profile information",
-                "handler": self.get_profile
+                "handler": self.get_profile,
+                "cache_ttl": 300,
+                "stale_while_revalidate": 3600
             },
             "posts": {
                 "method": "GET",
                 "description": "Get user's posts",
-                "handler": self.get_posts
+                "handler": self.get_posts,
+                "params": {
+                    "limit": Param(int, default=25, min=1, max=100, description="Number of items per page"),
+                    **PAGINATION_PARAMS
+                }
             },
             "photos": {
                 "method": "GET",
                 "description": "Get user's photos",
-                "handler": self.get_photos
+                "handler": self.get_photos,
+                "params": {
+                    "limit": Param(int, default=25, min=1, max=100, description="Number of items per page"),
+                    **PAGINATION_PARAMS
+                }
             },
             "videos": {
                 "method": "GET",
                 "description": "Get user's videos",
-                "handler": self.get_videos
+                "handler": self.get_videos,
+                "params": {
+                    "limit": Param(int, default=25, min=1, max=100, description="Number of items per page"),
+                    **PAGINATION_PARAMS
+                }
             },
             "pages": {
                 "method": "GET",
@@ -53,7 +69,9 @@ class FacebookAPI(BaseMetaAPI):
                 "description": "Get posts from a specific page",
                 "handler": self.get_page_posts,
                 "params": {
-                    "page_id": "Required: Facebook page ID"
+                    "page_id": Param(str, required=True, description="Facebook page ID"),
+                    "limit": Param(int, default=25, min=1, max=100, description="Number of items per page"),
+                    **PAGINATION_PARAMS
                 }
             },
             "create-post": {
@@ -61,7 +79,8 @@ class FacebookAPI(BaseMetaAPI):
                 "description": "Create a new post",
                 "handler": self.create_post,
                 "params": {
-                    "message": "Required: Post content"
+                    "message": Param(str, required=True, description="Post content"),
+                    "page_id": Param(str, description="Page to post to instead of the timeline")
                 }
             },
             "create-photo": {
@@ -69,8 +88,9 @@ class FacebookAPI(BaseMetaAPI):
                 "description": "Upload a photo",
                 "handler": self.create_photo,
                 "params": {
-                    "url": "Required: Photo URL",
-                    "message": "Optional: Photo caption"
+                    "url": Param(str, required=True, description="Photo URL"),
+                    "message": Param(str, default='', allow_empty=True, description="Photo caption"),
+                    "page_id": Param(str, description="Page to upload to instead of the user's photos")
                 }
             },
             "groups": {
@@ -81,34 +101,63 @@ class FacebookAPI(BaseMetaAPI):
             "events": {
                 "method": "GET",
                 "description": "Get user's events",
-                "handler": self.get_events
+                "handler": self.get_events,
+                "params": {
+                    "limit": Param(int, default=25, min=1, max=100, description="Number of items per page"),
+                    **PAGINATION_PARAMS
+                }
             },
             "friends": {
                 "method": "GET",
                 "description": "Get user's friends",
-                "handler": self.get_friends
+                "handler": self.get_friends,
+                "params": {
+                    "limit": Param(int, default=25, min=1, max=100, description="Number of items per page"),
+                    **PAGINATION_PARAMS
+                }
             },
             "feed": {
                 "method": "GET",
                 "description": "Get user's news feed",
-                "handler": self.get_feed
+                "handler": self.get_feed,
+                "params": {
+                    "limit": Param(int, default=25, min=1, max=100, description="Number of items per page"),
+                    **PAGINATION_PARAMS
+                }
             },
             "likes": {
                 "method": "GET",
                 "description": "Get user's likes",
-                "handler": self.get_likes
+                "handler": self.get_likes,
+                "params": {
+                    "limit": Param(int, default=25, min=1, max=100, description="Number of items per page"),
+                    **PAGINATION_PARAMS
+                }
             },
             "albums": {
                 "method": "GET",
                 "description": "Get user's photo albums",
-                "handler": self.get_albums
+                "handler": self.get_albums,
+                "cache_ttl": 300,
+                "stale_while_revalidate": 3600
             },
             "album-photos": {
                 "method": "GET",
                 "description": "Get photos from an album",
                 "handler": self.get_album_photos,
                 "params": {
-                    "album_id": "Required: Facebook album ID"
+                    "album_id": Param(str, required=True, description="Facebook album ID"),
+                    "limit": Param(int, default=25, min=1, max=100, description="Number of items per page"),
+                    **PAGINATION_PARAMS
+                }
+            },
+            "batch": {
+                "method": "POST",
+                "description": "Run several Graph API calls in one round trip",
+                "handler": self.run_batch,
+                "params": {
+                    "batch": Param(list, required=True, min=1, max=MAX_BATCH_REQUESTS,
+                                   description='List of {"method", "relative_url", "body"} sub-requests')
                 }
             }
         }
@@ -130,36 +179,29 @@ class FacebookAPI(BaseMetaAPI):
         fields = "id,name,email,picture,cover,about,bio,location,website,birthday,gender"
         return self._handle_api_call('GET', f'/me?fields={fields}')
     
-    def get_posts(self) -> Dict[str, Any]:
+    def get_posts(self, limit: int = 25, all: bool = False, max_items: int = None) -> Dict[str, Any]:
         """Get user's posts."""
-        limit = self._get_request_param('limit', 25, int)
-        return self._handle_api_call('GET', f'/me/posts?limit={limit}')
+        return self._handle_list_call(f'/me/posts?limit={limit}', 'data', all, max_items)
     
-    def get_photos(self) -> Dict[str, Any]:
+    def get_photos(self, limit: int = 25, all: bool = False, max_items: int = None) -> Dict[str, Any]:
         """Get user's photos."""
-        limit = self._get_request_param('limit', 25, int)
-        return self._handle_api_call('GET', f'/me/photos?limit={limit}')
+        return self._handle_list_call(f'/me/photos?limit={limit}', 'data', all, max_items)
     
-    def get_videos(self) -> Dict[str, Any]:
+    def get_videos(self, limit: int = 25, all: bool = False, max_items: int = None) -> Dict[str, Any]:
         """Get user's videos."""
-        limit = self._get_request_param('limit', 25, int)
-        return self._handle_api_call('GET', f'/me/videos?limit={limit}')
+        return self._handle_list_call(f'/me/videos?limit={limit}', 'data', all, max_items)
     
     def get_pages(self) -> Dict[str, Any]:
         """Get user's Facebook pages."""
         return self._handle_api_call('GET', '/me/accounts')
     
-    def get_page_posts(self) -> Dict[str, Any]:
+    def get_page_posts(self, page_id: str, limit: int = 25, all: bool = False,
+                       max_items: int = None) -> Dict[str, Any]:
         """Get posts from a specific page."""
-        page_id = self._validate_required_param('page_id')
-        limit = self._get_request_param('limit', 25, int)
-        return self._handle_api_call('GET', f'/{page_id}/posts?limit={limit}')
+        return self._handle_list_call(f'/{page_id}/posts?limit={limit}', 'data', all, max_items)
     
-    def create_post(self) -> Dict[str, Any]:
+    def create_post(self, message: str, page_id: str = None) -> Dict[str, Any]:
         """Create a new post."""
-        message = self._validate_required_param('message')
-        page_id = self._get_request_json().get('page_id')
-        
         if page_id:
             # Post to a specific page
             return self._handle_api_call('POST', f'/{page_id}/feed', 
@@ -169,12 +211,8 @@ class FacebookAPI(BaseMetaAPI):
             return self._handle_api_call('POST', '/me/feed', 
                                        json={'message': message})
     
-    def create_photo(self) -> Dict[str, Any]:
+    def create_photo(self, url: str, message: str = '', page_id: str = None) -> Dict[str, Any]:
         """Upload a photo."""
-        url = self._validate_required_param('url')
-        message = self._get_request_json().get('message', '')
-        page_id = self._get_request_json().get('page_id')
-        
         data = {
             'url': url,
             'message': message
@@ -191,35 +229,30 @@ class FacebookAPI(BaseMetaAPI):
         """Get user's groups."""
         return self._handle_api_call('GET', '/me/groups')
     
-    def get_events(self) -> Dict[str, Any]:
+    def get_events(self, limit: int = 25, all: bool = False, max_items: int = None) -> Dict[str, Any]:
         """Get user's events."""
-        limit = self._get_request_param('limit', 25, int)
-        return self._handle_api_call('GET', f'/me/events?limit={limit}')
+        return self._handle_list_call(f'/me/events?limit={limit}', 'data', all, max_items)
     
-    def get_friends(self) -> Dict[str, Any]:
+    def get_friends(self, limit: int = 25, all: bool = False, max_items: int = None) -> Dict[str, Any]:
         """Get user's friends."""
-        limit = self._get_request_param('limit', 25, int)
-        return self._handle_api_call('GET', f'/me/friends?limit={limit}')
+        return self._handle_list_call(f'/me/friends?limit={limit}', 'data', all, max_items)
     
-    def get_feed(self) -> Dict[str, Any]:
+    def get_feed(self, limit: int = 25, all: bool = False, max_items: int = None) -> Dict[str, Any]:
         """Get user's news feed."""
-        limit = self._get_request_param('limit', 25, int)
-        return self._handle_api_call('GET', f'/me/feed?limit={limit}')
+        return self._handle_list_call(f'/me/feed?limit={limit}', 'data', all, max_items)
     
-    def get_likes(self) -> Dict[str, Any]:
+    def get_likes(self, limit: int = 25, all: bool = False, max_items: int = None) -> Dict[str, Any]:
         """Get user's likes."""
-        limit = self._get_request_param('limit', 25, int)
-        return self._handle_api_call('GET', f'/me/likes?limit={limit}')
+        return self._handle_list_call(f'/me/likes?limit={limit}', 'data', all, max_items)
     
     def get_albums(self) -> Dict[str, Any]:
         """Get user's photo albums."""
         return self._handle_api_call('GET', '/me/albums')
     
-    def get_album_photos(self) -> Dict[str, Any]:
+    def get_album_photos(self, album_id: str, limit: int = 25, all: bool = False,
+                         max_items: int = None) -> Dict[str, Any]:
         """Get photos from an album."""
-        album_id = self._validate_required_param('album_id')
-        limit = self._get_request_param('limit', 25, int)
-        return self._handle_api_call('GET', f'/{album_id}/photos?limit={limit}')
+        return self._handle_list_call(f'/{album_id}/photos?limit={limit}', 'data', all, max_items)
     
     def get_page_info(self, page_id: str) -> Dict[str, Any]:
         """Get detailed information about a page."""
@@ -1,6 +1,15 @@
 """Instagram Basic Display API implementation with all free endpoints."""
+import time
 from typing import Dict, Any, List
-from .base_meta_api import BaseMetaAPI
+from urllib.parse import urlencode
+from http_transport import plain_session
+from param_schema import Param
+from pagination import PAGINATION_PARAMS
+from .base_meta_api import BaseMetaAPI, GraphEdge, MAX_BATCH_REQUESTS, graph_fields
+
+MEDIA_FIELDS = ('id', 'caption', 'media_type', 'media_url', 'thumbnail_url', 'permalink', 'timestamp')
+CHILD_FIELDS = ('id', 'media_type', 'media_url', 'thumbnail_url')
+COMMENT_FIELDS = ('id', 'text', 'username', 'timestamp')
 
 class InstagramAPI(BaseMetaAPI):
     """Instagram Basic Display API service implementation."""
@@ -33,19 +42,36 @@ class InstagramAPI(BaseMetaAPI):
             "profile": {
                 "method": "GET",
                 "description": "Get user profile information",
-                "handler": self.get_profile
+                "handler": self.get_profile,
+                "cache_ttl": 300,
+                "stale_while_revalidate": 3600
             },
             "media": {
                 "method": "GET",
                 "description": "Get user's media (photos and videos)",
-                "handler": self.get_media
+                "handler": self.get_media,
+                "params": {
+                    "limit": Param(int, default=25, min=1, max=100, description="Number of media items per page"),
+                    **PAGINATION_PARAMS
+                }
+            },
+            "media-expanded": {
+                "method": "GET",
+                "description": "Get media with carousel children and recent comments in one call",
+                "handler": self.get_media_expanded,
+                "params": {
+                    "limit": Param(int, default=25, min=1, max=100, description="Number of media items per page"),
+                    "children": Param(bool, default=True, description="Include carousel children"),
+                    "comments": Param(int, default=5, min=0, max=50, description="Recent comments per item (0 to skip)"),
+                    **PAGINATION_PARAMS
+                }
             },
             "media-details": {
                 "method": "GET",
                 "description": "Get details of a specific media",
                 "handler": self.get_media_details,
                 "params": {
-                    "media_id": "Required: Instagram media ID"
+                    "media_id": Param(str, required=True, description="Instagram media ID")
                 }
             },
             "media-children": {
@@ -53,7 +79,7 @@ class InstagramAPI(BaseMetaAPI):
                 "description": "Get children of a media (for carousel posts)",
                 "handler": self.get_media_children,
                 "params": {
-                    "media_id": "Required: Instagram media ID"
+                    "media_id": Param(str, required=True, description="Instagram media ID")
                 }
             },
             "long-lived-token": {
@@ -71,7 +97,8 @@ class InstagramAPI(BaseMetaAPI):
                 "description": "Get media by hashtag",
                 "handler": self.get_hashtag_media,
                 "params": {
-                    "hashtag": "Required: Hashtag name (without #)"
+                    "hashtag": Param(str, required=True, description="Hashtag name (without #)"),
+                    "limit": Param(int, default=25, min=1, max=100, description="Number of media items")
                 }
             },
             "user-media-by-date": {
@@ -79,8 +106,8 @@ class InstagramAPI(BaseMetaAPI):
                 "description": "Get user media by date range",
                 "handler": self.get_media_by_date,
                 "params": {
-                    "since": "Required: Start date (YYYY-MM-DD)",
-                    "until": "Required: End date (YYYY-MM-DD)"
+                    "since": Param(str, required=True, description="Start date (YYYY-MM-DD)"),
+                    "until": Param(str, required=True, description="End date (YYYY-MM-DD)")
                 }
             },
             "media-insights": {
@@ -88,7 +115,16 @@ class InstagramAPI(BaseMetaAPI):
                 "description": "Get media insights (if available)",
                 "handler": self.get_media_insights,
                 "params": {
-                    "media_id": "Required: Instagram media ID"
+                    "media_id": Param(str, required=True, description="Instagram media ID")
+                }
+            },
+            "batch": {
+                "method": "POST",
+                "description": "Run several Graph API calls in one round trip",
+                "handler": self.run_batch,
+                "params": {
+                    "batch": Param(list, required=True, min=1, max=MAX_BATCH_REQUESTS,
+                                   description='List of {"method", "relative_url", "body"} sub-requests')
                 }
             }
         }
@@ -110,28 +146,39 @@ class InstagramAPI(BaseMetaAPI):
         fields = "id,username,account_type,media_count"
         return self._handle_api_call('GET', f'/me?fields={fields}')
     
-    def get_media(self) -> Dict[str, Any]:
+    def get_media(self, limit: int = 25, all: bool = False, max_items: int = None) -> Dict[str, Any]:
         """Get user's media (photos and videos)."""
-        limit = self._get_request_param('limit', 25, int)
         fields = "id,caption,media_type,media_url,thumbnail_url,permalink,timestamp"
-        return self._handle_api_call('GET', f'/me/media?fields={fields}&limit={limit}')
+        return self._handle_list_call(f'/me/media?fields={fields}&limit={limit}', 'data', all, max_items)
+    
+    def get_media_expanded(self, limit: int = 25, children: bool = True, comments: int = 5,
+                           all: bool = False, max_items: int = None) -> Dict[str, Any]:
+        """Get media with children and comments nested, instead of 2 extra calls per item.
+        
+        Only the first page of each item's comments is nested; ``?all=true`` pages
+        through the media list itself.
+        """
+        fields = list(MEDIA_FIELDS)
+        if children:
+            fields.append(GraphEdge('children', CHILD_FIELDS))
+        if comments:
+            fields.append(GraphEdge('comments', COMMENT_FIELDS, limit=comments))
+        return self._handle_list_call(f'/me/media?fields={graph_fields(fields)}&limit={limit}', 'data', all, max_items)
     
-    def get_media_details(self) -> Dict[str, Any]:
+    def get_media_details(self, media_id: str) -> Dict[str, Any]:
         """Get details of a specific media."""
-        media_id = self._validate_required_param('media_id')
         fields = "id,caption,media_type,media_url,thumbnail_url,permalink,timestamp,children"
         return self._handle_api_call('GET', f'/{media_id}?fields={fields}')
     
-    def get_media_children(self) -> Dict[str, Any]:
+    def get_media_children(self, media_id: str) -> Dict[str, Any]:
         """Get children of a media (for carousel posts)."""
-        media_id = self._validate_required_param('media_id')
         fields = "id,media_type,media_url,thumbnail_url"
         return self._handle_api_call('GET', f'/{media_id}/children?fields={fields}')
     
     def get_long_lived_token(self) -> Dict[str, Any]:
         """Exchange short-lived token for long-lived token."""
         try:
-            response = requests.get(
+            response = plain_session().get(
                 f'https://graph.facebook.com/{self.api_version}/oauth/access_token',
                 params={
                     'grant_type': 'ig_exchange_token',
@@ -158,7 +205,7 @@ class InstagramAPI(BaseMetaAPI):
     def refresh_long_lived_token(self) -> Dict[str, Any]:
         """Refresh long-lived token."""
         try:
-            response = requests.get(
+            response = plain_session().get(
                 f'https://graph.facebook.com/{self.api_version}/refresh_access_token',
                 params={
                     'grant_type': 'ig_refresh_token',
@@ -181,31 +228,22 @@ class InstagramAPI(BaseMetaAPI):
         except Exception as e:
             return {"error": str(e)}
     
-    def get_hashtag_media(self) -> Dict[str, Any]:
-        """Get media by hashtag."""
-        hashtag = self._validate_required_param('hashtag')
-        limit = self._get_request_param('limit', 25, int)
-        fields = "id,caption,media_type,media_url,thumbnail_url,permalink,timestamp"
-        
-        # First get hashtag ID
-        hashtag_response = self._handle_api_call('GET', f'/ig_hashtag_search?user_id=me&q={hashtag}')
-        if 'error' in hashtag_response:
-            return hashtag_response
-        
-        hashtag_id = hashtag_response['data'][0]['id']
-        return self._handle_api_call('GET', f'/{hashtag_id}/recent_media?fields={fields}&limit={limit}')
+    def get_hashtag_media(self, hashtag: str, limit: int = 25) -> Dict[str, Any]:
+        """Get media by hashtag (hashtag search and media lookup in one round trip)."""
+        fields = graph_fields(MEDIA_FIELDS)
+        return self._chained_call(
+            f'ig_hashtag_search?{urlencode({"user_id": "me", "q": hashtag})}',
+            f'{{result=first:$.data.0.id}}/recent_media?fields={fields}&limit={limit}'
+        )
     
-    def get_media_by_date(self) -> Dict[str, Any]:
+    def get_media_by_date(self, since: str, until: str) -> Dict[str, Any]:
         """Get user media by date range."""
-        since = self._validate_required_param('since')
-        until = self._validate_required_param('until')
         fields = "id,caption,media_type,media_url,thumbnail_url,permalink,timestamp"
         
         return self._handle_api_call('GET', f'/me/media?fields={fields}&since={since}&until={until}')
     
-    def get_media_insights(self) -> Dict[str, Any]:
+    def get_media_insights(self, media_id: str) -> Dict[str, Any]:
         """Get media insights (if available)."""
-        media_id = self._validate_required_param('media_id')
         metrics = "impressions,reach,engagement,likes,comments,shares,saves"
         
         return self._handle_api_call('GET', f'/{media_id}/insights?metric={metrics}')
@@ -1,11 +1,17 @@
 """Spotify API implementation with only unique logic."""
 from typing import Dict, Any, List
 from base_api import BaseAPI
+from rate_limiter import RateLimit
+from param_schema import Param
+from pagination import PAGINATION_PARAMS
+from retry_policy import error_result
 import json
 
 class SpotifyAPI(BaseAPI):
     """Spotify API service implementation with only unique logic."""
     
+    rate_limits = {'': RateLimit(10, 20)}
+    
     def __init__(self):
         """Initialize Spotify API service."""
         credentials = self._load_credentials('spotify')
@@ -40,12 +46,20 @@ class SpotifyAPI(BaseAPI):
             "profile": {
                 "method": "GET",
                 "description": "Get user profile",
-                "handler": self.get_profile
+                "handler": self.get_profile,
+                "cache_ttl": 300,
+                "stale_while_revalidate": 3600
             },
             "playlists": {
                 "method": "GET", 
                 "description": "List user playlists",
-                "handler": self.get_playlists
+                "handler": self.get_playlists,
+                "cache_ttl": 60,
+                "stale_while_revalidate": 600,
+                "params": {
+                    "limit": Param(int, default=10, min=1, max=50, description="Number of playlists per page"),
+                    **PAGINATION_PARAMS
+                }
             },
             "currently-playing": {
                 "method": "GET",
@@ -57,7 +71,7 @@ class SpotifyAPI(BaseAPI):
                 "description": "Search music",
                 "handler": self.search,
                 "params": {
-                    "q": "Required: Search query (artist, track, album name)"
+                    "q": Param(str, required=True, description="Search query (artist, track, album name)")
                 }
             },
             "playback/next": {
@@ -93,10 +107,9 @@ class SpotifyAPI(BaseAPI):
         """Get Spotify user profile."""
         return self._handle_api_call('GET', '/me')
     
-    def get_playlists(self) -> Dict[str, Any]:
+    def get_playlists(self, limit: int = 10, all: bool = False, max_items: int = None) -> Dict[str, Any]:
         """Get Spotify playlists."""
-        limit = self._get_request_param('limit', 10, int)
-        return self._handle_api_call('GET', f'/me/playlists?limit={limit}')
+        return self._handle_list_call(f'/me/playlists?limit={limit}', 'items', all, max_items)
     
     def get_currently_playing(self) -> Dict[str, Any]:
         """Get currently playing track."""
@@ -106,12 +119,11 @@ class SpotifyAPI(BaseAPI):
                 return {"message": "No track currently playing"}
             return response.json()
         except Exception as e:
-            return {"error": str(e)}
+            return error_result(e)
     
-    def search(self) -> Dict[str, Any]:
+    def search(self, q: str) -> Dict[str, Any]:
         """Search Spotify."""
-        query = self._validate_required_param('q')
-        return self._handle_api_call('GET', f'/search?q={query}&type=track,artist,album&limit=20')
+        return self._handle_api_call('GET', f'/search?q={q}&type=track,artist,album&limit=20')
     
     def skip_next(self) -> Dict[str, Any]:
         """Skip to next track."""
@@ -119,7 +131,7 @@ class SpotifyAPI(BaseAPI):
             response = self._make_request('POST', '/me/player/next')
             return self._handle_success_response(response)
         except Exception as e:
-            return {"error": str(e)}
+            return error_result(e)
     
     def pause(self) -> Dict[str, Any]:
         """Pause playback."""
@@ -127,7 +139,7 @@ class SpotifyAPI(BaseAPI):
             response = self._make_request('PUT', '/me/player/pause')
             return self._handle_success_response(response)
         except Exception as e:
-            return {"error": str(e)}
+            return error_result(e)
     
     def resume(self) -> Dict[str, Any]:
         """Resume playback."""
@@ -135,4 +147,4 @@ class SpotifyAPI(BaseAPI):
             response = self._make_request('PUT', '/me/player/play')
             return self._handle_success_response(response)
         except Exception as e:
-            return {"error": str(e)}
\ No newline at end of file
+            return error_result(e)
\ No newline at end of file
@@ -1,5 +1,6 @@
 """WhatsApp Personal API package - Clean architecture."""
 
 from .whatsapp_server_api import WhatsAppServerAPI
+from .whatsapp_proxy_api import WhatsAppProxyAPI
 
-__all__ = ['WhatsAppServerAPI']
+__all__ = ['WhatsAppServerAPI', 'WhatsAppProxyAPI']
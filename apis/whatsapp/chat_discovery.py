@@ -5,6 +5,7 @@ from typing import Dict, Any, List, Optional
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
 
+from metrics import WHATSAPP_SECONDS
 from .utils import log_with_timestamp, extract_text_safely, is_element_displayed
 
 
@@ -29,6 +30,7 @@ class ChatDiscovery:
             "div[data-testid='chat-list'] > div"
         ]
     
+    @WHATSAPP_SECONDS.time('chat_scan')
     def scan_chat_list(self) -> Dict[str, Any]:
         """Scan chat list without reading messages."""
         current_time = time.time()
@@ -5,6 +5,7 @@ from typing import Dict, Any, List, Optional
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 
+from metrics import WHATSAPP_SECONDS
 from .utils import log_with_timestamp, extract_text_safely, is_element_displayed
 
 
@@ -56,6 +57,7 @@ class MessageReader:
             "div[class*='outgoing']"
         ]
     
+    @WHATSAPP_SECONDS.time('message_extraction')
     def read_messages_from_chat(self, chat_element, limit: int = 10) -> Dict[str, Any]:
         """Read messages from a specific chat (marks as read)."""
         try:
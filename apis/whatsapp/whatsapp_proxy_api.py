@@ -0,0 +1,113 @@
+"""WhatsApp Proxy API - Forwards WhatsApp Personal endpoints to a sidecar server."""
+
+from typing import Dict, Any, Tuple, Union
+import requests
+
+from http_transport import mount_shared_pools
+from retry_policy import UpstreamUnavailable
+from .whatsapp_server_api import WhatsAppServerAPI
+
+# Seconds clients should wait before retrying while the sidecar is unreachable
+SIDECAR_RETRY_AFTER = 1
+
+
+class WhatsAppProxyAPI(WhatsAppServerAPI):
+    """WhatsApp Personal API backed by a single-process sidecar.
+
+    The Selenium scraper owns a Chrome profile and cannot be shared between
+    pre-forked workers, so multi-worker servers register this proxy instead.
+    It exposes the same endpoints and forwards each call to the one process
+    that owns the browser session.
+    """
+
+    def __init__(self, sidecar_url: str, timeout: float = 120):
+        """Initialize proxy without creating a local scraper."""
+        self.service_name = 'whatsapp_personal'
+        self.sidecar_url = sidecar_url.rstrip('/')
+        self.timeout = timeout
+        self.session = mount_shared_pools(requests.Session())
+
+    def warm_up(self) -> None:
+        """Nothing to restore: the sidecar owns the browser session."""
+    
+    def _send(self, method: str, endpoint: str, **params) -> requests.Response:
+        """Call the sidecar; raise ``UpstreamUnavailable`` if it can't be reached."""
+        url = f"{self.sidecar_url}/{self.service_name}/{endpoint}"
+        params = {k: v for k, v in params.items() if v is not None}
+
+        try:
+            if method == 'GET':
+                return self.session.get(url, params=params, timeout=self.timeout)
+            return self.session.request(method, url, json=params, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise UpstreamUnavailable(f"WhatsApp sidecar unavailable: {e}", SIDECAR_RETRY_AFTER)
+
+    @staticmethod
+    def _body(response: requests.Response) -> Union[Dict[str, Any], str]:
+        if 'application/json' in response.headers.get('Content-Type', ''):
+            return response.json()
+        return response.text
+
+    def _forward(self, method: str, endpoint: str,
+                 **params) -> Tuple[Union[Dict[str, Any], str], int, Dict[str, str]]:
+        """Forward a call to the sidecar and relay its body, status code and Retry-After."""
+        response = self._send(method, endpoint, **params)
+        retry_after = response.headers.get('Retry-After')
+        return self._body(response), response.status_code, {'Retry-After': retry_after} if retry_after else {}
+
+    def is_authenticated(self) -> bool:
+        """Check authentication status on the sidecar."""
+        status = self.get_status()
+        return isinstance(status, dict) and status.get('authenticated', False)
+
+    # Session Management Endpoints
+    def start_session(self) -> Dict[str, Any]:
+        """Start WhatsApp Web session on the sidecar."""
+        return self._forward('POST', 'start_session')
+
+    def start_session_form(self) -> str:
+        """Show start session form served by the sidecar."""
+        return self._forward('GET', 'start_session_form')
+
+    def close_session(self) -> Dict[str, Any]:
+        """Close WhatsApp Web session on the sidecar."""
+        return self._forward('POST', 'close_session')
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get sidecar API status."""
+        try:
+            status = self._body(self._send('GET', 'get_status'))
+        except UpstreamUnavailable as e:
+            status = {"status": "error", **e.to_dict()}
+        if isinstance(status, dict):
+            status.setdefault('authenticated', False)
+            return status
+        return {"service": self.service_name, "authenticated": False, "status": "error",
+                "error": "Unexpected response from WhatsApp sidecar"}
+
+    def get_qr_code(self) -> Dict[str, Any]:
+        """Get QR code image from the sidecar."""
+        return self._forward('GET', 'get_qr_code')
+
+    # Message Endpoints
+    def get_messages(self, limit: int = 10, unread: bool = False, chat: str = None,
+                     contact: str = None) -> Dict[str, Any]:
+        """Get messages through the sidecar."""
+        return self._forward('GET', 'get_messages', limit=limit, unread=str(unread).lower(),
+                             chat=chat, contact=contact)
+
+    def get_latest_message(self) -> Dict[str, Any]:
+        """Get latest message through the sidecar."""
+        return self._forward('GET', 'get_latest_message')
+
+    def get_messages_from_chat(self, chat_name: str, limit: int = 10) -> Dict[str, Any]:
+        """Get messages from specific chat through the sidecar."""
+        return self._forward('GET', 'get_messages_from_chat', chat_name=chat_name, limit=limit)
+
+    def get_unread_messages(self, limit: int = 10) -> Dict[str, Any]:
+        """Get unread messages through the sidecar."""
+        return self._forward('GET', 'get_unread_messages', limit=limit)
+
+    def send_message(self, chat_name: str, message: str) -> Dict[str, Any]:
+        """Send message through the sidecar."""
+        return self._forward('POST', 'send_message', chat_name=chat_name, message=message)
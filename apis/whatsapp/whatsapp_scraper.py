@@ -13,6 +13,8 @@ from .authentication import AuthenticationManager
 from .chat_discovery import ChatDiscovery
 from .message_reader import MessageReader 
 from .utils import log_with_timestamp
+from metrics import WHATSAPP_SECONDS
+from service_registry import report_progress, warm_up_deferred
 
 
 class WhatsAppScraper:
@@ -42,6 +44,11 @@ class WhatsAppScraper:
         self._monitoring_running = False
         
         # Try to restore session if it was previously authenticated
+        if not warm_up_deferred():
+            self._try_restore_session()
+    
+    def warm_up(self) -> None:
+        """Restore a previously authenticated session (slow: drives the browser)."""
         self._try_restore_session()
     
     @property
@@ -85,12 +92,14 @@ class WhatsAppScraper:
                     log_with_timestamp(f"Using latest profile: {latest_profile.name}")
                 
                 # Initialize WebDriver with existing profile
+                report_progress("starting browser")
                 self.webdriver_manager.setup_driver()
                 
                 # Initialize managers
                 self._initialize_managers()
                 
                 # Navigate to WhatsApp Web
+                report_progress("loading WhatsApp Web")
                 self.driver.get("https://web.whatsapp.com")
                 log_with_timestamp("Waiting for WhatsApp Web to load (Chrome restoring session)...")
                 time.sleep(45)  # Give more time for page to fully load and restore
@@ -103,6 +112,7 @@ class WhatsAppScraper:
                 max_attempts = 12
                 for attempt in range(max_attempts):
                     log_with_timestamp(f"Session restoration attempt {attempt + 1}/{max_attempts}")
+                    report_progress(f"waiting for session restore ({attempt + 1}/{max_attempts})")
                     
                     # Check if session was restored successfully
                     if self.auth_manager.check_authentication_status():
@@ -118,6 +128,7 @@ class WhatsAppScraper:
                 
                 # If all attempts failed, try refreshing the page
                 log_with_timestamp("All restoration attempts failed, trying page refresh...")
+                report_progress("refreshing WhatsApp Web")
                 self.driver.refresh()
                 time.sleep(30)
                 
@@ -440,6 +451,7 @@ class WhatsAppScraper:
             "status": status
         }
     
+    @WHATSAPP_SECONDS.time('send')
     def send_message(self, chat_name: str, message: str) -> Dict[str, Any]:
         """Send message to specific chat using cached data."""
         if not self.auth_manager.check_authentication_status():
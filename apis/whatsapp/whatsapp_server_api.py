@@ -3,13 +3,15 @@
 import json
 import sys
 import os
+import urllib.parse
 from typing import Dict, Any, List
-from flask import request
 
 # Add project root to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
+from param_schema import Param
 from .whatsapp_scraper import WhatsAppScraper
+from .utils import log_with_timestamp
 
 
 class WhatsAppServerAPI:
@@ -29,6 +31,10 @@ class WhatsAppServerAPI:
             max_retries=self.config.get('max_retries', 3)
         )
     
+    def warm_up(self) -> None:
+        """Restore the scraper's browser session."""
+        self.scraper.warm_up()
+    
     def _load_config(self) -> Dict[str, Any]:
         """Load configuration from file."""
         try:
@@ -89,10 +95,10 @@ class WhatsAppServerAPI:
                 "description": "Get messages with configurable parameters",
                 "handler": self.get_messages,
                 "params": {
-                    "limit": "Optional: Number of messages to retrieve (default: 10)",
-                    "unread": "Optional: Filter for unread messages only (default: false)",
-                    "chat": "Optional: Specific chat name to get messages from",
-                    "contact": "Optional: Specific contact name (not implemented yet)"
+                    "limit": Param(int, default=10, min=1, max=10, description="Number of messages to retrieve"),
+                    "unread": Param(bool, default=False, description="Filter for unread messages only"),
+                    "chat": Param(str, description="Specific chat name to get messages from"),
+                    "contact": Param(str, description="Specific contact name (not implemented yet)")
                 }
             },
             "get_latest_message": {
@@ -106,8 +112,8 @@ class WhatsAppServerAPI:
                 "description": "Get messages from specific chat",
                 "handler": self.get_messages_from_chat,
                 "params": {
-                    "chat_name": "Required: Chat name to get messages from",
-                    "limit": "Optional: Number of messages to retrieve (default: 10)"
+                    "chat_name": Param(str, required=True, description="Chat name to get messages from"),
+                    "limit": Param(int, default=10, min=1, max=10, description="Number of messages to retrieve")
                 }
             },
             "get_unread_messages": {
@@ -115,7 +121,7 @@ class WhatsAppServerAPI:
                 "description": "Get unread messages from any chat",
                 "handler": self.get_unread_messages,
                 "params": {
-                    "limit": "Optional: Number of messages to retrieve (default: 10)"
+                    "limit": Param(int, default=10, min=1, max=10, description="Number of messages to retrieve")
                 }
             },
             "send_message": {
@@ -123,8 +129,8 @@ class WhatsAppServerAPI:
                 "description": "Send message to specific chat",
                 "handler": self.send_message,
                 "params": {
-                    "chat_name": "Required: Chat name to send message to",
-                    "message": "Required: Message text to send"
+                    "chat_name": Param(str, required=True, description="Chat name to send message to"),
+                    "message": Param(str, required=True, description="Message text to send")
                 }
             }
         }
@@ -138,37 +144,6 @@ class WhatsAppServerAPI:
             print(f"⚠️ Error checking authentication status: {e}")
             return False
     
-    def _validate_limit_param(self, param_name: str, max_value: int) -> int:
-        """Validate limit parameter."""
-        try:
-            value = request.args.get(param_name, max_value)
-            limit = int(value) if value else max_value
-            return min(limit, max_value)
-        except (ValueError, TypeError):
-            return max_value
-    
-    def _validate_required_param(self, param_name: str) -> str:
-        """Validate required parameter."""
-        try:
-            import urllib.parse
-            
-            # Try to get from URL parameters first
-            value = request.args.get(param_name)
-            
-            # If not found in URL params, try JSON body
-            if not value and request.is_json:
-                value = request.json.get(param_name)
-            
-            if not value:
-                raise ValueError(f"Missing required parameter: {param_name}")
-            
-            # URL decode the value to handle Hebrew characters
-            decoded_value = urllib.parse.unquote(str(value))
-            return decoded_value
-            
-        except (ValueError, TypeError) as e:
-            raise ValueError(f"Invalid parameter {param_name}: {e}")
-    
     # Session Management Endpoints
     def start_session(self) -> Dict[str, Any]:
         """Start WhatsApp Web session."""
@@ -271,18 +246,13 @@ class WhatsAppServerAPI:
             return {"success": False, "error": str(e)}
     
     # Message Endpoints - All use the same scraping function with different parameters
-    def get_messages(self) -> Dict[str, Any]:
+    def get_messages(self, limit: int = 10, unread: bool = False, chat: str = None,
+                     contact: str = None) -> Dict[str, Any]:
         """Get messages with configurable parameters."""
         if not self.is_authenticated():
             return {"error": "Not authenticated. Please start session first."}
         
         try:
-            # Parse parameters
-            limit = self._validate_limit_param('limit', 10)
-            unread = request.args.get('unread', 'false').lower() == 'true'
-            chat = request.args.get('chat')
-            contact = request.args.get('contact')  # Not implemented yet
-            
             # Use unified scraping function
             return self.scraper.get_messages(limit=limit, unread=unread, chat=chat, contact=contact)
             
@@ -301,14 +271,14 @@ class WhatsAppServerAPI:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def get_messages_from_chat(self) -> Dict[str, Any]:
+    def get_messages_from_chat(self, chat_name: str, limit: int = 10) -> Dict[str, Any]:
         """Get messages from specific chat."""
         if not self.is_authenticated():
             return {"error": "Not authenticated. Please start session first."}
         
         try:
-            chat_name = self._validate_required_param('chat_name')
-            limit = self._validate_limit_param('limit', 10)
+            # URL decode the chat name to handle Hebrew characters
+            chat_name = urllib.parse.unquote(chat_name)
             
             # Use unified scraping function with specific parameters
             return self.scraper.get_messages(limit=limit, unread=False, chat=chat_name)
@@ -316,28 +286,27 @@ class WhatsAppServerAPI:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def get_unread_messages(self) -> Dict[str, Any]:
+    def get_unread_messages(self, limit: int = 10) -> Dict[str, Any]:
         """Get unread messages from any chat."""
         if not self.is_authenticated():
             return {"error": "Not authenticated. Please start session first."}
         
         try:
-            limit = self._validate_limit_param('limit', 10)
-            
             # Use unified scraping function with specific parameters
             return self.scraper.get_messages(limit=limit, unread=True)
             
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def send_message(self) -> Dict[str, Any]:
+    def send_message(self, chat_name: str, message: str) -> Dict[str, Any]:
         """Send message to specific chat."""
         if not self.is_authenticated():
             return {"error": "Not authenticated. Please start session first."}
         
         try:
-            chat_name = self._validate_required_param('chat_name')
-            message = self._validate_required_param('message')
+            # URL decode the values to handle Hebrew characters
+            chat_name = urllib.parse.unquote(chat_name)
+            message = urllib.parse.unquote(message)
             
             # Use scraping function
             return self.scraper.send_message(chat_name, message)
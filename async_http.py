@@ -0,0 +1,204 @@
+"""Asyncio request path shared by BaseAPI and BaseMetaAPI.
+
+``AsyncRequestMixin`` adds ``_make_request_async`` / ``_handle_api_call_async``
+with the same bounded retry, 401-refresh and 429 handling as the synchronous
+``BaseAPI._make_request``. An async handler can fan out many upstream calls
+with ``asyncio.gather`` and hold them all in flight on one thread.
+
+Each worker process runs one event loop on a daemon thread, started on first
+use (so after gunicorn forks). ``run_async_handler`` runs async route
+handlers on it, and their calls share one long-lived ``httpx.AsyncClient``
+whose per-host pools are sized like the sync ones (``http_transport``), so
+keep-alive and HTTP/2 connections carry over from one request to the next.
+``close_shared_client()`` closes it at shutdown. ``async_session(**kwargs)``
+opens a dedicated client instead (tests, benchmarks), as does any call made
+on another event loop.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+import httpx
+
+from http_transport import async_client_kwargs
+from metrics import UPSTREAM_RETRIES, UPSTREAM_SECONDS
+from retry_policy import error_result, parse_retry_after
+
+_current_client: contextvars.ContextVar[Optional[httpx.AsyncClient]] = contextvars.ContextVar(
+    'async_http_client', default=None)
+
+DEFAULT_TIMEOUT = 30
+# Seconds shutdown waits for the shared client's connections to close
+CLOSE_TIMEOUT = 5
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_client: Optional[httpx.AsyncClient] = None
+_owner_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _worker_loop() -> asyncio.AbstractEventLoop:
+    """This process's event loop, running on its own thread (a forked child starts a new one)."""
+    global _loop, _client, _owner_pid
+    with _lock:
+        if _loop is None or _owner_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _client = None
+            _owner_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name='async-http', daemon=True).start()
+        return _loop
+
+
+def _shared_client() -> httpx.AsyncClient:
+    """The worker's long-lived client; only used on the worker loop."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, **async_client_kwargs())
+        return _client
+
+
+def close_shared_client() -> None:
+    """Close the worker's client and stop its loop (registered as a shutdown hook)."""
+    global _loop, _client
+    with _lock:
+        loop, client = _loop, _client
+        if loop is None or _owner_pid != os.getpid():
+            return
+        _loop = _client = None
+    if client is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(CLOSE_TIMEOUT)
+        except Exception as e:
+            print(f"⚠️ Async HTTP client did not close cleanly: {e}")
+    loop.call_soon_threadsafe(loop.stop)
+
+
+@asynccontextmanager
+async def async_session(**client_kwargs):
+    """Client for the async calls in this context.
+
+    With ``client_kwargs``, a dedicated client closed on exit. Without, the
+    worker's shared client when running on the worker loop, else a one-off.
+    """
+    existing = _current_client.get()
+    if existing is not None:
+        yield existing
+        return
+
+    if not client_kwargs and asyncio.get_running_loop() is _loop and _owner_pid == os.getpid():
+        token = _current_client.set(_shared_client())
+        try:
+            yield _current_client.get()
+        finally:
+            _current_client.reset(token)
+        return
+
+    client_kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+    # A caller-supplied transport must see every request, so no per-host mounts
+    defaults = async_client_kwargs(mounts='transport' not in client_kwargs)
+    for key, value in defaults.items():
+        client_kwargs.setdefault(key, value)
+    async with httpx.AsyncClient(**client_kwargs) as client:
+        token = _current_client.set(client)
+        try:
+            yield client
+        finally:
+            _current_client.reset(token)
+
+
+def run_async_handler(handler):
+    """Wrap an async endpoint handler so a sync Flask view can call it on the worker loop."""
+    def run(**kwargs):
+        return asyncio.run_coroutine_threadsafe(handler(**kwargs), _worker_loop()).result()
+
+    return run
+
+
+class AsyncRequestMixin:
+    """Async counterpart of ``_make_request`` for OAuth API base classes.
+
+    Expects the host class to provide ``service_name``, ``retry_policy``, ``rate_limiter``,
+    ``validators``, ``cache_identity``, ``_build_url``, ``_get_headers`` and
+    ``_refresh_single_flight``.
+    """
+
+    async def _make_request_async(self, method: str, endpoint: str, rate_limited: bool = True,
+                                  **kwargs) -> httpx.Response:
+        """Make authenticated async request with retry logic bounded by ``retry_policy``.
+
+        ``rate_limited=False`` skips the token bucket, for calls whose tokens
+        the caller already reserved (batch requests).
+        """
+        async with async_session() as client:
+            url = self._build_url(endpoint)
+            validator_key = self.validators.key(self.cache_identity(), url, kwargs.get('params')) if method == 'GET' else None
+            cached = self.validators.get(validator_key) if validator_key else None
+            extra_headers = {**(cached.conditional_headers() if cached else {}), **kwargs.pop('headers', {})}
+            headers = {**await asyncio.to_thread(self._get_headers), **extra_headers}
+            budget = self.retry_policy.start()
+
+            for attempt in range(self.retry_policy.max_attempts):
+                try:
+                    if rate_limited:
+                        await self.rate_limiter.acquire_async(endpoint)
+                    started = time.perf_counter()
+                    response = await client.request(method, url, headers=headers,
+                                                    timeout=budget.attempt_timeout(), **kwargs)
+                    UPSTREAM_SECONDS.observe(time.perf_counter() - started, self.service_name, method,
+                                             str(response.status_code))
+
+                    if response.status_code == 401:
+                        UPSTREAM_RETRIES.inc(self.service_name, '401')
+                        stale_token = headers.get('Authorization', '')[len('Bearer '):]
+                        if await asyncio.to_thread(self._refresh_single_flight, stale_token, '401'):
+                            headers = {**await asyncio.to_thread(self._get_headers), **extra_headers}
+                            continue
+                        else:
+                            raise Exception("Authentication failed and token refresh unsuccessful")
+
+                    if response.status_code == 304 and cached is not None:
+                        return self.validators.not_modified_async(cached, response.request)
+
+                    if response.status_code == 429:
+                        UPSTREAM_RETRIES.inc(self.service_name, '429')
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        await asyncio.sleep(budget.next_delay(attempt, "Rate limited by upstream", retry_after))
+                        continue
+
+                    if response.status_code >= 500:
+                        UPSTREAM_RETRIES.inc(self.service_name, '5xx')
+                        await asyncio.sleep(budget.next_delay(attempt, f"Upstream error {response.status_code}"))
+                        continue
+
+                    response.raise_for_status()
+                    if validator_key:
+                        self.validators.store(validator_key, response)
+                    return response
+
+                except httpx.TimeoutException:
+                    UPSTREAM_SECONDS.observe(time.perf_counter() - started, self.service_name, method, 'timeout')
+                    UPSTREAM_RETRIES.inc(self.service_name, 'timeout')
+                    await asyncio.sleep(budget.next_delay(attempt, "Request timeout"))
+
+                except httpx.TransportError:
+                    UPSTREAM_SECONDS.observe(time.perf_counter() - started, self.service_name, method, 'error')
+                    UPSTREAM_RETRIES.inc(self.service_name, 'connection')
+                    await asyncio.sleep(budget.next_delay(attempt, "Connection error"))
+
+                except httpx.HTTPStatusError as e:
+                    raise Exception(f"Request failed: {e}")
+
+            raise Exception(f"Request failed after {self.retry_policy.max_attempts} attempts")
+
+    async def _handle_api_call_async(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
+        """Handle async API call with common error handling."""
+        try:
+            response = await self._make_request_async(method, endpoint, **kwargs)
+            return response.json()
+        except Exception as e:
+            return error_result(e)
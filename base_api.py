@@ -5,11 +5,27 @@ import requests
 import time
 import json
 import os
+import sqlite3
 from pathlib import Path
+from async_http import AsyncRequestMixin
+from conditional_cache import ValidatorCache
+from http_transport import mount_shared_pools, plain_session
+from metrics import UPSTREAM_RETRIES, UPSTREAM_SECONDS
+from pagination import NextUrlCursor, PaginationMixin
+from rate_limiter import RateLimit, get_rate_limiter
+from response_cache import token_identity
+from retry_policy import RetryPolicy, error_result, parse_retry_after
+from token_refresh import TokenRefreshMixin, watch_token
+from token_store import open_token_store
+from service_registry import report_progress, warm_up_deferred
 
-class BaseAPI(ABC):
+class BaseAPI(AsyncRequestMixin, PaginationMixin, TokenRefreshMixin, ABC):
     """Base class for all API services with ALL common functionality."""
     
+    retry_policy = RetryPolicy()
+    rate_limits: Dict[str, RateLimit] = {}
+    cursor_style = NextUrlCursor()
+    
     def __init__(self, service_name: str, client_id: str, client_secret: str, 
                  redirect_uri: str, auth_url: str, token_url: str, api_base_url: str):
         """Initialize base API with all common components."""
@@ -20,13 +36,17 @@ class BaseAPI(ABC):
         self.auth_url = auth_url
         self.token_url = token_url
         self.api_base_url = api_base_url
+        self.rate_limiter = get_rate_limiter(service_name, self.rate_limits)
+        self.validators = ValidatorCache()
         self.tokens_file = self._get_tokens_file_path()
+        self.token_store = open_token_store(self.service_name, self.tokens_file)
         self._tokens = self._load_tokens()
-        self.session = requests.Session()
+        self.session = mount_shared_pools(requests.Session())
         self._setup_session()
         
-        # Try to restore authentication on startup
-        self._try_restore_authentication()
+        # Try to restore authentication on startup, unless the server warms up in the background
+        if not warm_up_deferred():
+            self.warm_up()
     
     def _get_tokens_file_path(self) -> Path:
         """Get path to tokens file."""
@@ -34,23 +54,21 @@ class BaseAPI(ABC):
         return current_dir / 'auth' / f'{self.service_name}_tokens.json'
     
     def _load_tokens(self) -> Dict[str, Any]:
-        """Load tokens from file."""
+        """Load tokens from the token store."""
         try:
-            if self.tokens_file.exists():
-                with open(self.tokens_file, 'r') as f:
-                    return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            return self.token_store.load()
+        except (OSError, ValueError, sqlite3.Error) as e:
             print(f"Warning: Could not load tokens: {e}")
         return {}
     
     def _save_tokens(self) -> None:
-        """Save tokens to file."""
-        try:
-            self.tokens_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.tokens_file, 'w') as f:
-                json.dump(self._tokens, f, indent=2)
-        except Exception as e:
-            print(f"Warning: Could not save tokens: {e}")
+        """Persist tokens in the background (debounced, atomic)."""
+        self.token_store.save(self._tokens)
+    
+    def warm_up(self) -> None:
+        """Restore saved authentication (may refresh the token over the network)."""
+        self._try_restore_authentication()
+        watch_token(self)
     
     def _try_restore_authentication(self) -> None:
         """Try to restore authentication on startup."""
@@ -73,6 +91,7 @@ class BaseAPI(ABC):
                 print(f"🔄 {self.service_name}: Token expired, attempting refresh...")
                 
                 # Try to refresh the token
+                report_progress("refreshing token")
                 if self._refresh_token():
                     print(f"✅ {self.service_name}: Token refreshed successfully!")
                 else:
@@ -80,6 +99,7 @@ class BaseAPI(ABC):
                     
                     # For Spotify, try automatic re-authentication
                     if self.service_name == 'spotify':
+                        report_progress("re-authenticating")
                         self._try_automatic_spotify_auth()
                     else:
                         # Clear invalid tokens for other services
@@ -111,7 +131,7 @@ class BaseAPI(ABC):
             }
             
             try:
-                response = self.session.post(self.token_url, data=data, timeout=30)
+                response = plain_session().post(self.token_url, data=data, timeout=30)
                 if response.status_code == 200:
                     token_data = response.json()
                     self._tokens.update({
@@ -173,10 +193,8 @@ class BaseAPI(ABC):
         }
         
         try:
-            # Spotify token endpoint expects form-encoded data, not JSON
-            # Use a fresh requests session without our JSON headers
-            import requests
-            response = requests.post(self.token_url, data=data, timeout=30)
+            # Token endpoints expect form-encoded data, so skip our JSON session headers
+            response = plain_session().post(self.token_url, data=data, timeout=30)
             response.raise_for_status()
             
             token_data = response.json()
@@ -218,7 +236,7 @@ class BaseAPI(ABC):
         }
         
         try:
-            response = self.session.post(self.token_url, data=data, timeout=30)
+            response = plain_session().post(self.token_url, data=data, timeout=30)
             response.raise_for_status()
             
             token_data = response.json()
@@ -238,12 +256,12 @@ class BaseAPI(ABC):
     
     def get_access_token(self) -> Optional[str]:
         """Get current access token, refreshing if necessary."""
+        self._sync_tokens()
         if not self._tokens.get('access_token'):
             return None
         
-        expires_at = self._tokens.get('expires_at', 0)
-        if time.time() >= expires_at - 300:  # Refresh 5 minutes before expiry
-            if not self._refresh_token():
+        if self._token_expiring():  # Refresh 5 minutes before expiry
+            if not self._refresh_single_flight():
                 return None
         
         return self._tokens.get('access_token')
@@ -252,6 +270,11 @@ class BaseAPI(ABC):
         """Check if API is authenticated."""
         return bool(self.get_access_token())
     
+    def cache_identity(self) -> str:
+        """Identify the authenticated account for response cache keys."""
+        self._sync_tokens()
+        return token_identity(self._tokens)
+    
     def _get_headers(self) -> Dict[str, str]:
         """Get headers with current access token."""
         access_token = self.get_access_token()
@@ -264,57 +287,81 @@ class BaseAPI(ABC):
             'Accept': 'application/json'
         }
     
-    def _make_request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
-        """Make authenticated request with retry logic."""
-        url = f"{self.api_base_url}{endpoint}"
-        headers = self._get_headers()
+    def _build_url(self, endpoint: str) -> str:
+        """Build full API URL for an endpoint (or pass through a pagination URL)."""
+        if endpoint.startswith(self.api_base_url):
+            return endpoint
+        return f"{self.api_base_url}{endpoint}"
+    
+    def _make_request(self, method: str, endpoint: str, rate_limited: bool = True, **kwargs) -> requests.Response:
+        """Make authenticated request with retry logic bounded by ``retry_policy``.
+        
+        ``rate_limited=False`` skips the limiter, for batch calls whose
+        sub-requests were already charged.
+        """
+        url = self._build_url(endpoint)
+        validator_key = self.validators.key(self.cache_identity(), url, kwargs.get('params')) if method == 'GET' else None
+        cached = self.validators.get(validator_key) if validator_key else None
+        extra_headers = {**(cached.conditional_headers() if cached else {}), **kwargs.pop('headers', {})}
+        headers = {**self._get_headers(), **extra_headers}
+        budget = self.retry_policy.start()
         
-        for attempt in range(3):
+        for attempt in range(self.retry_policy.max_attempts):
             try:
+                if rate_limited:
+                    self.rate_limiter.acquire(endpoint)
+                started = time.perf_counter()
                 response = self.session.request(
                     method=method,
                     url=url,
                     headers=headers,
-                    timeout=30,
+                    timeout=budget.attempt_timeout(),
                     **kwargs
                 )
+                UPSTREAM_SECONDS.observe(time.perf_counter() - started, self.service_name, method,
+                                         str(response.status_code))
                 
                 if response.status_code == 401:
-                    if self._refresh_token():
-                        headers = self._get_headers()
+                    UPSTREAM_RETRIES.inc(self.service_name, '401')
+                    if self._refresh_single_flight(headers.get('Authorization', '')[len('Bearer '):], trigger='401'):
+                        headers = {**self._get_headers(), **extra_headers}
                         continue
                     else:
                         raise Exception("Authentication failed and token refresh unsuccessful")
                 
+                if response.status_code == 304 and cached is not None:
+                    return self.validators.not_modified(cached, url)
+                
                 if response.status_code == 429:
-                    retry_after = int(response.headers.get('Retry-After', 1))
-                    time.sleep(retry_after)
+                    UPSTREAM_RETRIES.inc(self.service_name, '429')
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    time.sleep(budget.next_delay(attempt, "Rate limited by upstream", retry_after))
                     continue
                 
                 if response.status_code >= 500:
-                    if attempt < 2:
-                        time.sleep(1 * (2 ** attempt))
-                        continue
+                    UPSTREAM_RETRIES.inc(self.service_name, '5xx')
+                    time.sleep(budget.next_delay(attempt, f"Upstream error {response.status_code}"))
+                    continue
                 
                 response.raise_for_status()
+                if validator_key:
+                    self.validators.store(validator_key, response)
                 return response
                 
             except requests.exceptions.Timeout:
-                if attempt < 2:
-                    time.sleep(1 * (2 ** attempt))
-                    continue
-                raise Exception(f"Request timeout after 3 attempts")
+                UPSTREAM_SECONDS.observe(time.perf_counter() - started, self.service_name, method, 'timeout')
+                UPSTREAM_RETRIES.inc(self.service_name, 'timeout')
+                time.sleep(budget.next_delay(attempt, "Request timeout"))
             
             except requests.exceptions.ConnectionError:
-                if attempt < 2:
-                    time.sleep(1 * (2 ** attempt))
-                    continue
-                raise Exception(f"Connection error after 3 attempts")
+                UPSTREAM_SECONDS.observe(time.perf_counter() - started, self.service_name, method, 'error')
+                UPSTREAM_RETRIES.inc(self.service_name, 'connection')
+                time.sleep(budget.next_delay(attempt, "Connection error"))
             
             except requests.exceptions.RequestException as e:
                 raise Exception(f"Request failed: {e}")
         
-        raise Exception(f"Request failed after 3 attempts")
+        raise Exception(f"Request failed after {self.retry_policy.max_attempts} attempts")
     
     def _handle_api_call(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """Handle API call with common error handling."""
@@ -322,29 +369,7 @@ class BaseAPI(ABC):
             response = self._make_request(method, endpoint, **kwargs)
             return response.json()
         except Exception as e:
-            return {"error": str(e)}
-    
-    def _get_request_param(self, param_name: str, default_value: Any = None, param_type: type = str) -> Any:
-        """Get request parameter with common handling."""
-        try:
-            from flask import request
-            value = request.args.get(param_name, default_value)
-            if param_type == int and value is not None:
-                return int(value)
-            return value
-        except (ValueError, TypeError):
-            return default_value
-    
-    def _validate_required_param(self, param_name: str) -> str:
-        """Validate required parameter."""
-        try:
-            from flask import request
-            value = request.args.get(param_name) or (request.json.get(param_name) if request.is_json else None)
-            if not value:
-                raise ValueError(f"Missing required parameter: {param_name}")
-            return str(value)
-        except (ValueError, TypeError) as e:
-            raise ValueError(f"Invalid parameter {param_name}: {e}")
+            return error_result(e)
     
     def _load_credentials(self, service_name: str) -> Dict[str, str]:
         """Load service credentials."""
@@ -370,7 +395,8 @@ class BaseAPI(ABC):
         return {
             "service": self.service_name,
             "authenticated": self.is_authenticated(),
-            "status": "ready" if self.is_authenticated() else "not_authenticated"
+            "status": "ready" if self.is_authenticated() else "not_authenticated",
+            "conditional_requests": dict(self.validators.stats)
         }
     
     @abstractmethod
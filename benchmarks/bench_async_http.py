@@ -0,0 +1,122 @@
+"""Concurrency benchmark: sync ``_make_request`` vs async ``_make_request_async``.
+
+A local stub upstream answers every request after a fixed delay (simulating
+a slow provider). For a growing number of upstream calls per request we
+measure wall time for:
+
+- sync, serial:   N calls through ``BaseAPI._make_request`` on one thread
+- sync, threads:  N calls through a 16-thread pool (the old way to overlap)
+- async, gather:  N ``_make_request_async`` calls awaited together on one thread
+
+    python benchmarks/bench_async_http.py [--delay-ms 100] [--fanout 1 10 50 200]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from async_http import async_session
+from base_api import BaseAPI
+
+
+class StubUpstream(BaseHTTPRequestHandler):
+    """Answers any GET with a small JSON body after ``delay`` seconds."""
+
+    delay = 0.1
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class BenchAPI(BaseAPI):
+    """Minimal BaseAPI pointed at the stub upstream."""
+
+    def __init__(self, base_url: str):
+        super().__init__('bench_async', 'id', 'secret', 'http://localhost/cb',
+                         f'{base_url}/auth', f'{base_url}/token', base_url)
+        self._tokens = {'access_token': 'bench', 'expires_at': time.time() + 3600}
+
+    def _save_tokens(self) -> None:
+        pass
+
+    def get_scopes(self):
+        return []
+
+    def get_endpoints(self):
+        return {}
+
+    def get_service_info(self):
+        return {}
+
+
+def sync_serial(api: BenchAPI, n: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        api._make_request('GET', f'/item/{i}')
+    return time.perf_counter() - start
+
+
+def sync_threads(api: BenchAPI, n: int, threads: int = 16) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda i: api._make_request('GET', f'/item/{i}'), range(n)))
+    return time.perf_counter() - start
+
+
+def async_gather(api: BenchAPI, n: int) -> float:
+    async def run():
+        async with async_session():
+            await asyncio.gather(*(api._make_request_async('GET', f'/item/{i}') for i in range(n)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--delay-ms', type=float, default=100)
+    parser.add_argument('--fanout', type=int, nargs='+', default=[1, 10, 50, 200])
+    parser.add_argument('--skip-serial-above', type=int, default=50,
+                        help="Serial runs take fanout * delay; skip them for large fanouts")
+    args = parser.parse_args()
+
+    StubUpstream.delay = args.delay_ms / 1000
+    server = StubServer(('127.0.0.1', 0), StubUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api = BenchAPI(f'http://127.0.0.1:{server.server_address[1]}')
+
+    print(f"upstream delay {args.delay_ms:.0f} ms")
+    print(f"{'calls':>6} {'sync serial s':>14} {'sync 16 threads s':>18} {'async gather s':>15}")
+    for n in args.fanout:
+        serial = f"{sync_serial(api, n):14.2f}" if n <= args.skip_serial_above else f"{'-':>14}"
+        threaded = sync_threads(api, n)
+        gathered = async_gather(api, n)
+        print(f"{n:>6} {serial} {threaded:>18.2f} {gathered:>15.2f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
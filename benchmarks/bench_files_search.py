@@ -0,0 +1,98 @@
+"""Files search benchmark: full scan vs inverted index.
+
+Generates a corpus of N ``.txt`` files in a temp directory (random words
+from a Zipf-like vocabulary, with a few rare marker words) and measures:
+
+- the decoded serial scan (every file read into a string per query)
+- ``search_files(mode="scan")``: the mmap scan, over a process pool once the
+  corpus is large enough (``FILES_SCAN_WORKERS``, default: all cores)
+- building the index from scratch and reloading it after a "restart"
+- index lookups (``candidates``) and full ``search_files`` calls for a
+  rare word, a common word and a partial word
+- BM25 ``ranked_search`` for the first page of a few ranked queries
+
+    python benchmarks/bench_files_search.py [--files 1000 10000 30000] [--lines 20]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from apis.files.files_api import FilesAPI
+
+
+def build_corpus(base: Path, files: int, lines: int, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(20000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    for n in range(files):
+        words = rng.choices(vocabulary, weights, k=lines * 10)
+        body = [' '.join(words[i:i + 10]) for i in range(0, len(words), 10)]
+        if n % 1000 == 0:
+            body[rng.randrange(lines)] += ' zephyrine'
+        (base / f"doc-{n:06d}.txt").write_text('\n'.join(body))
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    """Best wall time of ``repeat`` runs, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, nargs='+', default=[1000, 10000, 30000])
+    parser.add_argument('--lines', type=int, default=20)
+    args = parser.parse_args()
+
+    queries = [('rare word', 'zephyrine'), ('common word', 'w3'), ('partial word', 'ephyr')]
+    ranked_queries = ['zephyrine', 'w50 w700', '"w1 w2"', 'w12*']
+
+    for n in args.files:
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp) / 'data'
+            base.mkdir()
+            build_corpus(base, n, args.lines)
+            index_path = str(Path(tmp) / 'index.sqlite')
+
+            api = FilesAPI(str(base), index_path=index_path)
+            start = time.perf_counter()
+            api.search_index._ensure_loaded()
+            build_ms = (time.perf_counter() - start) * 1000
+            api.search_index._conn.close()
+
+            api = FilesAPI(str(base), index_path=index_path)
+            start = time.perf_counter()
+            api.search_index._ensure_loaded()
+            reload_ms = (time.perf_counter() - start) * 1000
+
+
+            print(f"\n{n} files x {args.lines} lines: index build {build_ms:.0f} ms, reload {reload_ms:.0f} ms")
+            print(f"{'query':<14} {'decoded ms':>10} {'scan ms':>10} {'lookup ms':>10} {'search ms':>10} {'files':>6}")
+            for label, query in queries:
+                decoded_ms = best_of(lambda: [api._match_file(p, query.lower()) for p in api._text_files()], repeat=1)
+                scan_ms = best_of(lambda: api.search_files(query, mode="scan"), repeat=2)
+                lookup_ms = best_of(lambda: api.search_index.candidates(query))
+                search_ms = best_of(lambda: api.search_files(query), repeat=3)
+                hits = api.search_files(query)['total_matches']
+                print(f"{label:<14} {decoded_ms:>10.1f} {scan_ms:>10.1f} {lookup_ms:>10.3f} {search_ms:>10.1f} {hits:>6}")
+
+            print(f"{'ranked query':<22} {'rank ms':>10} {'page ms':>10} {'files':>6}")
+            for query in ranked_queries:
+                rank_ms = best_of(lambda: api.search_index.rank(query, 0, 20))
+                page_ms = best_of(lambda: api.ranked_search(query, 0, 20))
+                hits = api.ranked_search(query, 0, 20)['total_matches']
+                print(f"{query:<22} {rank_ms:>10.2f} {page_ms:>10.2f} {hits:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Microbenchmark: per-request overhead of the route layer.
+
+Compares the legacy ``create_api_route_handler`` (closure rebuilt and handler
+name matched on every request) with compiled ``EndpointDispatcher`` routes.
+Both variants serve the same no-op service through the Flask test client, so
+the difference is the route layer itself.
+
+    python benchmarks/bench_route_dispatch.py [--requests 20000]
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask, request, jsonify
+from param_schema import Param
+from route_dispatch import compile_endpoint
+
+
+class FakeFilesService:
+    """No-op stand-in for FilesBaseAPI."""
+
+    def get_endpoints(self):
+        return {
+            "list": {"method": "GET", "handler": self.list_files,
+                     "params": {"extension": Param(str)}},
+            "read": {"method": "GET", "handler": self.read_file,
+                     "params": {"filename": Param(str, required=True)}},
+            "search": {"method": "GET", "handler": self.search_files,
+                       "params": {"query": Param(str, required=True)}},
+            "stats": {"method": "GET", "handler": self.get_file_stats},
+        }
+
+    def list_files(self, extension=None):
+        return {"success": True, "files": []}
+
+    def read_file(self, filename):
+        return {"success": True, "file": {"name": filename}}
+
+    def search_files(self, query):
+        return {"success": True, "results": []}
+
+    def get_file_stats(self):
+        return {"success": True, "stats": {}}
+
+
+class FakeOAuthService:
+    """No-op stand-in for an authenticated BaseAPI service."""
+
+    def is_authenticated(self):
+        return True
+
+    def get_endpoints(self):
+        return {"profile": {"method": "GET", "handler": self.get_profile}}
+
+    def get_profile(self):
+        return {"id": "bench"}
+
+
+def legacy_route_handler(handler, service, service_name):
+    """Copy of the pre-dispatcher route logic (per-request closure + name sniffing)."""
+    def route_handler():
+        print(f"=== CREATE_API_ROUTE_HANDLER CALLED for {service_name} ===")
+        if service_name == 'files':
+            if 'read' in handler.__name__:
+                filename = request.args.get('filename')
+                if not filename:
+                    return jsonify({"success": False, "error": "filename parameter required"}), 400
+                result = handler(filename)
+            elif 'search' in handler.__name__:
+                query = request.args.get('query')
+                if not query:
+                    return jsonify({"success": False, "error": "query parameter required"}), 400
+                result = handler(query)
+            elif 'list' in handler.__name__:
+                result = handler(request.args.get('extension'))
+            else:
+                result = handler()
+            return jsonify(result), 200 if 'error' not in result else 500
+
+        if not service.is_authenticated():
+            return jsonify({"error": f"{service_name.title()} authentication required"}), 401
+        result = handler()
+        return jsonify(result), 200 if 'error' not in result else 500
+    return route_handler
+
+
+def build_app(compiled: bool) -> Flask:
+    """Register the fake services with either the legacy or compiled route layer."""
+    app = Flask(__name__)
+    for service_name, service in (('files', FakeFilesService()), ('spotify', FakeOAuthService())):
+        for endpoint_path, endpoint_config in service.get_endpoints().items():
+            func_name = f"{service_name}_{endpoint_path}_get"
+            if compiled:
+                view = compile_endpoint(service_name, service, endpoint_path, endpoint_config, func_name)
+            else:
+                def view(h=endpoint_config['handler'], s=service, sn=service_name):
+                    return legacy_route_handler(h, s, sn)()
+            app.add_url_rule(f'/{service_name}/{endpoint_path}', func_name, view, methods=['GET'])
+    return app
+
+
+PATHS = [
+    '/files/list',
+    '/files/read?filename=a.txt',
+    '/files/search?query=ai',
+    '/files/stats',
+    '/spotify/profile',
+]
+
+
+def run_client(app: Flask, n: int) -> float:
+    """Mean microseconds per full request through the Flask test client."""
+    client = app.test_client()
+    for path in PATHS:  # warm up
+        client.get(path)
+    start = time.perf_counter()
+    for i in range(n):
+        client.get(PATHS[i % len(PATHS)])
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def run_views(app: Flask, n: int) -> float:
+    """Mean microseconds spent inside the route views only."""
+    views = []
+    for path in PATHS:
+        with app.test_request_context(path):
+            views.append(app.view_functions[request.url_rule.endpoint])
+    total = 0.0
+    for i in range(n):
+        index = i % len(PATHS)
+        with app.test_request_context(PATHS[index]):
+            start = time.perf_counter()
+            views[index]()
+            total += time.perf_counter() - start
+    return total / n * 1e6
+
+
+def report(label: str, legacy: float, compiled: float) -> None:
+    print(label)
+    print(f"  legacy route handler:  {legacy:8.1f} us/request")
+    print(f"  compiled dispatcher:   {compiled:8.1f} us/request")
+    print(f"  saved per request:     {legacy - compiled:8.1f} us ({(1 - compiled / legacy) * 100:.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    legacy_app, compiled_app = build_app(compiled=False), build_app(compiled=True)
+
+    # The legacy handler printed on every request; keep that cost but not the noise
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        legacy_views = run_views(legacy_app, args.requests)
+        compiled_views = run_views(compiled_app, args.requests)
+        legacy_client = run_client(legacy_app, args.requests)
+        compiled_client = run_client(compiled_app, args.requests)
+
+    report("Route view only:", legacy_views, compiled_views)
+    report("Full request via Flask test client:", legacy_client, compiled_client)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Load benchmark: Werkzeug dev server vs pre-forked gunicorn workers.
+
+Starts both servers (or targets already running ones) and drives
+``/health`` and ``/files/list`` with a fixed number of concurrent
+keep-alive clients, reporting requests/second and p50/p99 latency.
+
+    python benchmarks/bench_serving.py [--concurrency 32] [--duration 10]
+    python benchmarks/bench_serving.py --dev-url http://127.0.0.1:8081 --prod-url http://127.0.0.1:8090
+
+Spawned servers run from the repository root and need the same auth/
+configuration as a normal start.
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PATHS = ['/health', '/files/list']
+
+
+def start_server(kind: str, port: int, workers: int, threads: int) -> subprocess.Popen:
+    """Start the dev server or gunicorn on ``port``."""
+    env = dict(os.environ, API_PORT=str(port), WHATSAPP_MODE='disabled',
+               API_WORKERS=str(workers), API_THREADS=str(threads))
+    if kind == 'dev':
+        cmd = [sys.executable, 'api_server.py']
+    else:
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+               '--access-logfile', '/dev/null', 'wsgi:app']
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(base_url: str, timeout: float = 60) -> None:
+    """Block until ``/health`` answers."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f"{base_url}/health", timeout=2)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.25)
+    raise RuntimeError(f"Server at {base_url} did not become ready")
+
+
+def _client(url: str, threads: int, duration: float) -> tuple:
+    """One client process: ``threads`` keep-alive sessions until the deadline."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        session = requests.Session()
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.get(url, timeout=30)
+                if response.status_code >= 500:
+                    failed += 1
+            except requests.exceptions.RequestException:
+                failed += 1
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return latencies, errors[0]
+
+
+def load(url: str, concurrency: int, duration: float, client_procs: int) -> dict:
+    """Hammer ``url`` with ``concurrency`` clients; return throughput and latency.
+
+    Clients are spread over several processes so the load generator's GIL
+    is not the bottleneck being measured.
+    """
+    client_procs = max(1, min(client_procs, concurrency))
+    per_proc = [concurrency // client_procs + (i < concurrency % client_procs) for i in range(client_procs)]
+    started = time.perf_counter()
+    with multiprocessing.Pool(client_procs) as pool:
+        results = pool.starmap(_client, [(url, n, duration) for n in per_proc])
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for result, _ in results for latency in result)
+    errors = sum(failed for _, failed in results)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "rps": count / elapsed if elapsed else 0.0,
+        "p50_ms": latencies[int(count * 0.50)] * 1000 if count else 0.0,
+        "p99_ms": latencies[min(count - 1, int(count * 0.99))] * 1000 if count else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--client-procs', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--dev-url', help="Use an already running dev server")
+    parser.add_argument('--prod-url', help="Use an already running gunicorn server")
+    args = parser.parse_args()
+
+    targets = [('dev server', args.dev_url, 'dev', 18081),
+               (f'gunicorn {args.workers}x{args.threads}', args.prod_url, 'prod', 18082)]
+
+    print(f"{'server':<20} {'path':<12} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for label, url, kind, port in targets:
+        process = None
+        if not url:
+            url = f"http://127.0.0.1:{port}"
+            process = start_server(kind, port, args.workers, args.threads)
+        try:
+            wait_ready(url)
+            for path in PATHS:
+                result = load(url + path, args.concurrency, args.duration, args.client_procs)
+                print(f"{label:<20} {path:<12} {result['rps']:>10.1f} {result['p50_ms']:>9.2f} "
+                      f"{result['p99_ms']:>9.2f} {result['errors']:>7}")
+        finally:
+            if process:
+                process.terminate()
+                process.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
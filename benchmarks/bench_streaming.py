@@ -0,0 +1,97 @@
+"""Streaming benchmark: ``jsonify(list)`` vs streamed NDJSON / JSON array.
+
+Builds a route returning N synthetic Drive-like items, either as one
+``{"files": [...]}`` dict or as a generator, and measures through the Flask
+test client:
+
+- time to first byte (first body chunk handed to the server)
+- total time to drain the body
+- peak Python memory while serving (tracemalloc)
+
+    python benchmarks/bench_streaming.py [--items 1000 10000 100000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+from route_dispatch import compile_endpoint
+
+
+def make_item(i: int) -> dict:
+    return {"id": f"file-{i}", "name": f"report-{i}.pdf", "mimeType": "application/pdf",
+            "modifiedTime": "2026-01-01T00:00:00Z", "size": str(1000 + i)}
+
+
+class Source:
+    """Handlers producing the same items eagerly or lazily."""
+
+    def __init__(self, n: int):
+        self.n = n
+
+    def as_dict(self):
+        return {"files": [make_item(i) for i in range(self.n)]}
+
+    def as_generator(self):
+        return (make_item(i) for i in range(self.n))
+
+
+def build_client(n: int):
+    source = Source(n)
+    app = Flask(__name__)
+    for name, handler in [('dict', source.as_dict), ('stream', source.as_generator)]:
+        app.add_url_rule(f'/files/{name}', name, compile_endpoint(
+            'files', source, name, {"method": "GET", "handler": handler}, name))
+    return app.test_client()
+
+
+def drain(client, path: str, accept: str) -> tuple:
+    """Fetch ``path`` chunk by chunk; return (ttfb_s, total_s, body_bytes)."""
+    start = time.perf_counter()
+    response = client.get(path, headers={'Accept': accept}, buffered=False)
+    body = iter(response.response)
+    first = next(body)
+    ttfb = time.perf_counter() - start
+    size = len(first) + sum(len(chunk) for chunk in body)
+    total = time.perf_counter() - start
+    response.close()
+    return ttfb, total, size
+
+
+def measure(client, path: str, accept: str) -> tuple:
+    """Return (ttfb_ms, total_ms, peak_mb, body_bytes).
+
+    Timings come from a plain run; peak memory from a second run under
+    tracemalloc, which would otherwise distort the timings.
+    """
+    ttfb, total, size = drain(client, path, accept)
+    tracemalloc.start()
+    drain(client, path, accept)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ttfb * 1000, total * 1000, peak / (1024 * 1024), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    cases = [('jsonify dict', '/files/dict', 'application/json'),
+             ('stream ndjson', '/files/stream', 'application/x-ndjson'),
+             ('stream json array', '/files/stream', 'application/json')]
+
+    print(f"{'items':>7} {'mode':<18} {'ttfb ms':>9} {'total ms':>9} {'peak MB':>8} {'body KB':>9}")
+    for n in args.items:
+        client = build_client(n)
+        for label, path, accept in cases:
+            ttfb, total, peak, size = measure(client, path, accept)
+            print(f"{n:>7} {label:<18} {ttfb:>9.2f} {total:>9.1f} {peak:>8.2f} {size / 1024:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
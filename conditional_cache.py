@@ -0,0 +1,151 @@
+"""Conditional GET support: remember validators, serve 304s from stored bodies.
+
+For every successful GET that carries an ``ETag`` or ``Last-Modified`` header
+the body is kept (bounded by total bytes, LRU). The next request for the same
+URL and account sends ``If-None-Match`` / ``If-Modified-Since``. On a 304 the
+caller gets a response rebuilt from the stored body, so large playlist and
+Drive listings skip the download. ``json()`` decodes the stored bytes on every
+call: handlers enrich their results in place, so a shared object would carry
+one caller's edits into the next 304.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional
+
+import httpx
+import requests
+
+from metrics import Family
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get('VALIDATOR_CACHE_MB', 32)) * 1024 * 1024)
+
+
+class ValidatorEntry:
+    """Stored validators and body for one URL."""
+
+    __slots__ = ('etag', 'last_modified', 'content', 'headers')
+
+    def __init__(self, etag: Optional[str], last_modified: Optional[str], content: bytes, headers: Dict[str, str]):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content = content
+        self.headers = headers
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Headers that make the next GET conditional."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def parsed(self) -> Any:
+        """A freshly decoded copy of the JSON body, safe for the caller to modify."""
+        return json.loads(self.content)
+
+
+class CachedResponse(requests.Response):
+    """``requests.Response`` rebuilt from a stored body after a 304."""
+
+    def __init__(self, entry: ValidatorEntry, url: str):
+        super().__init__()
+        self.status_code = 200
+        self._content = entry.content
+        self.headers.update(entry.headers)
+        self.url = url
+        self.entry = entry
+
+    def json(self, **kwargs) -> Any:
+        return self.entry.parsed()
+
+
+class AsyncCachedResponse(httpx.Response):
+    """``httpx.Response`` rebuilt from a stored body after a 304."""
+
+    def __init__(self, entry: ValidatorEntry, request: httpx.Request):
+        super().__init__(200, content=entry.content, headers=entry.headers, request=request)
+        self.entry = entry
+
+    def json(self, **kwargs) -> Any:
+        return self.entry.parsed()
+
+
+class ValidatorCache:
+    """Per-service store of validators and bodies, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, ValidatorEntry]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {"conditional_requests": 0, "not_modified": 0, "bytes_saved": 0}
+
+    @staticmethod
+    def key(identity: str, url: str, params: Any = None) -> str:
+        """Cache key for a GET of ``url`` with ``params`` by one account."""
+        if params:
+            items = params.items() if isinstance(params, dict) else params
+            url = f"{url}?{sorted((str(k), str(v)) for k, v in items)}"
+        return f"{identity}:{url}"
+
+    def get(self, key: str) -> Optional[ValidatorEntry]:
+        """Stored entry for ``key``, counting a conditional request if found."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["conditional_requests"] += 1
+            return entry
+
+    def store(self, key: str, response) -> None:
+        """Remember validators and body of a 200 response that has any."""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not (etag or last_modified) or response.status_code != 200:
+            return
+        content = response.content
+        if len(content) > self.max_bytes:
+            return
+        content_type = response.headers.get('Content-Type', 'application/json')
+        entry = ValidatorEntry(etag, last_modified, content, {'Content-Type': content_type})
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old.content)
+            self._entries[key] = entry
+            self._size += len(content)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.content)
+
+    def _record_hit(self, entry: ValidatorEntry) -> None:
+        with self._lock:
+            self.stats["not_modified"] += 1
+            self.stats["bytes_saved"] += len(entry.content)
+
+    def not_modified(self, entry: ValidatorEntry, url: str) -> CachedResponse:
+        """Response to hand back for a 304 on the sync path."""
+        self._record_hit(entry)
+        return CachedResponse(entry, url)
+
+    def not_modified_async(self, entry: ValidatorEntry, request: httpx.Request) -> AsyncCachedResponse:
+        """Response to hand back for a 304 on the async path."""
+        self._record_hit(entry)
+        return AsyncCachedResponse(entry, request)
+
+
+def validator_families(stats: Dict[str, Dict[str, int]]) -> Iterator[Family]:
+    """``/metrics`` families for ``{service: ValidatorCache.stats}``."""
+    yield ('conditional_requests_total', 'counter', 'Upstream GETs sent with cached validators',
+           [({"service": name}, s["conditional_requests"]) for name, s in stats.items()])
+    yield ('conditional_not_modified_total', 'counter', 'Conditional GETs answered 304 Not Modified',
+           [({"service": name}, s["not_modified"]) for name, s in stats.items()])
+    yield ('conditional_bytes_saved_total', 'counter', 'Response body bytes not downloaded thanks to 304s',
+           [({"service": name}, s["bytes_saved"]) for name, s in stats.items()])
+    yield ('conditional_hit_ratio', 'gauge', '304 answers over conditional GETs',
+           [({"service": name}, s["not_modified"] / s["conditional_requests"] if s["conditional_requests"] else 0)
+            for name, s in stats.items()])
@@ -0,0 +1,54 @@
+"""Gunicorn configuration for the API server.
+
+Pre-fork workers with a thread pool each. Tune with environment variables:
+
+    API_PORT              Port to bind (default: 8081)
+    API_WORKERS           Worker processes (default: 2 * CPUs + 1)
+    API_THREADS           Threads per worker (default: 4)
+    API_TIMEOUT           Worker timeout in seconds (default: 120)
+    WHATSAPP_MODE         local | sidecar | disabled (see below)
+    WHATSAPP_SIDECAR_URL  URL of the single-process WhatsApp server
+    METRICS_MULTIPROC_DIR Where workers share /metrics samples
+                          (default with several workers: <tmp>/api-server-metrics)
+
+The Selenium-backed WhatsApp Personal scraper owns one Chrome profile and
+cannot be shared across processes. With more than one worker it is served
+by a single-process sidecar (``WHATSAPP_SIDECAR_URL``) that every worker
+proxies to. Without a sidecar URL, WhatsApp routes are disabled rather than
+starting one browser per worker.
+"""
+import multiprocessing
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('API_PORT', '8081')}"
+workers = int(os.environ.get('API_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Seen by workers, which size their Files scan pools from it
+os.environ['API_WORKERS'] = str(workers)
+threads = int(os.environ.get('API_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.environ.get('API_TIMEOUT', 120))
+keepalive = 5
+
+# Each worker builds its own services (HTTP sessions, tokens) after fork
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+
+if workers > 1 and os.environ.get('WHATSAPP_MODE', 'local') == 'local':
+    if os.environ.get('WHATSAPP_SIDECAR_URL'):
+        os.environ['WHATSAPP_MODE'] = 'sidecar'
+    else:
+        print("⚠️ WhatsApp Personal disabled: multiple workers need WHATSAPP_SIDECAR_URL")
+        os.environ['WHATSAPP_MODE'] = 'disabled'
+
+# Each worker keeps its own metrics; /metrics merges them through this directory
+if workers > 1:
+    os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'api-server-metrics'))
+
+
+def on_starting(server):
+    """Drop metrics files left by a previous run before any worker starts."""
+    from metrics import clear_multiproc_dir
+    clear_multiproc_dir()
@@ -0,0 +1,166 @@
+"""Process-wide HTTP transport shared by every service.
+
+Connection pools live in ``requests`` adapters, not in sessions. Every
+service session mounts the same adapters, so a TLS connection opened by one
+service (or one worker thread) is reused by the next call to the same host
+instead of being handshaken again.
+
+- ``HTTP_POOL_SIZE``: keep-alive connections kept per host (default 10)
+- ``HTTP_POOL_HOSTS``: per-host overrides, e.g. ``graph.facebook.com=50,www.googleapis.com=32``
+- ``HTTP2=1``: negotiate HTTP/2 on the async (httpx) path when ``h2`` is installed
+
+``pool_stats()`` reports, per host, how many requests reused a pooled
+connection (hits) and how many had to open a new one (misses).
+"""
+import importlib.util
+import os
+import threading
+from typing import Dict, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from metrics import register_collector
+
+DEFAULT_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+
+# Hosts every deployment talks to under concurrent load
+DEFAULT_HOST_POOLS = {
+    'graph.facebook.com': 32,
+    'www.googleapis.com': 32,
+    'api.spotify.com': 16,
+}
+
+_counters: Dict[str, Dict[str, int]] = {}
+_counters_lock = threading.Lock()
+
+
+def _count(host: str, key: str) -> None:
+    with _counters_lock:
+        counters = _counters.setdefault(host, {"requests": 0, "new_connections": 0})
+        counters[key] += 1
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def urlopen(self, *args, **kwargs):
+        _count(self.host, "requests")
+        return super().urlopen(*args, **kwargs)
+
+    def _new_conn(self):
+        _count(self.host, "new_connections")
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def urlopen(self, *args, **kwargs):
+        _count(self.host, "requests")
+        return super().urlopen(*args, **kwargs)
+
+    def _new_conn(self):
+        _count(self.host, "new_connections")
+        return super()._new_conn()
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools count connection reuse."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+
+def host_pool_sizes() -> Dict[str, int]:
+    """Per-host pool sizes: defaults overridden by ``HTTP_POOL_HOSTS``."""
+    sizes = dict(DEFAULT_HOST_POOLS)
+    for entry in os.environ.get('HTTP_POOL_HOSTS', '').split(','):
+        host, _, size = entry.strip().partition('=')
+        if host and size.isdigit():
+            sizes[host] = int(size)
+    return sizes
+
+
+_adapters: Optional[Dict[str, HTTPAdapter]] = None
+_adapters_lock = threading.Lock()
+
+
+def _shared_adapters() -> Dict[str, HTTPAdapter]:
+    """Mount prefix -> adapter, built once per process."""
+    global _adapters
+    with _adapters_lock:
+        if _adapters is None:
+            default = PooledAdapter(pool_connections=DEFAULT_POOL_SIZE, pool_maxsize=DEFAULT_POOL_SIZE)
+            _adapters = {'http://': default, 'https://': default}
+            for host, size in host_pool_sizes().items():
+                _adapters[f'https://{host}/'] = PooledAdapter(pool_connections=1, pool_maxsize=size)
+        return _adapters
+
+
+def mount_shared_pools(session: requests.Session) -> requests.Session:
+    """Point ``session`` at the process-wide connection pools."""
+    for prefix, adapter in _shared_adapters().items():
+        session.mount(prefix, adapter)
+    return session
+
+
+_plain_session: Optional[requests.Session] = None
+
+
+def plain_session() -> requests.Session:
+    """Header-free shared session, e.g. for form-encoded OAuth token calls."""
+    global _plain_session
+    if _plain_session is None:
+        _plain_session = mount_shared_pools(requests.Session())
+    return _plain_session
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    """Per-host pool hits (connection reused) and misses (new connection)."""
+    with _counters_lock:
+        snapshot = {host: dict(counters) for host, counters in _counters.items()}
+    return {
+        host: {
+            "requests": c["requests"],
+            "hits": max(c["requests"] - c["new_connections"], 0),
+            "misses": c["new_connections"],
+        }
+        for host, c in sorted(snapshot.items())
+    }
+
+
+def _collect_metrics():
+    """Connection reuse per host for ``/metrics``."""
+    stats = pool_stats()
+    yield ('http_pool_requests_total', 'counter', 'Upstream requests by host and pooled connection reuse',
+           [({"host": host, "connection": kind}, s[key])
+            for host, s in stats.items() for kind, key in (("reused", "hits"), ("new", "misses"))])
+    yield ('http_pool_hit_ratio', 'gauge', 'Requests served on a reused keep-alive connection',
+           [({"host": host}, s["hits"] / s["requests"] if s["requests"] else 0) for host, s in stats.items()])
+
+
+register_collector(_collect_metrics)
+
+
+def http2_enabled() -> bool:
+    """HTTP/2 is opt-in via ``HTTP2=1`` and needs the ``h2`` package."""
+    return os.environ.get('HTTP2', '').lower() in ('1', 'true', 'yes') and importlib.util.find_spec('h2') is not None
+
+
+def async_client_kwargs(mounts: bool = True) -> Dict[str, object]:
+    """httpx client settings matching the sync pools, with per-host transports unless ``mounts`` is False."""
+    http2 = http2_enabled()
+    kwargs: Dict[str, object] = {
+        'http2': http2,
+        'limits': httpx.Limits(max_connections=200, max_keepalive_connections=DEFAULT_POOL_SIZE),
+    }
+    if mounts:
+        kwargs['mounts'] = {
+            f'https://{host}': httpx.AsyncHTTPTransport(
+                http2=http2, limits=httpx.Limits(max_connections=200, max_keepalive_connections=size))
+            for host, size in host_pool_sizes().items()
+        }
+    return kwargs
@@ -0,0 +1,338 @@
+"""Prometheus-style metrics served on ``/metrics``.
+
+Counters and histograms write to a per-thread shard: the hot path is a
+thread-local lookup and a list increment, with no lock and no contention
+between worker threads. A scrape merges the shards. Values that already
+live elsewhere (response cache, conditional requests, rate limiters,
+connection pools) are read at scrape time by registered collectors.
+
+    UPSTREAM_SECONDS.observe(elapsed, 'spotify', 'GET', '200')
+    with WHATSAPP_SECONDS.time('chat_scan'):
+        ...
+
+``Histogram.time()`` also works as a method decorator.
+
+Under gunicorn every worker process has its own samples, so a scrape
+answered by one worker would only show that worker's share. When
+``METRICS_MULTIPROC_DIR`` is set (gunicorn.conf.py sets it when running
+more than one worker), each process writes its samples to
+``metrics_<pid>.json`` in that directory every ``METRICS_FLUSH_INTERVAL``
+seconds (default 5) and at exit, in the manner of prometheus_client's
+multiprocess mode. A scrape merges every file:
+
+- counters and histograms are summed across processes, including workers
+  that have exited, so totals never go backwards. Other workers' values
+  may be up to one flush interval old.
+- collector samples (cache sizes, bucket levels, pools) are per-process
+  state; they are reported from live processes only, with a ``pid`` label.
+"""
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# (name, type, help, [(labels, value)])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+_metrics: List['_Metric'] = []
+_collectors: List[Callable[[], Iterable[Family]]] = []
+_flusher: Optional[threading.Thread] = None
+_flusher_lock = threading.Lock()
+
+
+class _Metric(ABC):
+    """Per-thread sharded storage: ``{label_values: [cells]}`` per thread."""
+
+    type = ''
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, ...], List[float]]] = []
+        self._shards_lock = threading.Lock()
+        _metrics.append(self)
+
+    def _cells(self, label_values: Tuple[str, ...]) -> List[float]:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        cells = shard.get(label_values)
+        if cells is None:
+            cells = shard[label_values] = self._new_cells()
+        return cells
+
+    @abstractmethod
+    def _new_cells(self) -> List[float]:
+        """Zeroed storage for one label combination."""
+        pass
+
+    @abstractmethod
+    def _render_samples(self, merged: Dict[Tuple[str, ...], List[float]]) -> List[str]:
+        """Exposition lines for merged cells."""
+        pass
+
+    def _merged(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        merged: Dict[Tuple[str, ...], List[float]] = {}
+        for shard in shards:
+            for key, cells in list(shard.items()):
+                total = merged.setdefault(key, [0.0] * len(cells))
+                for i, value in enumerate(cells):
+                    total[i] += value
+        return merged
+
+    def _label_text(self, label_values: Tuple[str, ...], extra: str = '') -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self, merged: Optional[Dict[Tuple[str, ...], List[float]]] = None) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        lines.extend(self._render_samples(self._merged() if merged is None else merged))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic counter."""
+
+    type = 'counter'
+
+    def _new_cells(self) -> List[float]:
+        return [0.0]
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._cells(label_values)[0] += amount
+
+    def value(self, *label_values: str) -> float:
+        return self._merged().get(label_values, [0.0])[0]
+
+    def _render_samples(self, merged: Dict[Tuple[str, ...], List[float]]) -> List[str]:
+        return [f'{self.name}{self._label_text(key)} {_number(cells[0])}'
+                for key, cells in sorted(merged.items())]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram; cells are bucket counts, overflow, sum and count."""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def _new_cells(self) -> List[float]:
+        return [0.0] * (len(self.buckets) + 3)
+
+    def observe(self, value: float, *label_values: str) -> None:
+        cells = self._cells(label_values)
+        cells[bisect.bisect_left(self.buckets, value)] += 1
+        cells[-2] += value
+        cells[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values: str):
+        """Observe the duration of the ``with`` block (or of each call, as a decorator)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def count(self, *label_values: str) -> float:
+        return self._merged().get(label_values, [0.0])[-1]
+
+    def _render_samples(self, merged: Dict[Tuple[str, ...], List[float]]) -> List[str]:
+        lines = []
+        for key, cells in sorted(merged.items()):
+            cumulative = 0.0
+            for bound, bucket_count in zip(self.buckets, cells):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                lines.append(f'{self.name}_bucket{self._label_text(key, le)} {_number(cumulative)}')
+            le = 'le="+Inf"'
+            lines.append(f'{self.name}_bucket{self._label_text(key, le)} {_number(cells[-1])}')
+            lines.append(f'{self.name}_sum{self._label_text(key)} {cells[-2]:.6f}')
+            lines.append(f'{self.name}_count{self._label_text(key)} {_number(cells[-1])}')
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def register_collector(collect: Callable[[], Iterable[Family]]) -> None:
+    """Add a scrape-time source of samples (e.g. stats kept by another module)."""
+    _collectors.append(collect)
+
+
+def _collect() -> List[Family]:
+    families = []
+    for collect in _collectors:
+        try:
+            families.extend(collect())
+        except Exception as e:
+            print(f"⚠️ Metrics collector failed: {e}")
+    return families
+
+
+def _render_families(families: List[Family]) -> List[str]:
+    """Exposition lines for collector families; same-named families are grouped under one header."""
+    grouped: Dict[str, Family] = {}
+    for name, kind, help, samples in families:
+        if name in grouped:
+            grouped[name][3].extend(samples)
+        else:
+            grouped[name] = (name, kind, help, list(samples))
+    lines = []
+    for name, kind, help, samples in grouped.values():
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f'{name}{{{label_text}}} {_number(value)}' if label_text else f'{name} {_number(value)}')
+    return lines
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (merged across workers in multiprocess mode)."""
+    lines: List[str] = []
+    if MULTIPROC_DIR:
+        merged, families = _merge_processes()
+        for metric in _metrics:
+            lines.extend(metric.render(merged.get(metric.name, {})))
+    else:
+        families = _collect()
+        for metric in _metrics:
+            lines.extend(metric.render())
+    lines.extend(_render_families(families))
+    return '\n'.join(lines) + '\n'
+
+
+# Multiprocess mode
+
+def _snapshot() -> Dict[str, Any]:
+    return {
+        "pid": os.getpid(),
+        "metrics": {metric.name: [[list(key), cells] for key, cells in metric._merged().items()]
+                    for metric in _metrics},
+        "families": [[name, kind, help, [[labels, value] for labels, value in samples]]
+                     for name, kind, help, samples in _collect()],
+    }
+
+
+def flush() -> None:
+    """Write this process's samples to ``METRICS_MULTIPROC_DIR`` (atomically replaced)."""
+    if not MULTIPROC_DIR:
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    path = os.path.join(MULTIPROC_DIR, f'metrics_{os.getpid()}.json')
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(_snapshot(), f)
+    os.replace(temp_path, path)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge_processes() -> Tuple[Dict[str, Dict[Tuple[str, ...], List[float]]], List[Family]]:
+    """Summed metric cells of every process, and collector samples of live ones labelled by pid."""
+    flush()
+    merged: Dict[str, Dict[Tuple[str, ...], List[float]]] = {}
+    families: List[Family] = []
+    for path in sorted(glob.glob(os.path.join(MULTIPROC_DIR, 'metrics_*.json'))):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue  # a file being replaced; its process flushes again soon
+        for name, series in snapshot["metrics"].items():
+            metric_cells = merged.setdefault(name, {})
+            for key, cells in series:
+                total = metric_cells.setdefault(tuple(key), [0.0] * len(cells))
+                for i, value in enumerate(cells):
+                    total[i] += value
+        pid = snapshot["pid"]
+        if pid == os.getpid() or _pid_alive(pid):
+            for name, kind, help, samples in snapshot["families"]:
+                families.append((name, kind, help, [({**labels, "pid": str(pid)}, value)
+                                                    for labels, value in samples]))
+    return merged, families
+
+
+def _flush_loop() -> None:
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            print(f"⚠️ Metrics flush failed: {e}")
+
+
+def start_flusher() -> None:
+    """Flush this process's samples periodically and at exit, in multiprocess mode (idempotent)."""
+    global _flusher
+    if not MULTIPROC_DIR:
+        return
+    with _flusher_lock:
+        if _flusher is not None and _flusher.is_alive():
+            return
+        if _flusher is None:
+            atexit.register(flush)
+        _flusher = threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True)
+        _flusher.start()
+
+
+def clear_multiproc_dir() -> None:
+    """Remove samples left by a previous server run (call once before workers start)."""
+    if not MULTIPROC_DIR:
+        return
+    for path in glob.glob(os.path.join(MULTIPROC_DIR, 'metrics_*.json*')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Shared metric families
+
+ROUTE_SECONDS = Histogram('api_route_request_seconds', 'Time to build the response for an API route',
+                          ('route', 'method', 'status'))
+UPSTREAM_SECONDS = Histogram('upstream_request_seconds', 'Latency of one upstream HTTP attempt',
+                             ('service', 'method', 'status'))
+UPSTREAM_RETRIES = Counter('upstream_retries_total', 'Retryable upstream failures (401, 429, 5xx, timeout, connection)',
+                           ('service', 'reason'))
+TOKEN_REFRESHES = Counter('token_refresh_total', 'OAuth token refreshes, by trigger and outcome',
+                          ('service', 'trigger', 'outcome'))
+WHATSAPP_SECONDS = Histogram('whatsapp_operation_seconds', 'WhatsApp Web scraping step durations',
+                             ('operation',), buckets=SLOW_BUCKETS)
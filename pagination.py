@@ -0,0 +1,98 @@
+"""Cursor pagination for provider list endpoints.
+
+Each base class declares its provider's ``cursor_style``:
+
+- ``NextUrlCursor``: Spotify, absolute ``next`` URL in the page body
+- ``GraphCursor``: Meta Graph API, ``paging.next`` URL
+- ``PageTokenCursor``: Google, ``nextPageToken`` sent back as ``pageToken``
+
+List handlers call ``_handle_list_call``. Without ``?all=true`` or
+``?max_items=N`` it is a plain ``_handle_api_call``. With either, the first
+page is fetched up front (so auth and quota errors still get a normal error
+response) and a generator of items is returned. The route layer streams the
+generator as NDJSON, one page in memory at a time.
+"""
+from typing import Any, Dict, Iterator, Optional, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from param_schema import Param
+
+PAGINATION_PARAMS = {
+    "all": Param(bool, default=False, description="Stream every page as NDJSON"),
+    "max_items": Param(int, min=1, description="Stream up to N items as NDJSON"),
+}
+
+
+class NextUrlCursor:
+    """Next page is an absolute URL under ``key`` in the page body."""
+
+    def __init__(self, key: str = 'next'):
+        self.key = key
+
+    def next_endpoint(self, endpoint: str, page: Dict[str, Any]) -> Optional[str]:
+        return page.get(self.key)
+
+
+class GraphCursor:
+    """Next page is the Graph API ``paging.next`` URL."""
+
+    def next_endpoint(self, endpoint: str, page: Dict[str, Any]) -> Optional[str]:
+        return (page.get('paging') or {}).get('next')
+
+
+class PageTokenCursor:
+    """Next page repeats the request with ``param`` set to the page's ``token_key``."""
+
+    def __init__(self, token_key: str = 'nextPageToken', param: str = 'pageToken'):
+        self.token_key = token_key
+        self.param = param
+
+    def next_endpoint(self, endpoint: str, page: Dict[str, Any]) -> Optional[str]:
+        token = page.get(self.token_key)
+        if not token:
+            return None
+        parts = urlsplit(endpoint)
+        query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != self.param]
+        query.append((self.param, token))
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class PaginationMixin:
+    """Adds ``_handle_list_call`` / ``_paginate`` to API base classes.
+
+    Expects the host class to provide ``cursor_style`` and ``_handle_api_call``.
+    """
+
+    def _handle_list_call(self, endpoint: str, items_key: str, all: bool = False,
+                          max_items: Optional[int] = None) -> Union[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        """Return one page, or stream every page when ``all`` or ``max_items`` is set."""
+        if all or max_items:
+            return self._paginate(endpoint, items_key, max_items)
+        return self._handle_api_call('GET', endpoint)
+
+    def _paginate(self, endpoint: str, items_key: str,
+                  max_items: Optional[int] = None) -> Union[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        """Fetch the first page now; return its error or an item generator."""
+        first = self._handle_api_call('GET', endpoint)
+        if 'error' in first:
+            return first
+        return self._iter_items(endpoint, first, items_key, max_items)
+
+    def _iter_items(self, endpoint: str, page: Dict[str, Any], items_key: str,
+                    max_items: Optional[int]) -> Iterator[Dict[str, Any]]:
+        """Yield items page by page; a failing later page ends with an error item."""
+        count = 0
+        while True:
+            for item in page.get(items_key) or []:
+                yield item
+                count += 1
+                if max_items and count >= max_items:
+                    return
+
+            endpoint = self.cursor_style.next_endpoint(endpoint, page)
+            if not endpoint:
+                return
+            page = self._handle_api_call('GET', endpoint)
+            if 'error' in page:
+                yield {"error": page['error'], "items_before_error": count}
+                return
@@ -0,0 +1,134 @@
+"""Declarative endpoint parameter schemas.
+
+Endpoints declare their params in ``get_endpoints()`` as ``Param`` objects.
+At route registration the whole schema is compiled into one validator that
+reads, coerces and bounds-checks every param in a single pass, so handlers
+receive plain keyword arguments and bad requests are rejected with a 400
+before any outbound call is made.
+"""
+import json
+from typing import Any, Callable, Dict, Optional
+
+
+class ParamError(ValueError):
+    """Raised when a request does not satisfy an endpoint's param schema."""
+
+
+_TRUE_VALUES = frozenset(('true', '1', 'yes', 'on'))
+_FALSE_VALUES = frozenset(('false', '0', 'no', 'off'))
+
+
+def _to_bool(value: Any) -> bool:
+    """Coerce query-string style booleans."""
+    if isinstance(value, bool):
+        return value
+    text = str(value).lower()
+    if text in _TRUE_VALUES:
+        return True
+    if text in _FALSE_VALUES:
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+def _to_list(value: Any) -> list:
+    """Accept a JSON list from the body, or a JSON-encoded list in the query string."""
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, list):
+        raise ValueError(f"not a list: {value!r}")
+    return value
+
+
+_COERCERS: Dict[type, Callable[[Any], Any]] = {
+    str: str,
+    int: int,
+    float: float,
+    bool: _to_bool,
+    list: _to_list,
+}
+
+
+class Param:
+    """Typed description of a single endpoint parameter."""
+
+    __slots__ = ('type', 'required', 'default', 'min', 'max', 'allow_empty', 'choices', 'description')
+
+    def __init__(self, type: type = str, required: bool = False, default: Any = None,
+                 min: Optional[float] = None, max: Optional[float] = None,
+                 allow_empty: bool = False, choices: Optional[tuple] = None, description: str = ""):
+        if type not in _COERCERS:
+            raise TypeError(f"Unsupported param type: {type!r}")
+        self.type = type
+        self.required = required
+        self.default = default
+        self.min = min
+        self.max = max
+        self.allow_empty = allow_empty
+        self.choices = choices
+        self.description = description
+
+    def __str__(self) -> str:
+        """Human-readable form used by the dashboard and docs."""
+        label = "Required" if self.required else "Optional"
+        text = f"{label}: {self.description}" if self.description else label
+        if not self.required and self.default not in (None, ''):
+            text += f" (default: {self.default})"
+        return text
+
+    def __repr__(self) -> str:
+        return f"Param({self.type.__name__}, required={self.required}, default={self.default!r})"
+
+
+_MISSING = object()
+
+
+def compile_params(params: Dict[str, Param]) -> Callable[[Any], Dict[str, Any]]:
+    """Compile a param schema into a validator.
+
+    The validator takes a Flask request and returns handler kwargs. Values are
+    looked up in the query string first, then in the JSON body. It raises
+    ``ParamError`` on the first missing, malformed or out-of-range param.
+    """
+    specs = tuple(
+        (name, _COERCERS[p.type], p.type.__name__, p.required, p.default, p.min, p.max, p.allow_empty,
+         frozenset(p.choices) if p.choices else None)
+        for name, p in params.items()
+    )
+
+    def validate(req) -> Dict[str, Any]:
+        query = req.args
+        body = _MISSING
+        kwargs = {}
+        for name, coerce, type_name, required, default, low, high, allow_empty, choices in specs:
+            value = query.get(name)
+            if value is None:
+                if body is _MISSING:
+                    body = req.get_json(silent=True) if req.is_json else None
+                    if not isinstance(body, dict):
+                        body = None
+                if body is not None:
+                    value = body.get(name)
+
+            if value is None or (value == '' and not allow_empty):
+                if required:
+                    raise ParamError(f"{name} parameter required")
+                kwargs[name] = default
+                continue
+
+            try:
+                value = coerce(value)
+            except (TypeError, ValueError):
+                raise ParamError(f"Invalid parameter {name}: expected {type_name}")
+
+            # Bounds apply to the length of list params
+            measured = len(value) if isinstance(value, list) else value
+            if low is not None and measured < low:
+                raise ParamError(f"Invalid parameter {name}: must be >= {low}")
+            if high is not None and measured > high:
+                raise ParamError(f"Invalid parameter {name}: must be <= {high}")
+            if choices is not None and value not in choices:
+                raise ParamError(f"Invalid parameter {name}: must be one of {', '.join(sorted(map(str, choices)))}")
+            kwargs[name] = value
+        return kwargs
+
+    return validate
@@ -0,0 +1,188 @@
+"""Client-side token-bucket rate limiting for outbound API calls.
+
+Each service declares ``rate_limits``: a map from endpoint family (a path
+prefix such as ``'/gmail'``; ``''`` is the service-wide default) to a
+``RateLimit``. Before every upstream attempt the service takes a token from
+the matching bucket. A short wait queues the call; if the next token is
+further away than ``max_wait`` the call is shed with ``UpstreamUnavailable``
+(503 + Retry-After) before it can earn a 429 from the provider.
+
+Limiters live in a process-wide registry keyed by service name, so every
+thread and every instance of a service draws from the same buckets.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from retry_policy import UpstreamUnavailable
+
+DEFAULT_MAX_WAIT = float(os.environ.get('RATE_LIMIT_MAX_WAIT', 2.0))
+
+
+class RateLimit:
+    """Sustained ``rate`` (calls per second) with bursts up to ``burst``."""
+
+    __slots__ = ('rate', 'burst')
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+
+
+class TokenBucket:
+    """Thread-safe token bucket handing out wait-time reservations."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'lock')
+
+    def __init__(self, limit: RateLimit):
+        self.rate = limit.rate
+        self.capacity = float(limit.burst)
+        self.tokens = float(limit.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, max_wait: float, count: int = 1) -> Optional[float]:
+        """Take ``count`` tokens; return how long to wait for them, or None if over ``max_wait``.
+
+        Callers that must wait leave the bucket in debt, so concurrent
+        callers queue up behind them in order instead of racing.
+        """
+        with self.lock:
+            self._refill()
+            wait = max(0.0, (count - self.tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self.tokens -= count
+            return wait
+
+    def refund(self, count: int) -> None:
+        """Give back tokens from a reservation that was abandoned."""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + count)
+
+    def retry_after_for(self, count: int) -> float:
+        """Seconds until ``count`` tokens are free for a new caller."""
+        with self.lock:
+            self._refill()
+            return max(0.0, (count - self.tokens) / self.rate)
+
+    def retry_after(self) -> float:
+        """Seconds until a token is free for a new caller."""
+        with self.lock:
+            self._refill()
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def level(self) -> Dict[str, Any]:
+        """Current fill level for health reporting."""
+        with self.lock:
+            self._refill()
+            return {"tokens": round(self.tokens, 2), "capacity": self.capacity, "rate": self.rate}
+
+
+class RateLimiter:
+    """Buckets for one service, one per endpoint family."""
+
+    def __init__(self, service_name: str, limits: Dict[str, RateLimit], max_wait: float = DEFAULT_MAX_WAIT):
+        self.service_name = service_name
+        self.max_wait = max_wait
+        self.buckets = {family: TokenBucket(limit) for family, limit in limits.items()}
+        # Longest prefix first so '/gmail/v1/users' beats '/gmail' beats ''
+        self._families = sorted(self.buckets, key=len, reverse=True)
+
+    def bucket_for(self, endpoint: str) -> Tuple[Optional[str], Optional[TokenBucket]]:
+        """Find the family bucket an endpoint draws from."""
+        for family in self._families:
+            if endpoint.startswith(family):
+                return family, self.buckets[family]
+        return None, None
+
+    def _reserve(self, endpoint: str) -> float:
+        family, bucket = self.bucket_for(endpoint)
+        if bucket is None:
+            return 0.0
+        wait = bucket.reserve(self.max_wait)
+        if wait is None:
+            raise UpstreamUnavailable(
+                f"{self.service_name} rate limit reached for '{family or '*'}'", bucket.retry_after())
+        return wait
+
+    def acquire(self, endpoint: str) -> None:
+        """Block until a token is available, or shed the call."""
+        wait = self._reserve(endpoint)
+        if wait:
+            time.sleep(wait)
+
+    def acquire_many(self, endpoints: Iterable[str], max_wait: Optional[float] = None) -> None:
+        """Take one token per endpoint in a single reservation and wait once, or shed them all.
+
+        Used for batch calls, whose sub-requests count against the
+        provider's quota individually but go out together. Buckets refill in
+        parallel, so the wait is the longest of the per-bucket waits.
+        """
+        wait = self._reserve_many(endpoints, max_wait)
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_many_async(self, endpoints: Iterable[str], max_wait: Optional[float] = None) -> None:
+        """``acquire_many`` without blocking the event loop."""
+        wait = self._reserve_many(endpoints, max_wait)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def _reserve_many(self, endpoints: Iterable[str], max_wait: Optional[float]) -> float:
+        max_wait = self.max_wait if max_wait is None else max_wait
+        counts: Dict[Optional[str], int] = {}
+        for endpoint in endpoints:
+            family, bucket = self.bucket_for(endpoint)
+            if bucket is not None:
+                counts[family] = counts.get(family, 0) + 1
+        reserved: List[Tuple[TokenBucket, int]] = []
+        wait = 0.0
+        for family, count in counts.items():
+            bucket = self.buckets[family]
+            bucket_wait = bucket.reserve(max_wait, count)
+            if bucket_wait is None:
+                for taken, taken_count in reserved:
+                    taken.refund(taken_count)
+                raise UpstreamUnavailable(
+                    f"{self.service_name} rate limit reached for '{family or '*'}'", bucket.retry_after_for(count))
+            reserved.append((bucket, count))
+            wait = max(wait, bucket_wait)
+        return wait
+
+    async def acquire_async(self, endpoint: str) -> None:
+        """Await a token without blocking the event loop, or shed the call."""
+        wait = self._reserve(endpoint)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def levels(self) -> Dict[str, Dict[str, Any]]:
+        """Fill level of every bucket, keyed by family ('*' for the default)."""
+        return {family or '*': bucket.level() for family, bucket in self.buckets.items()}
+
+
+_registry: Dict[str, RateLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_rate_limiter(service_name: str, limits: Dict[str, RateLimit]) -> RateLimiter:
+    """Return the process-wide limiter for a service, creating it on first use."""
+    with _registry_lock:
+        limiter = _registry.get(service_name)
+        if limiter is None:
+            limiter = _registry[service_name] = RateLimiter(service_name, limits)
+        return limiter
+
+
+def rate_limit_levels() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Bucket levels of every registered limiter."""
+    with _registry_lock:
+        limiters = list(_registry.values())
+    return {limiter.service_name: limiter.levels() for limiter in limiters if limiter.buckets}
@@ -0,0 +1,206 @@
+"""Response cache for idempotent GET endpoints.
+
+An endpoint opts in by declaring ``cache_ttl`` (seconds) in ``get_endpoints()``,
+optionally with ``stale_while_revalidate`` (seconds past the TTL during which a
+stale result is served while one background refresh runs). Results are keyed
+on (service, endpoint, normalized params, token identity), so two accounts
+never share entries and a re-authentication starts from a cold cache. Error
+results are never stored.
+
+Backends:
+
+- ``MemoryBackend``: bounded LRU, per process (default)
+- ``DiskBackend``: SQLite file, survives restarts and is shared by
+  pre-forked workers on one host
+
+Select with ``RESPONSE_CACHE=memory|disk|off``, ``RESPONSE_CACHE_SIZE`` and
+``RESPONSE_CACHE_PATH``.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import register_collector
+
+DEFAULT_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))
+DEFAULT_PATH = os.environ.get('RESPONSE_CACHE_PATH', 'cache/responses.sqlite')
+
+# (stored_at, value)
+Entry = Tuple[float, Any]
+
+
+def token_identity(tokens: Dict[str, Any]) -> str:
+    """Short stable hash identifying the account behind a token set."""
+    secret = tokens.get('refresh_token') or tokens.get('access_token') or ''
+    return hashlib.sha256(secret.encode()).hexdigest()[:16]
+
+
+class MemoryBackend:
+    """Thread-safe LRU dict bounded to ``max_entries``."""
+
+    def __init__(self, max_entries: int = DEFAULT_SIZE):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: Entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskBackend:
+    """SQLite-backed LRU store; values must be JSON-serializable."""
+
+    def __init__(self, path: str = DEFAULT_PATH, max_entries: int = DEFAULT_SIZE):
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                               'key TEXT PRIMARY KEY, stored_at REAL, used_at REAL, value TEXT)')
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock, self._conn:
+            row = self._conn.execute('SELECT stored_at, value FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE responses SET used_at = ? WHERE key = ?', (time.time(), key))
+        return row[0], json.loads(row[1])
+
+    def set(self, key: str, entry: Entry) -> None:
+        stored_at, value = entry
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                               (key, stored_at, time.time(), json.dumps(value)))
+            self._conn.execute('DELETE FROM responses WHERE key IN (SELECT key FROM responses '
+                               'ORDER BY used_at DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM responses')
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+
+class ResponseCache:
+    """TTL + stale-while-revalidate lookups over a storage backend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0}
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cache-revalidate')
+
+    @staticmethod
+    def make_key(service_name: str, endpoint: str, params: Dict[str, Any], identity: str) -> str:
+        """Cache key from service, endpoint, normalized params and token identity."""
+        normalized = json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+        return f"{service_name}:{endpoint}:{normalized}:{identity}"
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: float, stale: float = 0) -> Any:
+        """Return a cached result for ``key`` or compute and store it."""
+        entry = self.backend.get(key)
+        if entry is not None:
+            age = time.time() - entry[0]
+            if age < ttl:
+                self.stats["hits"] += 1
+                return entry[1]
+            if age < ttl + stale:
+                self.stats["stale_hits"] += 1
+                self._revalidate(key, compute)
+                return entry[1]
+
+        self.stats["misses"] += 1
+        return self._store(key, compute())
+
+    def _store(self, key: str, value: Any) -> Any:
+        # Only plain results; streamed (generator) results pass straight through
+        if isinstance(value, list) or (isinstance(value, dict) and 'error' not in value):
+            self.backend.set(key, (time.time(), value))
+        return value
+
+    def _revalidate(self, key: str, compute: Callable[[], Any]) -> None:
+        """Refresh ``key`` in the background, at most once at a time."""
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._store(key, compute())
+            except Exception as e:
+                print(f"⚠️ Cache revalidation failed for {key.split(':', 2)[:2]}: {e}")
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        self._refresher.submit(refresh)
+
+    def wrap(self, handler: Callable, service_name: str, endpoint: str, identity: Callable[[], str],
+             ttl: float, stale: float = 0) -> Callable:
+        """Wrap an endpoint handler so its results are served from the cache."""
+        def cached_handler(**kwargs):
+            key = self.make_key(service_name, endpoint, kwargs, identity())
+            return self.get_or_compute(key, lambda: handler(**kwargs), ttl, stale)
+        return cached_handler
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide response cache, or None when ``RESPONSE_CACHE=off``."""
+    global _cache
+    mode = os.environ.get('RESPONSE_CACHE', 'memory')
+    if mode == 'off':
+        return None
+    with _cache_lock:
+        if _cache is None:
+            backend = DiskBackend() if mode == 'disk' else MemoryBackend()
+            _cache = ResponseCache(backend)
+        return _cache
+
+
+def _collect_metrics():
+    """Response cache lookups and hit ratio for ``/metrics``."""
+    if _cache is None:
+        return
+    stats = dict(_cache.stats)
+    lookups = sum(stats.values())
+    yield ('response_cache_lookups_total', 'counter', 'Response cache lookups, by result',
+           [({"result": result}, count) for result, count in sorted(stats.items())])
+    yield ('response_cache_hit_ratio', 'gauge', 'Fresh and stale hits over all lookups',
+           [({}, (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0)])
+
+
+register_collector(_collect_metrics)
@@ -0,0 +1,109 @@
+"""Retry scheduling for outbound API requests.
+
+A ``RetryPolicy`` describes how an upstream call may be retried: attempt
+count, jittered exponential backoff, an overall deadline per request and a
+cap on total time spent sleeping. Each request draws a fresh ``RetryBudget``
+from the policy. When the next wait would blow the budget, for example a 429
+with a long Retry-After, the budget raises ``UpstreamUnavailable`` instead of
+sleeping. The route layer turns that into a 503 with a Retry-After hint, so
+a throttled provider cannot hold server workers hostage.
+"""
+import math
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+
+class UpstreamUnavailable(Exception):
+    """Upstream is throttling or failing and retrying would exceed the budget."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(0.0, retry_after)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Error result understood by the route layer (503 + Retry-After)."""
+        return {"error": str(self), "retry_after": math.ceil(self.retry_after)}
+
+
+def parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class RetryPolicy:
+    """Retry limits shared by all requests of a service."""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 deadline: float = 30.0, max_total_sleep: float = 5.0, request_timeout: float = 30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.max_total_sleep = max_total_sleep
+        self.request_timeout = request_timeout
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given (0-based) attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def start(self) -> 'RetryBudget':
+        """Begin a new request under this policy."""
+        return RetryBudget(self)
+
+
+class RetryBudget:
+    """Per-request retry state: deadline and sleep already spent."""
+
+    __slots__ = ('policy', 'deadline_at', 'slept')
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        self.deadline_at = time.monotonic() + policy.deadline
+        self.slept = 0.0
+
+    def remaining(self) -> float:
+        """Seconds left before the request deadline."""
+        return self.deadline_at - time.monotonic()
+
+    def attempt_timeout(self) -> float:
+        """Timeout for the next attempt, bounded by the remaining deadline."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise UpstreamUnavailable("Upstream request deadline exceeded", self.policy.base_delay)
+        return min(self.policy.request_timeout, remaining)
+
+    def next_delay(self, attempt: int, reason: str, retry_after: Optional[float] = None) -> float:
+        """Reserve the wait before retrying ``attempt`` + 1.
+
+        Uses the server's ``retry_after`` when given, otherwise jittered
+        backoff. Raises ``UpstreamUnavailable`` when no attempts are left or
+        the wait would exceed the sleep cap or the request deadline.
+        """
+        delay = retry_after if retry_after is not None else self.policy.backoff_delay(attempt)
+        hint = retry_after if retry_after is not None else self.policy.backoff_delay(attempt + 1)
+
+        if attempt + 1 >= self.policy.max_attempts:
+            raise UpstreamUnavailable(f"{reason} after {self.policy.max_attempts} attempts", hint)
+        if self.slept + delay > self.policy.max_total_sleep or delay >= self.remaining():
+            raise UpstreamUnavailable(f"{reason}; retry in {delay:.1f}s exceeds the retry budget", hint)
+
+        self.slept += delay
+        return delay
+
+
+def error_result(e: Exception) -> Dict[str, Any]:
+    """Error dict for a failed upstream call, keeping the Retry-After hint."""
+    if isinstance(e, UpstreamUnavailable):
+        return e.to_dict()
+    return {"error": str(e)}
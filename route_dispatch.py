@@ -0,0 +1,244 @@
+"""Compiled route dispatchers for service endpoints.
+
+Each endpoint is compiled once, when its route is registered, into an
+``EndpointDispatcher`` that already knows how to validate its params,
+guard authentication and serialize the result. The request path does no
+handler-name matching and builds no closures.
+"""
+import inspect
+import json
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+from flask import Response, request, jsonify
+from async_http import run_async_handler
+from metrics import ROUTE_SECONDS
+from param_schema import ParamError, compile_params
+from response_cache import get_response_cache
+from retry_policy import UpstreamUnavailable
+
+
+# Serializers: turn a handler result into a Flask response
+
+# Generator results are streamed with chunked transfer encoding. WSGI servers
+# pull the next chunk only after the previous one was written, so a slow
+# client throttles the generator (and any upstream paging) instead of the
+# response piling up in memory.
+
+STREAM_CHUNK_BYTES = 16 * 1024
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# One shared encoder: json.dumps with non-default options builds a new one per call
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def _coalesce(pieces: Iterator[str]) -> Iterator[str]:
+    """Flush the first piece at once, then write pieces in ~16 KB chunks."""
+    pieces = iter(pieces)
+    for first in pieces:
+        yield first
+        break
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_BYTES:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _guarded(items: Iterator[Any]) -> Iterator[Any]:
+    """End a failing stream with an error item; the status line is already sent."""
+    try:
+        yield from items
+    except Exception as e:
+        yield {"error": str(e)}
+
+
+def stream_ndjson(items: Iterator[Any]) -> Response:
+    """Stream a generator of items as newline-delimited JSON."""
+    lines = (_encode(item) + '\n' for item in _guarded(items))
+    return Response(_coalesce(lines), mimetype=NDJSON_MIMETYPE)
+
+
+def stream_json_array(items: Iterator[Any]) -> Response:
+    """Stream a generator of items as one incrementally written JSON array."""
+    def pieces():
+        opener = '['
+        for item in _guarded(items):
+            yield opener + _encode(item)
+            opener = ','
+        yield '[]' if opener == '[' else ']'
+    return Response(_coalesce(pieces()), mimetype='application/json')
+
+
+def stream_items(items: Iterator[Any]) -> Response:
+    """Stream as NDJSON, or as a JSON array if the client prefers ``application/json``."""
+    best = request.accept_mimetypes.best_match([NDJSON_MIMETYPE, 'application/json'])
+    if best == 'application/json':
+        return stream_json_array(items)
+    return stream_ndjson(items)
+
+
+def serialize_json(result: Dict[str, Any]):
+    """Serialize a dict result, mapping ``error`` results to 500.
+
+    Errors carrying a ``retry_after`` hint (upstream throttled past the
+    retry budget) become 503 with a Retry-After header. Generators (e.g.
+    paginated listings) are streamed.
+    """
+    if inspect.isgenerator(result):
+        return stream_items(result)
+    if 'error' not in result:
+        return jsonify(result), 200
+    if result.get('retry_after') is not None:
+        return jsonify(result), 503, {'Retry-After': str(result['retry_after'])}
+    return jsonify(result), 500
+
+
+def serialize_html_or_json(result):
+    """Serialize HTML strings as-is and dict results as JSON.
+
+    A ``(body, status, headers)`` tuple (a relayed response) keeps its
+    status and headers.
+    """
+    if isinstance(result, tuple):
+        body, status, headers = result
+        return (body if isinstance(body, str) else jsonify(body)), status, headers
+    if isinstance(result, str):
+        return result, 200
+    return serialize_json(result)
+
+
+# Auth guards: return a response to short-circuit, or None to continue
+
+def make_auth_guard(service, service_name: str) -> Callable:
+    """Build an auth guard for an OAuth service (once per route)."""
+    error_body = {"error": f"{service_name.title()} authentication required"}
+    is_authenticated = service.is_authenticated
+
+    def auth_guard():
+        if not is_authenticated():
+            return jsonify(error_body), 401
+        return None
+    return auth_guard
+
+
+def chain_guards(*guards: Optional[Callable]) -> Optional[Callable]:
+    """Combine guards; the first one that denies wins."""
+    guards = tuple(guard for guard in guards if guard is not None)
+    if len(guards) <= 1:
+        return guards[0] if guards else None
+
+    def chained():
+        for guard in guards:
+            denied = guard()
+            if denied is not None:
+                return denied
+        return None
+    return chained
+
+
+def _status_of(response) -> int:
+    """Status code of a view result (``Response`` or ``(body, status[, headers])``)."""
+    if isinstance(response, tuple):
+        return response[1] if len(response) > 1 and isinstance(response[1], int) else 200
+    return getattr(response, 'status_code', 200)
+
+
+class EndpointDispatcher:
+    """Flask view for one endpoint with all per-route decisions pre-bound.
+
+    Each call is timed into ``api_route_request_seconds`` under ``route``.
+    """
+
+    __slots__ = ('endpoint', 'handler', 'extract', 'guard', 'serialize', 'route', 'method')
+
+    def __init__(self, endpoint: str, handler: Callable, extract: Optional[Callable] = None,
+                 guard: Optional[Callable] = None, serialize: Callable = serialize_json,
+                 route: Optional[str] = None, method: str = 'GET'):
+        self.endpoint = endpoint
+        self.handler = handler
+        self.extract = extract
+        self.guard = guard
+        self.serialize = serialize
+        self.route = route or endpoint
+        self.method = method
+
+    def __call__(self):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = self._dispatch()
+            status = _status_of(response)
+            return response
+        finally:
+            ROUTE_SECONDS.observe(time.perf_counter() - started, self.route, self.method, str(status))
+
+    def _dispatch(self):
+        # Validate first so bad requests never reach token refresh or upstream calls
+        kwargs = {}
+        if self.extract is not None:
+            try:
+                kwargs = self.extract(request)
+            except ParamError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+
+        if self.guard is not None:
+            denied = self.guard()
+            if denied is not None:
+                return denied
+
+        try:
+            result = self.handler(**kwargs)
+        except ParamError as e:
+            # Handlers raise it for params that can only be checked against service state
+            return jsonify({"success": False, "error": str(e)}), 400
+        except UpstreamUnavailable as e:
+            # Raised when there is no result to build, e.g. an unreachable sidecar
+            return serialize_json({"success": False, **e.to_dict()})
+        return self.serialize(result)
+
+    def __repr__(self) -> str:
+        return f"<EndpointDispatcher {self.endpoint}>"
+
+
+def compile_endpoint(service_name: str, service, endpoint_path: str,
+                     endpoint_config: Dict[str, Any], endpoint: str,
+                     ready_guard: Optional[Callable] = None,
+                     route_path: Optional[str] = None) -> EndpointDispatcher:
+    """Compile an endpoint config into a dispatcher for ``app.add_url_rule``.
+
+    ``ready_guard`` (see ``ServiceRegistry.readiness_guard``) runs before
+    anything else touches the service. ``route_path`` labels the route's
+    latency metrics.
+    """
+    method = endpoint_config['method'].upper()
+    route = route_path or f'/{service_name}/{endpoint_path}'
+    handler = endpoint_config['handler']
+    if inspect.iscoroutinefunction(handler):
+        # Async handlers run on an event loop with a shared upstream client
+        handler = run_async_handler(handler)
+    ttl = endpoint_config.get('cache_ttl')
+    cache = get_response_cache() if ttl and method == 'GET' else None
+    if cache is not None:
+        identity = getattr(service, 'cache_identity', lambda: '')
+        handler = cache.wrap(handler, service_name, endpoint_path, identity, ttl,
+                             endpoint_config.get('stale_while_revalidate', 0))
+    params = endpoint_config.get('params')
+    extract = compile_params(params) if params else None
+
+    if service_name == 'whatsapp_personal':
+        # Session-based, handlers may return HTML
+        return EndpointDispatcher(endpoint, handler, extract=extract, guard=ready_guard,
+                                  serialize=serialize_html_or_json, route=route, method=method)
+
+    if service_name == 'files':
+        # No OAuth required for local file operations
+        return EndpointDispatcher(endpoint, handler, extract=extract, guard=ready_guard,
+                                  route=route, method=method)
+
+    # Standard OAuth API handling
+    return EndpointDispatcher(endpoint, handler, extract=extract,
+                              guard=chain_guards(ready_guard, make_auth_guard(service, service_name)),
+                              route=route, method=method)
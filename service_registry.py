@@ -0,0 +1,163 @@
+"""Service lifecycle: background warm-up, progress and readiness.
+
+Constructing a service is cheap: it reads credentials and saved tokens.
+Anything slow (refreshing an expired token, restoring the WhatsApp browser
+session) lives in the service's ``warm_up()``. Services built inside
+``deferred_warm_up()`` skip it, and ``ServiceRegistry.start()`` runs every
+warm-up in parallel on daemon threads, so the app registers its routes and
+starts listening at once.
+
+Each service moves through::
+
+    constructing -> restoring -> ready | degraded | failed
+
+``degraded`` means the service is up but not authenticated (it still
+serves its auth routes); the status snapshot moves services between
+``ready`` and ``degraded`` as authentication changes. Code running inside a
+warm-up calls ``report_progress("...")`` to publish what it is doing.
+
+Until a service is ``ready`` or ``degraded``, its routes answer 503 with its
+lifecycle state. ``/readyz`` answers 503 while any service is still
+constructing or restoring; ``/livez`` only says the process is up.
+
+Process-wide resources (e.g. the shared async HTTP client) register a
+cleanup with ``on_shutdown()``; ``shutdown()`` runs them once, newest first.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import jsonify
+
+CONSTRUCTING = 'constructing'
+RESTORING = 'restoring'
+READY = 'ready'
+DEGRADED = 'degraded'
+FAILED = 'failed'
+
+SERVING_STATES = frozenset((READY, DEGRADED))
+WARMING_STATES = frozenset((CONSTRUCTING, RESTORING))
+
+_local = threading.local()
+
+
+@contextmanager
+def deferred_warm_up():
+    """Services constructed in this block leave ``warm_up()`` to the caller."""
+    previous = getattr(_local, 'deferred', False)
+    _local.deferred = True
+    try:
+        yield
+    finally:
+        _local.deferred = previous
+
+
+def warm_up_deferred() -> bool:
+    """True inside ``deferred_warm_up()``."""
+    return getattr(_local, 'deferred', False)
+
+
+def report_progress(message: str) -> None:
+    """Publish a warm-up step for the service warming up on this thread (no-op elsewhere)."""
+    target = getattr(_local, 'warming', None)
+    if target is not None:
+        registry, name = target
+        registry._update(name, progress=message)
+
+
+class ServiceRegistry:
+    """Tracks each service's lifecycle state and answers readiness checks."""
+
+    def __init__(self):
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._services: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._shutdown_hooks: List[Callable[[], None]] = []
+        self.started_at = time.time()
+
+    def _update(self, name: str, replace: bool = False, **fields) -> None:
+        # States are replaced, never mutated, so readers need no lock
+        with self._lock:
+            current = {} if replace else self._states.get(name, {})
+            self._states[name] = {**current, **fields}
+
+    def add(self, name: str, service) -> None:
+        """Register a service; those without ``warm_up()`` are ready at once."""
+        self._services[name] = service
+        state = CONSTRUCTING if hasattr(service, 'warm_up') else READY
+        self._update(name, replace=True, state=state)
+
+    def start(self) -> None:
+        """Warm every pending service up in parallel, in the background."""
+        for name, service in self._services.items():
+            if self.state(name)["state"] == CONSTRUCTING:
+                threading.Thread(target=self._warm_up, args=(name, service),
+                                 name=f'warm-up-{name}', daemon=True).start()
+
+    def _warm_up(self, name: str, service) -> None:
+        started = time.perf_counter()
+        self._update(name, state=RESTORING)
+        _local.warming = (self, name)
+        try:
+            service.warm_up()
+            authenticated = service.is_authenticated() if callable(getattr(service, 'is_authenticated', None)) else True
+        except Exception as e:
+            self._update(name, replace=True, state=FAILED, reason=str(e))
+            print(f"❌ {name}: Warm-up failed: {e}")
+            return
+        finally:
+            _local.warming = None
+        elapsed = round(time.perf_counter() - started, 2)
+        self._update(name, replace=True, state=READY if authenticated else DEGRADED, warm_up_seconds=elapsed)
+        print(f"✅ {name}: {'Ready' if authenticated else 'Up, not authenticated,'} after {elapsed}s")
+
+    def observe(self, name: str, status: Dict[str, Any]) -> None:
+        """Move a serving service between ready and degraded from its latest status."""
+        current = self._states.get(name)
+        if current is None or current["state"] not in SERVING_STATES:
+            return
+        state = READY if status.get('authenticated') else DEGRADED
+        if state != current["state"]:
+            self._update(name, state=state)
+
+    def is_ready(self, name: str) -> bool:
+        """True once ``name`` can serve requests (ready or degraded)."""
+        return self.state(name)["state"] in SERVING_STATES
+
+    def state(self, name: str) -> Dict[str, Any]:
+        return self._states.get(name, {"state": READY})
+
+    def readiness(self) -> Dict[str, Dict[str, Any]]:
+        """Lifecycle state of every registered service."""
+        return dict(self._states)
+
+    def overall(self) -> str:
+        """``starting`` while anything warms up, else ``ready`` or ``degraded``."""
+        states = [state["state"] for state in self._states.values()]
+        if any(state in WARMING_STATES for state in states):
+            return 'starting'
+        return READY if all(state == READY for state in states) else DEGRADED
+
+    def on_shutdown(self, hook: Callable[[], None]) -> None:
+        """Run ``hook`` when the process shuts down."""
+        self._shutdown_hooks.append(hook)
+
+    def shutdown(self) -> None:
+        """Run the shutdown hooks (newest first, each once)."""
+        while self._shutdown_hooks:
+            hook = self._shutdown_hooks.pop()
+            try:
+                hook()
+            except Exception as e:
+                print(f"⚠️ Shutdown hook {getattr(hook, '__name__', hook)} failed: {e}")
+
+    def readiness_guard(self, name: str) -> Callable[[], Optional[Any]]:
+        """Route guard answering 503 until ``name`` can serve requests."""
+        def guard():
+            state = self._states.get(name)
+            if state is None or state["state"] in SERVING_STATES:
+                return None
+            body = {**state, "error": f"{name} is not ready"}
+            return jsonify(body), 503, {'Retry-After': '1'}
+        return guard
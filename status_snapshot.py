@@ -0,0 +1,89 @@
+"""Periodically refreshed service status for ``/health`` and the dashboard.
+
+``service.get_status()`` is not free: OAuth services may refresh their token
+over the network, and WhatsApp asks Selenium (or the sidecar) for its state.
+``StatusSnapshot`` calls it from a daemon thread every
+``STATUS_REFRESH_INTERVAL`` seconds (default 10) and swaps in a new immutable
+snapshot, so readers only look up a dict.
+
+If the refresher falls behind by more than ``STATUS_MAX_AGE`` seconds
+(default 30), the snapshot is still served but flagged ``stale`` and a
+refresh is kicked off in the background. Request threads never wait on one.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+STATUS_REFRESH_INTERVAL = float(os.environ.get('STATUS_REFRESH_INTERVAL', 10))
+STATUS_MAX_AGE = float(os.environ.get('STATUS_MAX_AGE', 30))
+
+PENDING_STATUS = {"authenticated": False, "status": "pending"}
+
+
+class StatusSnapshot:
+    """Cached ``get_status()`` of every service, refreshed off the request path."""
+
+    def __init__(self, services: Dict[str, Any], interval: float = STATUS_REFRESH_INTERVAL,
+                 max_age: float = STATUS_MAX_AGE, registry=None):
+        self.services = services
+        self.registry = registry
+        self.interval = interval
+        self.max_age = max_age
+        self._snapshot = self._build({name: PENDING_STATUS for name in services}, taken_at=None)
+        self._refreshing = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _build(statuses: Dict[str, Dict[str, Any]], taken_at: Optional[float]) -> Dict[str, Any]:
+        authenticated = sum(1 for status in statuses.values() if status.get('authenticated'))
+        return {
+            "services": statuses,
+            "authenticated_services": authenticated,
+            "healthy": authenticated == len(statuses),
+            "taken_at": taken_at,
+        }
+
+    def start(self) -> None:
+        """Start the background refresher (idempotent)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='status-snapshot', daemon=True)
+            self._thread.start()
+
+    def refresh(self) -> None:
+        """Poll every service once and publish the result."""
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            statuses = {}
+            for name, service in self.services.items():
+                if self.registry is not None and not self.registry.is_ready(name):
+                    # Still warming up; polling it now would race its restore
+                    statuses[name] = PENDING_STATUS
+                    continue
+                try:
+                    statuses[name] = service.get_status()
+                except Exception as e:
+                    statuses[name] = {"authenticated": False, "status": "error", "error": str(e)}
+                if self.registry is not None:
+                    self.registry.observe(name, statuses[name])
+            self._snapshot = self._build(statuses, taken_at=time.time())
+        finally:
+            self._refreshing.release()
+
+    def get(self) -> Dict[str, Any]:
+        """Latest snapshot with its age; never blocks on a refresh."""
+        snapshot = self._snapshot
+        taken_at = snapshot["taken_at"]
+        age = time.time() - taken_at if taken_at is not None else None
+        stale = age is None or age > self.max_age
+        if stale:
+            self._wake.set()
+        return {**snapshot, "age_seconds": round(age, 1) if age is not None else None, "stale": stale}
+
+    def _run(self) -> None:
+        while True:
+            self.refresh()
+            self._wake.wait(self.interval)
+            self._wake.clear()
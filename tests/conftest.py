@@ -126,3 +126,75 @@ def sample_local_data():
         'blockchain-technology-impact.txt': 'Blockchain technology is transforming...',
         'climate-change-solutions.txt': 'Climate change requires immediate action...'
     }
+
+class FakeGoogleBatchServer:
+    """Local stand-in for www.googleapis.com serving Gmail list and batch calls.
+    
+    ``messages`` maps message ID to its metadata body. Every HTTP request is
+    recorded in ``requests`` as ``(method, path)``.
+    """
+    
+    def __init__(self, messages: Dict[str, Dict[str, Any]]):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        fake = self
+        self.messages = messages
+        self.requests = []
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests.append(('GET', self.path))
+                self._send(200, 'application/json', json.dumps(fake.list_messages(self.path)).encode())
+            
+            def do_POST(self):
+                fake.requests.append(('POST', self.path))
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                content_type, payload = fake.answer_batch(self.headers['Content-Type'], body)
+                self._send(200, content_type, payload)
+            
+            def _send(self, status, content_type, payload):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    def list_messages(self, path: str) -> Dict[str, Any]:
+        """Answer a messages.list call with every known ID (honouring maxResults)."""
+        from urllib.parse import parse_qs, urlsplit
+        limit = int(parse_qs(urlsplit(path).query).get('maxResults', ['100'])[0])
+        return {"messages": [{"id": message_id} for message_id in list(self.messages)[:limit]]}
+    
+    def answer_batch(self, content_type: str, body: bytes):
+        """Answer a multipart batch: one embedded HTTP response per embedded GET."""
+        import email.parser
+        import email.policy
+        request = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        boundary = 'batch_fake_response'
+        parts = []
+        for part in request.iter_parts():
+            request_line = part.get_payload(decode=True).decode().strip().split('\n', 1)[0]
+            message_id = request_line.split()[1].split('?')[0].rsplit('/', 1)[-1]
+            item = part['Content-ID'].strip('<>')
+            if message_id in self.messages:
+                status, data = '200 OK', self.messages[message_id]
+            else:
+                status, data = '404 Not Found', {"error": {"code": 404, "message": "Requested entity was not found."}}
+            parts.append(f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{item}>\r\n\r\n"
+                         f"HTTP/1.1 {status}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n"
+                         f"{json.dumps(data)}\r\n")
+        parts.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", ''.join(parts).encode()
+    
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
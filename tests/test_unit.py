@@ -134,10 +134,10 @@ class TestFilesAPI:
     """Unit tests for Files API."""
     
     @pytest.fixture
-    def files_api(self):
+    def files_api(self, tmp_path):
         """Create Files API instance for testing."""
         from apis.files.files_api import FilesAPI
-        return FilesAPI()
+        return FilesAPI(index_path=str(tmp_path / 'index.sqlite'))
     
     def test_initialization(self, files_api):
         """Test Files API initialization."""
@@ -162,3 +162,1894 @@ class TestFilesAPI:
         assert result['success'] is True
         assert 'files' in result
         assert len(result['files']) == 2
+
+
+class TestRouteDispatch:
+    """Unit tests for compiled endpoint dispatchers."""
+    
+    @pytest.fixture
+    def client(self):
+        """Create a Flask app with compiled Files and OAuth routes."""
+        from flask import Flask
+        from param_schema import Param
+        from route_dispatch import compile_endpoint
+        
+        files_service = Mock()
+        files_service.read_file.return_value = {"success": True, "file": {"name": "a.txt"}}
+        files_service.get_file_stats.return_value = {"success": True, "stats": {}}
+        oauth_service = Mock()
+        oauth_service.is_authenticated.return_value = False
+        
+        app = Flask(__name__)
+        routes = [
+            ('files', files_service, 'read', {"method": "GET", "handler": files_service.read_file,
+                                              "params": {"filename": Param(str, required=True)}}),
+            ('files', files_service, 'stats', {"method": "GET", "handler": files_service.get_file_stats}),
+            ('spotify', oauth_service, 'profile', {"method": "GET", "handler": oauth_service.get_profile}),
+        ]
+        for service_name, service, path, config in routes:
+            endpoint = f"{service_name}_{path}_get"
+            app.add_url_rule(f'/{service_name}/{path}', endpoint,
+                             compile_endpoint(service_name, service, path, config, endpoint))
+        self.files_service = files_service
+        self.oauth_service = oauth_service
+        return app.test_client()
+    
+    def test_extractor_passes_arguments(self, client):
+        """Test compiled extractor passes query params to the handler."""
+        response = client.get('/files/read?filename=a.txt')
+        assert response.status_code == 200
+        self.files_service.read_file.assert_called_once_with(filename='a.txt')
+    
+    def test_extractor_rejects_missing_param(self, client):
+        """Test missing required param returns 400 without calling the handler."""
+        response = client.get('/files/read')
+        assert response.status_code == 400
+        assert response.get_json()['error'] == "filename parameter required"
+        self.files_service.read_file.assert_not_called()
+    
+    def test_handler_without_extractor(self, client):
+        """Test endpoints without arguments are called directly."""
+        response = client.get('/files/stats')
+        assert response.status_code == 200
+        self.files_service.get_file_stats.assert_called_once_with()
+    
+    def test_auth_guard(self, client):
+        """Test OAuth routes return 401 when not authenticated."""
+        response = client.get('/spotify/profile')
+        assert response.status_code == 401
+        self.oauth_service.get_profile.assert_not_called()
+
+
+class TestParamSchema:
+    """Unit tests for compiled endpoint param validators."""
+    
+    @pytest.fixture
+    def validate(self):
+        """Compile a representative schema."""
+        from param_schema import Param, compile_params
+        return compile_params({
+            "q": Param(str, required=True),
+            "limit": Param(int, default=10, min=1, max=50),
+            "unread": Param(bool, default=False),
+            "content": Param(str, allow_empty=True),
+        })
+    
+    def _request(self, query_string='', json=None):
+        from flask import Flask
+        app = Flask(__name__)
+        return app.test_request_context('/', query_string=query_string, json=json)
+    
+    def test_defaults_and_coercion(self, validate):
+        """Test values are coerced and defaults filled in one pass."""
+        from flask import request
+        with self._request('q=beatles&unread=true'):
+            assert validate(request) == {"q": "beatles", "limit": 10, "unread": True, "content": None}
+    
+    def test_json_body_fallback(self, validate):
+        """Test params missing from the query string are read from the JSON body."""
+        from flask import request
+        with self._request(json={"q": "x", "limit": 5, "content": ""}):
+            assert validate(request) == {"q": "x", "limit": 5, "unread": False, "content": ""}
+    
+    def test_missing_required(self, validate):
+        """Test a missing required param is rejected."""
+        from flask import request
+        from param_schema import ParamError
+        with self._request('q='):
+            with pytest.raises(ParamError, match="q parameter required"):
+                validate(request)
+    
+    @pytest.mark.parametrize("query_string", ['q=x&limit=abc', 'q=x&limit=0', 'q=x&limit=51', 'q=x&unread=maybe'])
+    def test_invalid_values(self, validate, query_string):
+        """Test malformed and out-of-range values are rejected."""
+        from flask import request
+        from param_schema import ParamError
+        with self._request(query_string):
+            with pytest.raises(ParamError):
+                validate(request)
+
+
+class TestWhatsAppProxyAPI:
+    """Unit tests for the WhatsApp sidecar proxy used by multi-worker servers."""
+    
+    @pytest.fixture
+    def proxy(self):
+        """Create a proxy with a mocked HTTP session."""
+        from apis.whatsapp.whatsapp_proxy_api import WhatsAppProxyAPI
+        proxy = WhatsAppProxyAPI('http://sidecar:8082/')
+        proxy.session = Mock()
+        return proxy
+    
+    def _response(self, json_data, status_code=200, headers=None):
+        response = Mock()
+        response.status_code = status_code
+        response.headers = {'Content-Type': 'application/json', **(headers or {})}
+        response.json.return_value = json_data
+        return response
+    
+    def _client(self, proxy):
+        """Flask test client with the proxy's routes compiled."""
+        from flask import Flask
+        from route_dispatch import compile_endpoint
+        app = Flask(__name__)
+        for path, config in proxy.get_endpoints().items():
+            endpoint = f'whatsapp_personal_{path}'
+            app.add_url_rule(f'/whatsapp_personal/{path}', endpoint,
+                             compile_endpoint('whatsapp_personal', proxy, path, config, endpoint),
+                             methods=[config['method']])
+        return app.test_client()
+    
+    def test_endpoints_match_server_api(self, proxy):
+        """Test the proxy exposes the same endpoints as the local server API."""
+        endpoints = proxy.get_endpoints()
+        assert 'send_message' in endpoints
+        assert endpoints['send_message']['handler'] == proxy.send_message
+    
+    def test_get_forwards_query_params(self, proxy):
+        """Test GET endpoints forward params as the query string."""
+        proxy.session.get.return_value = self._response({"success": True, "messages": []})
+        body, status, _ = proxy.get_messages_from_chat(chat_name='Family', limit=5)
+        proxy.session.get.assert_called_once_with(
+            'http://sidecar:8082/whatsapp_personal/get_messages_from_chat',
+            params={'chat_name': 'Family', 'limit': 5}, timeout=120)
+        assert body['success'] is True
+        assert status == 200
+    
+    def test_post_forwards_json_body(self, proxy):
+        """Test POST endpoints forward params as a JSON body."""
+        proxy.session.request.return_value = self._response({"success": True})
+        proxy.send_message(chat_name='Family', message='hi')
+        proxy.session.request.assert_called_once_with(
+            'POST', 'http://sidecar:8082/whatsapp_personal/send_message',
+            json={'chat_name': 'Family', 'message': 'hi'}, timeout=120)
+    
+    def test_sidecar_down(self, proxy):
+        """Test an unreachable sidecar reports unauthenticated instead of raising."""
+        import requests
+        proxy.session.get.side_effect = requests.exceptions.ConnectionError("refused")
+        assert proxy.is_authenticated() is False
+        assert proxy.get_status()['authenticated'] is False
+    
+    def test_sidecar_status_is_passed_through(self, proxy):
+        """Test the sidecar's status code and Retry-After reach the client."""
+        proxy.session.request.return_value = self._response({"success": False, "error": "bad chat"}, 400)
+        proxy.session.get.return_value = self._response({"success": False, "error": "warming up"}, 503,
+                                                        {'Retry-After': '3'})
+        client = self._client(proxy)
+        assert client.post('/whatsapp_personal/send_message?chat_name=x&message=hi').status_code == 400
+        response = client.get('/whatsapp_personal/get_latest_message')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '3'
+        assert response.get_json()['error'] == 'warming up'
+    
+    def test_sidecar_down_is_503(self, proxy):
+        """Test an unreachable sidecar is a 503 with Retry-After, like other upstreams."""
+        import requests
+        proxy.session.get.side_effect = requests.exceptions.ConnectionError("refused")
+        client = self._client(proxy)
+        for path in ('get_latest_message', 'get_status'):
+            response = client.get(f'/whatsapp_personal/{path}')
+            assert response.status_code == 503
+            assert response.headers['Retry-After'] == '1'
+            assert 'sidecar unavailable' in response.get_json()['error']
+
+
+class TestAsyncRequests:
+    """Unit tests for the async request path on BaseAPI."""
+    
+    @pytest.fixture
+    def spotify_api(self):
+        """Create an authenticated Spotify API instance."""
+        import time
+        with patch('apis.spotify.spotify_api.SpotifyAPI._load_credentials', return_value=create_mock_credentials('spotify')):
+            from apis.spotify.spotify_api import SpotifyAPI
+            api = SpotifyAPI()
+        api._tokens = {'access_token': 'old', 'refresh_token': 'r', 'expires_at': time.time() + 3600}
+        return api
+    
+    def _run(self, api, responses, refresh=True):
+        """Run one async call against a mock transport returning ``responses`` in order."""
+        import asyncio
+        import httpx
+        from async_http import async_session
+        
+        seen = []
+        
+        def handler(req):
+            seen.append(req.headers['Authorization'])
+            return responses.pop(0)
+        
+        async def call():
+            async with async_session(transport=httpx.MockTransport(handler)):
+                return await api._handle_api_call_async('GET', '/me')
+        
+        def fake_refresh():
+            api._tokens['access_token'] = 'new'
+            return refresh
+        
+        real_sleep = asyncio.sleep
+        with patch.object(api, '_refresh_token', side_effect=fake_refresh), \
+             patch('asyncio.sleep', new=Mock(side_effect=lambda s: real_sleep(0))):
+            return asyncio.run(call()), seen
+    
+    def test_handlers_share_one_long_lived_client(self):
+        """Test async handlers reuse the worker's client across requests until shutdown closes it."""
+        import async_http
+        
+        async def handler():
+            async with async_http.async_session() as client:
+                return client
+        run = async_http.run_async_handler(handler)
+        first, second = run(), run()
+        assert first is second and not first.is_closed
+        assert 'https://graph.facebook.com' in {pattern.pattern for pattern in first._mounts}
+        async_http.close_shared_client()
+        assert first.is_closed
+        assert run() is not first
+        async_http.close_shared_client()
+    
+    def test_success(self, spotify_api):
+        """Test a plain async call returns the JSON body."""
+        import httpx
+        result, seen = self._run(spotify_api, [httpx.Response(200, json={"id": "me"})])
+        assert result == {"id": "me"}
+        assert seen == ['Bearer old']
+    
+    def test_401_refreshes_and_retries(self, spotify_api):
+        """Test a 401 refreshes the token and retries with the new one."""
+        import httpx
+        result, seen = self._run(spotify_api, [httpx.Response(401), httpx.Response(200, json={"id": "me"})])
+        assert result == {"id": "me"}
+        assert seen == ['Bearer old', 'Bearer new']
+    
+    def test_429_retries(self, spotify_api):
+        """Test a 429 is retried after Retry-After."""
+        import httpx
+        result, _ = self._run(spotify_api, [httpx.Response(429, headers={'Retry-After': '2'}),
+                                            httpx.Response(200, json={"ok": True})])
+        assert result == {"ok": True}
+    
+    def test_client_error_is_reported(self, spotify_api):
+        """Test a 4xx is returned as an error dict, like the sync path."""
+        import httpx
+        result, _ = self._run(spotify_api, [httpx.Response(404)])
+        assert 'error' in result
+    
+    def test_long_retry_after_fails_fast(self, spotify_api):
+        """Test a Retry-After beyond the budget returns a retry hint instead of sleeping."""
+        import httpx
+        result, _ = self._run(spotify_api, [httpx.Response(429, headers={'Retry-After': '120'})])
+        assert result['retry_after'] == 120
+
+
+class TestRetryPolicy:
+    """Unit tests for the retry budget and the sync request path."""
+    
+    @pytest.fixture
+    def spotify_api(self):
+        """Create an authenticated Spotify API instance."""
+        import time
+        with patch('apis.spotify.spotify_api.SpotifyAPI._load_credentials', return_value=create_mock_credentials('spotify')):
+            from apis.spotify.spotify_api import SpotifyAPI
+            api = SpotifyAPI()
+        api._tokens = {'access_token': 'token', 'expires_at': time.time() + 3600}
+        return api
+    
+    def _response(self, status, headers=None, body=None):
+        """Build a mock requests response."""
+        response = Mock(status_code=status, headers=headers or {})
+        response.json.return_value = body or {}
+        return response
+    
+    def test_backoff_is_jittered_and_capped(self):
+        """Test backoff stays within [0, min(max_delay, base * 2^attempt)]."""
+        from retry_policy import RetryPolicy
+        policy = RetryPolicy(base_delay=1, max_delay=4)
+        for attempt in range(6):
+            assert 0 <= policy.backoff_delay(attempt) <= min(4, 2 ** attempt)
+    
+    def test_budget_caps_total_sleep(self):
+        """Test the budget refuses a wait that would exceed the sleep cap."""
+        from retry_policy import RetryPolicy, UpstreamUnavailable
+        budget = RetryPolicy(max_attempts=5, max_total_sleep=3).start()
+        assert budget.next_delay(0, "Rate limited", retry_after=2) == 2
+        with pytest.raises(UpstreamUnavailable) as exc:
+            budget.next_delay(1, "Rate limited", retry_after=2)
+        assert exc.value.retry_after == 2
+    
+    def test_parse_retry_after(self):
+        """Test Retry-After parses seconds and HTTP dates."""
+        from email.utils import formatdate
+        import time
+        from retry_policy import parse_retry_after
+        assert parse_retry_after('7') == 7
+        assert parse_retry_after(None) == 1.0
+        assert 50 <= parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+    
+    def test_long_retry_after_fails_fast(self, spotify_api):
+        """Test a 429 with a long Retry-After returns a 503 hint without sleeping."""
+        spotify_api.session.request = Mock(return_value=self._response(429, {'Retry-After': '120'}))
+        with patch('base_api.time.sleep') as sleep:
+            result = spotify_api.get_playlists()
+        sleep.assert_not_called()
+        assert result['retry_after'] == 120
+        assert spotify_api.session.request.call_count == 1
+    
+    def test_server_error_is_retried(self, spotify_api):
+        """Test a 5xx is retried after a bounded backoff."""
+        spotify_api.session.request = Mock(side_effect=[self._response(503),
+                                                        self._response(200, body={"items": []})])
+        with patch('base_api.time.sleep') as sleep:
+            result = spotify_api.get_playlists()
+        assert result == {"items": []}
+        assert sleep.call_args[0][0] <= spotify_api.retry_policy.base_delay
+    
+    def test_persistent_server_error_hints_retry(self, spotify_api):
+        """Test exhausting attempts on 5xx reports a retry hint."""
+        spotify_api.session.request = Mock(return_value=self._response(502))
+        with patch('base_api.time.sleep'):
+            result = spotify_api.get_playlists()
+        assert 'after 3 attempts' in result['error']
+        assert 'retry_after' in result
+    
+    def test_serializer_maps_hint_to_503(self):
+        """Test error results with a retry hint become 503 with Retry-After."""
+        from flask import Flask
+        from route_dispatch import serialize_json
+        with Flask(__name__).app_context():
+            response, status, headers = serialize_json({"error": "throttled", "retry_after": 30})
+        assert status == 503
+        assert headers['Retry-After'] == '30'
+
+
+class TestRateLimiter:
+    """Unit tests for the client-side token-bucket limiter."""
+    
+    def test_burst_then_queue_then_shed(self):
+        """Test calls within the burst pass, short waits queue and long waits are shed."""
+        from rate_limiter import RateLimit, RateLimiter
+        from retry_policy import UpstreamUnavailable
+        limiter = RateLimiter('test', {'': RateLimit(10, 2)}, max_wait=0.15)
+        with patch('rate_limiter.time.sleep') as sleep:
+            limiter.acquire('/a')
+            limiter.acquire('/a')
+            sleep.assert_not_called()
+            limiter.acquire('/a')
+            assert 0 < sleep.call_args[0][0] <= 0.1
+        with pytest.raises(UpstreamUnavailable) as exc:
+            limiter.acquire('/a')
+        assert exc.value.retry_after > 0
+    
+    def test_endpoint_families(self):
+        """Test endpoints draw from the longest matching family bucket."""
+        from rate_limiter import RateLimit, RateLimiter
+        limiter = RateLimiter('test', {'': RateLimit(1, 5), '/gmail': RateLimit(1, 1)}, max_wait=0)
+        limiter.acquire('/gmail/v1/users/me/messages')
+        limiter.acquire('/drive/v3/files')
+        levels = limiter.levels()
+        assert levels['/gmail']['tokens'] < 1
+        assert 3.9 < levels['*']['tokens'] < 5
+    
+    def test_registry_is_shared(self):
+        """Test every instance of a service shares one limiter."""
+        from rate_limiter import RateLimit, get_rate_limiter
+        first = get_rate_limiter('shared_test', {'': RateLimit(1, 1)})
+        assert get_rate_limiter('shared_test', {}) is first
+    
+    def test_shed_call_returns_retry_hint(self):
+        """Test a shed call never reaches the provider and reports a retry hint."""
+        import time
+        from rate_limiter import RateLimit, RateLimiter
+        with patch('apis.spotify.spotify_api.SpotifyAPI._load_credentials', return_value=create_mock_credentials('spotify')):
+            from apis.spotify.spotify_api import SpotifyAPI
+            api = SpotifyAPI()
+        api._tokens = {'access_token': 'token', 'expires_at': time.time() + 3600}
+        api.rate_limiter = RateLimiter('spotify', {'': RateLimit(0.1, 1)}, max_wait=0)
+        api.session.request = Mock(return_value=Mock(status_code=200, headers={}, json=Mock(return_value={})))
+        assert 'error' not in api.get_profile()
+        result = api.get_profile()
+        assert result['retry_after'] >= 1
+        assert api.session.request.call_count == 1
+
+
+class TestResponseCache:
+    """Unit tests for the GET response cache."""
+    
+    def test_lru_eviction(self):
+        """Test the memory backend evicts the least recently used entry."""
+        from response_cache import MemoryBackend
+        backend = MemoryBackend(max_entries=2)
+        backend.set('a', (0, 1))
+        backend.set('b', (0, 2))
+        backend.get('a')
+        backend.set('c', (0, 3))
+        assert backend.get('b') is None
+        assert backend.get('a') == (0, 1)
+    
+    def test_ttl_and_errors(self):
+        """Test fresh entries are served from cache and errors are never stored."""
+        from response_cache import MemoryBackend, ResponseCache
+        cache = ResponseCache(MemoryBackend())
+        compute = Mock(return_value={"id": "me"})
+        assert cache.get_or_compute('k', compute, ttl=60) == {"id": "me"}
+        assert cache.get_or_compute('k', compute, ttl=60) == {"id": "me"}
+        assert compute.call_count == 1
+        failing = Mock(return_value={"error": "boom"})
+        cache.get_or_compute('e', failing, ttl=60)
+        cache.get_or_compute('e', failing, ttl=60)
+        assert failing.call_count == 2
+    
+    def test_stale_while_revalidate(self):
+        """Test a stale entry is served immediately while one refresh runs in the background."""
+        import time
+        from response_cache import MemoryBackend, ResponseCache
+        cache = ResponseCache(MemoryBackend())
+        cache.backend.set('k', (time.time() - 120, {"v": "old"}))
+        compute = Mock(return_value={"v": "new"})
+        assert cache.get_or_compute('k', compute, ttl=60, stale=600) == {"v": "old"}
+        cache._refresher.shutdown(wait=True)
+        assert compute.call_count == 1
+        assert cache.backend.get('k')[1] == {"v": "new"}
+    
+    def test_disk_backend(self, tmp_path):
+        """Test the SQLite backend round-trips values and bounds its size."""
+        from response_cache import DiskBackend
+        backend = DiskBackend(str(tmp_path / 'cache.sqlite'), max_entries=2)
+        for i, key in enumerate('abc'):
+            backend.set(key, (float(i), {"n": i}))
+        assert len(backend) == 2
+        assert backend.get('c') == (2.0, {"n": 2})
+    
+    def test_route_cache_keyed_on_token_identity(self):
+        """Test cached routes hit upstream once per account and params."""
+        from flask import Flask
+        from param_schema import Param
+        from response_cache import MemoryBackend, ResponseCache
+        from route_dispatch import compile_endpoint
+        
+        service = Mock()
+        service.is_authenticated.return_value = True
+        service.cache_identity.return_value = 'user-a'
+        service.get_playlists.return_value = {"items": []}
+        config = {"method": "GET", "handler": service.get_playlists, "cache_ttl": 60,
+                  "params": {"limit": Param(int, default=10)}}
+        app = Flask(__name__)
+        with patch('route_dispatch.get_response_cache', return_value=ResponseCache(MemoryBackend())):
+            app.add_url_rule('/spotify/playlists', 'p',
+                             compile_endpoint('spotify', service, 'playlists', config, 'p'))
+        client = app.test_client()
+        
+        client.get('/spotify/playlists')
+        client.get('/spotify/playlists?limit=10')
+        assert service.get_playlists.call_count == 1
+        client.get('/spotify/playlists?limit=5')
+        service.cache_identity.return_value = 'user-b'
+        client.get('/spotify/playlists')
+        assert service.get_playlists.call_count == 3
+
+
+class TestConditionalRequests:
+    """Unit tests for ETag / Last-Modified revalidation."""
+    
+    @pytest.fixture
+    def google_api(self):
+        """Create an authenticated Google API instance."""
+        import time
+        with patch('apis.google.google_api.GoogleAPI._load_credentials', return_value=create_mock_credentials('google')):
+            from apis.google.google_api import GoogleAPI
+            api = GoogleAPI()
+        api._tokens = {'access_token': 'token', 'refresh_token': 'r', 'expires_at': time.time() + 3600}
+        return api
+    
+    def _response(self, status, body=b'', headers=None):
+        """Build a real requests response."""
+        import requests
+        response = requests.Response()
+        response.status_code = status
+        response._content = body
+        response.headers.update(headers or {})
+        return response
+    
+    def test_304_served_from_stored_body(self, google_api):
+        """Test the second GET is conditional, a 304 returns the stored JSON and saved bytes are exported."""
+        from conditional_cache import validator_families
+        body = b'{"files": [{"id": "1"}]}'
+        google_api.session.request = Mock(side_effect=[
+            self._response(200, body, {'ETag': '"v1"', 'Content-Type': 'application/json'}),
+            self._response(304),
+            self._response(304),
+        ])
+        assert google_api.get_drive_files() == {"files": [{"id": "1"}]}
+        assert google_api.get_drive_files() == {"files": [{"id": "1"}]}
+        assert google_api.get_drive_files() == {"files": [{"id": "1"}]}
+        
+        first, second = google_api.session.request.call_args_list[:2]
+        assert 'If-None-Match' not in first.kwargs['headers']
+        assert second.kwargs['headers']['If-None-Match'] == '"v1"'
+        stats = google_api.get_status()['conditional_requests']
+        assert stats['not_modified'] == 2
+        assert stats['bytes_saved'] == 2 * len(body)
+        families = {name: samples for name, _, _, samples in validator_families({'google': stats})}
+        assert families['conditional_bytes_saved_total'] == [({"service": 'google'}, 2 * len(body))]
+    
+    def test_last_modified_and_accounts(self, google_api):
+        """Test If-Modified-Since is sent and validators are not shared across accounts."""
+        google_api.session.request = Mock(return_value=self._response(
+            200, b'{}', {'Last-Modified': 'Wed, 21 Oct 2026 07:28:00 GMT'}))
+        google_api.get_calendar_events()
+        google_api.get_calendar_events()
+        assert google_api.session.request.call_args.kwargs['headers']['If-Modified-Since'] == 'Wed, 21 Oct 2026 07:28:00 GMT'
+        google_api._tokens['refresh_token'] = 'other-account'
+        google_api.get_calendar_events()
+        assert 'If-Modified-Since' not in google_api.session.request.call_args.kwargs['headers']
+    
+    def test_304_body_is_not_shared_between_callers(self, google_api):
+        """Test a caller changing its result does not change what the next 304 returns."""
+        import httpx
+        from conditional_cache import AsyncCachedResponse
+        body = b'{"files": [{"id": "1"}]}'
+        google_api.session.request = Mock(side_effect=[
+            self._response(200, body, {'ETag': '"v1"'}),
+            self._response(304),
+            self._response(304),
+        ])
+        google_api.get_drive_files()
+        result = google_api.get_drive_files()
+        result['files'][0]['expanded'] = True
+        result['files'].append({"id": "2"})
+        assert google_api.get_drive_files() == {"files": [{"id": "1"}]}
+        
+        entry = next(iter(google_api.validators._entries.values()))
+        response = AsyncCachedResponse(entry, httpx.Request('GET', 'https://example.com'))
+        response.json()['files'].clear()
+        assert response.json() == {"files": [{"id": "1"}]}
+    
+    def test_byte_budget_evicts_oldest(self):
+        """Test the store stays within its byte budget."""
+        from conditional_cache import ValidatorCache
+        cache = ValidatorCache(max_bytes=10)
+        cache.store('a', self._response(200, b'123456', {'ETag': 'a'}))
+        cache.store('b', self._response(200, b'123456', {'ETag': 'b'}))
+        assert cache.get('a') is None
+        assert cache.get('b').etag == 'b'
+
+
+class TestPagination:
+    """Unit tests for cursor pagination and NDJSON streaming."""
+    
+    @pytest.fixture
+    def google_api(self):
+        """Create a Google API instance."""
+        with patch('apis.google.google_api.GoogleAPI._load_credentials', return_value=create_mock_credentials('google')):
+            from apis.google.google_api import GoogleAPI
+            return GoogleAPI()
+    
+    @pytest.fixture
+    def facebook_api(self):
+        """Create a Facebook API instance."""
+        from apis.meta.facebook_api import FacebookAPI
+        return FacebookAPI('app_id', 'app_secret')
+    
+    def test_page_token_cursor(self):
+        """Test Google page tokens replace any previous pageToken."""
+        from pagination import PageTokenCursor
+        cursor = PageTokenCursor()
+        assert cursor.next_endpoint('/drive/v3/files?pageSize=2&pageToken=a', {"nextPageToken": "b"}) == \
+            '/drive/v3/files?pageSize=2&pageToken=b'
+        assert cursor.next_endpoint('/drive/v3/files', {}) is None
+    
+    def test_all_pages_streamed(self, google_api):
+        """Test ?all follows nextPageToken until the last page."""
+        pages = [{"files": [{"id": 1}, {"id": 2}], "nextPageToken": "t2"}, {"files": [{"id": 3}]}]
+        with patch.object(google_api, '_handle_api_call', side_effect=pages) as call:
+            items = list(google_api.get_drive_files(page_size=2, all=True))
+        assert items == [{"id": 1}, {"id": 2}, {"id": 3}]
+        assert call.call_args_list[1][0][1] == '/drive/v3/files?pageSize=2&pageToken=t2'
+    
+    def test_max_items_stops_early(self, facebook_api):
+        """Test max_items stops without fetching pages it does not need."""
+        page = {"data": [{"id": 1}, {"id": 2}], "paging": {"next": "https://graph.facebook.com/v18.0/me/posts?after=x"}}
+        with patch.object(facebook_api, '_handle_api_call', return_value=page) as call:
+            items = list(facebook_api.get_posts(max_items=3))
+        assert [item["id"] for item in items] == [1, 2, 1]
+        assert call.call_count == 2
+        assert call.call_args_list[1][0][1] == "https://graph.facebook.com/v18.0/me/posts?after=x"
+    
+    def test_errors(self, facebook_api):
+        """Test a first-page error is a normal error and a later one ends the stream."""
+        with patch.object(facebook_api, '_handle_api_call', return_value={"error": "denied"}):
+            assert facebook_api.get_posts(all=True) == {"error": "denied"}
+        pages = [{"data": [{"id": 1}], "paging": {"next": "https://graph.facebook.com/v18.0/next"}}, {"error": "boom"}]
+        with patch.object(facebook_api, '_handle_api_call', side_effect=pages):
+            items = list(facebook_api.get_posts(all=True))
+        assert items == [{"id": 1}, {"error": "boom", "items_before_error": 1}]
+    
+    def test_generator_streamed_as_ndjson(self):
+        """Test routes stream generator results as NDJSON."""
+        import json
+        from flask import Flask
+        from route_dispatch import compile_endpoint
+        service = Mock()
+        service.list_items.return_value = (item for item in [{"id": 1}, {"id": 2}])
+        app = Flask(__name__)
+        app.add_url_rule('/files/items', 'items', compile_endpoint(
+            'files', service, 'items', {"method": "GET", "handler": service.list_items}, 'items'))
+        response = app.test_client().get('/files/items')
+        assert response.mimetype == 'application/x-ndjson'
+        assert [json.loads(line) for line in response.data.splitlines()] == [{"id": 1}, {"id": 2}]
+
+
+class TestStreaming:
+    """Unit tests for streamed generator responses."""
+    
+    @pytest.fixture
+    def client(self):
+        """Create a Flask app with one generator route."""
+        from flask import Flask
+        from route_dispatch import compile_endpoint
+        self.service = Mock()
+        app = Flask(__name__)
+        app.add_url_rule('/files/items', 'items', compile_endpoint(
+            'files', self.service, 'items', {"method": "GET", "handler": self.service.list_items}, 'items'))
+        return app.test_client()
+    
+    def test_json_array_when_preferred(self, client):
+        """Test Accept: application/json streams one valid JSON array."""
+        self.service.list_items.return_value = (item for item in [{"id": 1}, {"id": 2}])
+        response = client.get('/files/items', headers={'Accept': 'application/json'})
+        assert response.mimetype == 'application/json'
+        assert response.get_json() == [{"id": 1}, {"id": 2}]
+        self.service.list_items.return_value = (item for item in [])
+        assert client.get('/files/items', headers={'Accept': 'application/json'}).get_json() == []
+    
+    def test_exception_ends_stream_with_error(self, client):
+        """Test a generator failing mid-stream still yields valid JSON ending in an error."""
+        def items():
+            yield {"id": 1}
+            raise RuntimeError("disk gone")
+        self.service.list_items.return_value = items()
+        response = client.get('/files/items', headers={'Accept': 'application/json'})
+        assert response.get_json() == [{"id": 1}, {"error": "disk gone"}]
+    
+    def test_chunks_are_coalesced(self):
+        """Test the first item is flushed alone and the rest are batched."""
+        from route_dispatch import STREAM_CHUNK_BYTES, _coalesce
+        pieces = ['x' * 100] * 1000
+        chunks = list(_coalesce(iter(pieces)))
+        assert chunks[0] == pieces[0]
+        assert len(chunks) < 20
+        assert all(len(chunk) >= STREAM_CHUNK_BYTES for chunk in chunks[1:-1])
+        assert ''.join(chunks) == ''.join(pieces)
+    
+    def test_files_search_stream(self, tmp_path):
+        """Test files search can stream matches as they are found."""
+        from apis.files.files_api import FilesAPI
+        api = FilesAPI(str(tmp_path), index_path=str(tmp_path / 'index.sqlite'))
+        (tmp_path / 'a.txt').write_text('hello\nworld')
+        (tmp_path / 'b.txt').write_text('nothing')
+        results = list(api.iter_search_results('hello'))
+        assert [r['name'] for r in results] == ['a.txt']
+        assert results[0]['matching_lines'] == [{"line_number": 1, "line": "hello"}]
+
+
+class TestGmailBatch:
+    """Unit tests for Gmail metadata expansion through the batch endpoint."""
+    
+    @pytest.fixture
+    def gmail(self):
+        """Google API pointed at a local fake batch server with 150 messages."""
+        import time
+        from rate_limiter import RateLimiter
+        from tests.conftest import FakeGoogleBatchServer
+        messages = {f"m{i}": {"id": f"m{i}", "snippet": f"hello {i}",
+                              "payload": {"headers": [{"name": "Subject", "value": f"Subject {i}"}]}}
+                    for i in range(150)}
+        server = FakeGoogleBatchServer(messages)
+        with patch('apis.google.google_api.GoogleAPI._load_credentials', return_value=create_mock_credentials('google')):
+            from apis.google.google_api import GoogleAPI
+            api = GoogleAPI()
+        api.api_base_url = server.url
+        api._tokens = {'access_token': 'token', 'refresh_token': 'r', 'expires_at': time.time() + 3600}
+        api.rate_limiter = RateLimiter('google-test', {})
+        yield api, server
+        server.close()
+    
+    def test_round_trip_codec(self):
+        """Test batch bodies and multipart responses round-trip through the parser."""
+        from apis.google.batch import build_batch_body, parse_batch_response
+        from tests.conftest import FakeGoogleBatchServer
+        server = FakeGoogleBatchServer({"a": {"id": "a"}})
+        try:
+            body = build_batch_body(['/gmail/v1/users/me/messages/a', '/gmail/v1/users/me/messages/zz'], 'b1')
+            content_type, payload = server.answer_batch('multipart/mixed; boundary=b1', body)
+        finally:
+            server.close()
+        results = parse_batch_response(payload, content_type, 2)
+        assert results[0] == {"id": "a"}
+        assert results[1]["status"] == 404
+    
+    def test_expand_metadata_uses_batches(self, gmail):
+        """Test 150 listed messages are expanded with one list call and two batch calls."""
+        import asyncio
+        api, server = gmail
+        result = asyncio.run(api.get_gmail_messages(max_results=500, expand='metadata'))
+        assert len(result['messages']) == 150
+        assert result['messages'][149]['snippet'] == 'hello 149'
+        assert [method for method, _ in server.requests] == ['GET', 'POST', 'POST']
+        assert server.requests[1][1] == '/batch/gmail/v1'
+    
+    def test_batch_charges_sub_requests_once(self, gmail):
+        """Test each batch reserves its sub-requests in one go and the batch POST is not charged."""
+        import asyncio
+        from unittest.mock import AsyncMock
+        from rate_limiter import RateLimit, RateLimiter
+        api, server = gmail
+        api.rate_limiter = RateLimiter('google-test', {'': RateLimit(10, 20), '/gmail': RateLimit(40, 50)}, max_wait=10)
+        with patch('rate_limiter.asyncio.sleep', new_callable=AsyncMock) as sleep:
+            asyncio.run(api.get_gmail_messages(max_results=500, expand='metadata'))
+        levels = api.rate_limiter.levels()
+        assert levels['*']['tokens'] == 20
+        # 151 tokens taken (list + 150 sub-requests); refill during the test is well under 50
+        assert levels['/gmail']['tokens'] < 0
+        assert sleep.call_count <= 2
+    
+    def test_expand_endpoint_runs_on_the_async_path(self, gmail):
+        """Test the route dispatches the coroutine handler and its batches go out concurrently."""
+        import inspect
+        import threading
+        import time
+        api, server = gmail
+        assert inspect.iscoroutinefunction(api.get_endpoints()['gmail/messages']['handler'])
+        in_flight, peak, lock = [0], [0], threading.Lock()
+        answer_batch = server.answer_batch
+        
+        def slow_answer(content_type, body):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.2)
+            with lock:
+                in_flight[0] -= 1
+            return answer_batch(content_type, body)
+        
+        server.answer_batch = slow_answer
+        from async_http import run_async_handler
+        result = run_async_handler(api.get_gmail_messages)(max_results=500, expand='metadata')
+        assert len(result['messages']) == 150
+        assert peak[0] == 2
+    
+    def test_missing_message_reports_per_item_error(self, gmail):
+        """Test a failed sub-request is reported on its own item."""
+        api, server = gmail
+        results = api._expand_messages([{"id": "m1"}, {"id": "gone"}])
+        assert results[0]['snippet'] == 'hello 1'
+        assert results[1]['id'] == 'gone'
+        assert results[1]['status'] == 404
+    
+    def test_expand_is_validated(self):
+        """Test unknown expand values are rejected by the param schema."""
+        from flask import Flask
+        from param_schema import Param, ParamError, compile_params
+        validate = compile_params({"expand": Param(str, choices=('metadata',))})
+        with Flask(__name__).test_request_context('/?expand=full'):
+            from flask import request
+            with pytest.raises(ParamError):
+                validate(request)
+
+
+class TestGraphBatch:
+    """Unit tests for Graph API batch requests."""
+    
+    @pytest.fixture
+    def facebook_api(self):
+        """Create an authenticated Facebook API instance answering batches locally."""
+        import json
+        import requests
+        from rate_limiter import RateLimiter
+        from apis.meta.facebook_api import FacebookAPI
+        api = FacebookAPI('app_id', 'app_secret')
+        api._tokens = {'access_token': 'token'}
+        api.rate_limiter = RateLimiter('facebook-test', {})
+        
+        def answer(method, url, headers=None, timeout=None, json=None, **kwargs):
+            items = []
+            for sub in json['batch']:
+                if sub['relative_url'].startswith('missing'):
+                    items.append({"code": 404, "body": '{"error": {"message": "Unsupported get request"}}'})
+                elif sub['relative_url'].startswith('slow'):
+                    items.append(None)
+                else:
+                    items.append({"code": 200, "body": f'{{"id": "{sub["relative_url"]}"}}'})
+            response = requests.Response()
+            response.status_code = 200
+            response._content = _json.dumps(items).encode()
+            return response
+        
+        _json = json
+        api.session.request = Mock(side_effect=answer)
+        return api
+    
+    def test_chunks_of_50_in_order(self, facebook_api):
+        """Test 120 sub-requests go out as three Graph batches and come back in order."""
+        subs = [{"relative_url": f"/media{i}"} for i in range(120)]
+        results = facebook_api._batch_call(subs)
+        batches = [call.kwargs['json']['batch'] for call in facebook_api.session.request.call_args_list]
+        assert [len(batch) for batch in batches] == [50, 50, 20]
+        assert batches[0][0] == {"method": "GET", "relative_url": "media0"}
+        assert [result['body']['id'] for result in results] == [f"media{i}" for i in range(120)]
+    
+    def test_batch_is_shed_instead_of_waiting_past_the_usual_limit(self, facebook_api):
+        """Test a full batch fits the Meta burst, and one the bucket can't cover soon is shed with Retry-After."""
+        from rate_limiter import DEFAULT_MAX_WAIT, RateLimiter
+        from apis.meta.base_meta_api import BaseMetaAPI, MAX_BATCH_REQUESTS
+        facebook_api.rate_limiter = RateLimiter('facebook-test', BaseMetaAPI.rate_limits)
+        assert MAX_BATCH_REQUESTS <= BaseMetaAPI.rate_limits[''].burst
+        subs = [{"relative_url": f"me/media{i}"} for i in range(MAX_BATCH_REQUESTS)]
+        with patch('rate_limiter.time.sleep') as sleep:
+            assert facebook_api.run_batch(subs)['success'] is True
+            result = facebook_api.run_batch(subs)
+        sleep.assert_not_called()
+        assert facebook_api.session.request.call_count == 1
+        assert result['retry_after'] > DEFAULT_MAX_WAIT
+        # The shed batch gave its tokens back, so single calls still get through
+        assert facebook_api.rate_limiter.levels()['*']['tokens'] >= 0
+    
+    def test_per_item_errors(self, facebook_api):
+        """Test failed and missing sub-responses are reported per item."""
+        result = facebook_api.run_batch([{"relative_url": "me"}, {"relative_url": "missing/1"},
+                                         {"relative_url": "slow/1"}])
+        assert result['success'] is True
+        assert result['errors'] == 2
+        assert result['results'][0] == {"code": 200, "body": {"id": "me"}}
+        assert result['results'][1] == {"code": 404, "error": "Unsupported get request"}
+        assert result['results'][2]['code'] is None
+    
+    def test_invalid_items_rejected_before_sending(self, facebook_api):
+        """Test malformed sub-requests fail the batch without calling Graph."""
+        result = facebook_api.run_batch([{"relative_url": "me"}, {"method": "PATCH", "relative_url": "x"}])
+        assert result == {"success": False, "error": "Unsupported batch method: PATCH"}
+        facebook_api.session.request.assert_not_called()
+    
+    def test_post_body_encoded(self, facebook_api):
+        """Test dict bodies are form-encoded as Graph expects."""
+        facebook_api._batch_call([{"method": "post", "relative_url": "me/feed", "body": {"message": "hi there"}}])
+        sub = facebook_api.session.request.call_args.kwargs['json']['batch'][0]
+        assert sub == {"method": "POST", "relative_url": "me/feed", "body": "message=hi+there"}
+    
+    def test_list_param(self):
+        """Test list params accept JSON bodies and bound their length."""
+        from flask import Flask, request
+        from param_schema import Param, ParamError, compile_params
+        validate = compile_params({"batch": Param(list, required=True, min=1, max=2)})
+        app = Flask(__name__)
+        with app.test_request_context('/', method='POST', json={"batch": [{"relative_url": "me"}]}):
+            assert validate(request) == {"batch": [{"relative_url": "me"}]}
+        with app.test_request_context('/', method='POST', json={"batch": [1, 2, 3]}):
+            with pytest.raises(ParamError):
+                validate(request)
+        with app.test_request_context('/?batch=notjson'):
+            with pytest.raises(ParamError):
+                validate(request)
+
+
+class TestGraphFieldExpansion:
+    """Unit tests for Graph field expansion and chained calls."""
+    
+    @pytest.fixture
+    def instagram_api(self):
+        """Create an authenticated Instagram API instance with a local rate limiter."""
+        from rate_limiter import RateLimiter
+        from apis.meta.instagram_api import InstagramAPI
+        api = InstagramAPI('app_id', 'app_secret')
+        api._tokens = {'access_token': 'token'}
+        api.rate_limiter = RateLimiter('instagram-test', {})
+        return api
+    
+    def test_graph_fields_render_nested_edges(self):
+        """Test nested edges render with limits and braces."""
+        from apis.meta.base_meta_api import GraphEdge, graph_fields
+        fields = ['id', GraphEdge('comments', ['id', GraphEdge('replies', ['text'])], limit=5)]
+        assert graph_fields(fields) == 'id,comments.limit(5){id,replies{text}}'
+    
+    def test_media_expanded_is_one_request(self, instagram_api):
+        """Test children and comments are nested into the media list request."""
+        with patch.object(instagram_api, '_handle_api_call', return_value={"data": []}) as call:
+            instagram_api.get_media_expanded(limit=10, comments=3)
+        endpoint = call.call_args.args[1]
+        assert call.call_count == 1
+        assert 'children{id,media_type,media_url,thumbnail_url}' in endpoint
+        assert 'comments.limit(3){id,text,username,timestamp}' in endpoint
+        assert endpoint.endswith('&limit=10')
+    
+    def test_media_expanded_skips_edges(self, instagram_api):
+        """Test edges can be left out."""
+        with patch.object(instagram_api, '_handle_api_call', return_value={"data": []}) as call:
+            instagram_api.get_media_expanded(children=False, comments=0)
+        assert '{' not in call.call_args.args[1]
+    
+    def test_hashtag_media_single_round_trip(self, instagram_api):
+        """Test hashtag search and recent media go out as one dependent batch."""
+        response = Mock(json=Mock(return_value=[None, {"code": 200, "body": '{"data": [{"id": "m1"}]}'}]))
+        with patch.object(instagram_api, '_make_request', return_value=response) as request:
+            result = instagram_api.get_hashtag_media('sun set', limit=5)
+        assert result == {"data": [{"id": "m1"}]}
+        batch = request.call_args.kwargs['json']['batch']
+        assert request.call_count == 1
+        assert batch[0] == {"method": "GET", "relative_url": "ig_hashtag_search?user_id=me&q=sun+set", "name": "first"}
+        assert batch[1]['relative_url'].startswith('{result=first:$.data.0.id}/recent_media?')
+    
+    def test_hashtag_search_error_reported(self, instagram_api):
+        """Test a failed search surfaces its own error rather than the dependent one."""
+        response = Mock(json=Mock(return_value=[
+            {"code": 400, "body": '{"error": {"message": "Invalid hashtag"}}'}, None]))
+        with patch.object(instagram_api, '_make_request', return_value=response):
+            assert instagram_api.get_hashtag_media('bad') == {"error": "Invalid hashtag"}
+
+
+class TestHttpTransport:
+    """Unit tests for the shared HTTP transport."""
+    
+    @pytest.fixture
+    def keepalive_server(self):
+        """Local HTTP/1.1 server that keeps connections open."""
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_GET(self):
+                body = b'{"ok": true}'
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+        server.shutdown()
+        server.server_close()
+    
+    def test_sessions_share_pooled_connections(self, keepalive_server):
+        """Test a connection opened by one session is reused by another."""
+        import requests
+        from http_transport import mount_shared_pools, pool_stats
+        before = pool_stats().get('127.0.0.1', {"requests": 0, "hits": 0, "misses": 0})
+        first = mount_shared_pools(requests.Session())
+        second = mount_shared_pools(requests.Session())
+        for session in (first, second, first):
+            assert session.get(f"{keepalive_server}/ping").json() == {"ok": True}
+        after = pool_stats()['127.0.0.1']
+        assert after['requests'] - before['requests'] == 3
+        assert after['misses'] - before['misses'] == 1
+        assert after['hits'] - before['hits'] == 2
+    
+    def test_host_pool_overrides(self, monkeypatch):
+        """Test HTTP_POOL_HOSTS overrides and extends the default pool sizes."""
+        from http_transport import host_pool_sizes
+        monkeypatch.setenv('HTTP_POOL_HOSTS', 'graph.facebook.com=64, example.com=4, bad=x')
+        sizes = host_pool_sizes()
+        assert sizes['graph.facebook.com'] == 64
+        assert sizes['example.com'] == 4
+        assert 'bad' not in sizes
+    
+    def test_http2_opt_in(self, monkeypatch):
+        """Test HTTP/2 stays off unless requested."""
+        from http_transport import async_client_kwargs
+        monkeypatch.delenv('HTTP2', raising=False)
+        assert async_client_kwargs()['http2'] is False
+    
+    def test_token_exchange_uses_plain_session(self):
+        """Test OAuth code exchange goes through the shared pools without JSON headers."""
+        from apis.spotify.spotify_api import SpotifyAPI
+        from http_transport import plain_session
+        with patch('apis.spotify.spotify_api.SpotifyAPI._load_credentials', return_value=create_mock_credentials('spotify')):
+            api = SpotifyAPI()
+        response = Mock(json=Mock(return_value={"access_token": "a", "refresh_token": "r", "expires_in": 3600}))
+        with patch('base_api.plain_session') as session, patch.object(api, '_save_tokens'):
+            session.return_value.post.return_value = response
+            assert api.handle_callback('code') is True
+        assert session.return_value.post.call_args.kwargs['data']['code'] == 'code'
+        assert 'Content-Type' not in plain_session().headers
+
+
+class TestTokenRefresh:
+    """Unit tests for single-flight and proactive token refresh."""
+    
+    @pytest.fixture
+    def spotify_api(self):
+        """Create a Spotify API instance whose token is inside the refresh window."""
+        import time
+        from apis.spotify.spotify_api import SpotifyAPI
+        with patch('apis.spotify.spotify_api.SpotifyAPI._load_credentials', return_value=create_mock_credentials('spotify')):
+            api = SpotifyAPI()
+        api._tokens = {'access_token': 'old', 'refresh_token': 'r', 'expires_at': time.time() + 60}
+        return api
+    
+    @staticmethod
+    def _fake_refresh(api, delay=0.0, succeed=True):
+        import time
+        
+        def refresh():
+            time.sleep(delay)
+            if succeed:
+                api._tokens.update({'access_token': 'new', 'expires_at': time.time() + 3600})
+            return succeed
+        return Mock(side_effect=refresh)
+    
+    def test_concurrent_callers_share_one_refresh(self, spotify_api):
+        """Test concurrent threads trigger a single refresh and all see the new token."""
+        from concurrent.futures import ThreadPoolExecutor
+        refresh = self._fake_refresh(spotify_api, delay=0.1)
+        with patch.object(spotify_api, '_refresh_token', refresh):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                tokens = list(pool.map(lambda _: spotify_api.get_access_token(), range(8)))
+        assert refresh.call_count == 1
+        assert tokens == ['new'] * 8
+    
+    def test_failed_refresh_not_retried_by_waiters(self, spotify_api):
+        """Test a failed refresh is not repeated by every following caller."""
+        refresh = self._fake_refresh(spotify_api, succeed=False)
+        with patch.object(spotify_api, '_refresh_token', refresh):
+            assert [spotify_api.get_access_token() for _ in range(5)] == [None] * 5
+        assert refresh.call_count == 1
+    
+    def test_stale_401_reuses_newer_token(self, spotify_api):
+        """Test a 401 for a token another thread already replaced does not refresh again."""
+        spotify_api._tokens['access_token'] = 'new'
+        refresh = self._fake_refresh(spotify_api)
+        with patch.object(spotify_api, '_refresh_token', refresh):
+            assert spotify_api._refresh_single_flight('old') is True
+        refresh.assert_not_called()
+    
+    def test_proactive_refresher_renews_ahead_of_window(self, spotify_api):
+        """Test the background refresher renews only tokens inside its lead window."""
+        import time
+        from token_refresh import ProactiveRefresher
+        refresher = ProactiveRefresher(lead=600, interval=3600)
+        refresher._watched.add(spotify_api)
+        spotify_api._tokens['expires_at'] = time.time() + 500
+        refresh = self._fake_refresh(spotify_api)
+        with patch.object(spotify_api, '_refresh_token', refresh):
+            assert refresher.refresh_due() == 1
+            assert refresher.refresh_due() == 0
+        assert refresh.call_count == 1
+        assert not spotify_api._token_expiring()
+
+
+class TestTokenStore:
+    """Unit tests for debounced, atomic token persistence."""
+    
+    def test_saves_are_debounced(self, tmp_path):
+        """Test saves within the debounce window produce one write of the latest tokens."""
+        import time
+        from token_store import FileTokenStore
+        store = FileTokenStore(tmp_path / 'svc_tokens.json', debounce=0.05)
+        with patch.object(store, '_write', wraps=store._write) as write:
+            for i in range(5):
+                store.save({'access_token': f'token-{i}'})
+            time.sleep(0.2)
+        assert write.call_count == 1
+        assert store.load() == {'access_token': 'token-4'}
+    
+    def test_crash_mid_write_keeps_previous_file(self, tmp_path):
+        """Test a failed write leaves the last good tokens in place."""
+        from token_store import FileTokenStore
+        path = tmp_path / 'svc_tokens.json'
+        store = FileTokenStore(path)
+        store.save({'access_token': 'good'})
+        store.flush()
+        with patch('token_store.json.dump', side_effect=OSError('disk full')):
+            store.save({'access_token': 'bad'})
+            store.flush()
+        assert FileTokenStore(path).load() == {'access_token': 'good'}
+        assert not [p for p in tmp_path.iterdir() if p.suffix == '.tmp']
+    
+    def test_load_if_changed_sees_other_writers(self, tmp_path):
+        """Test a store picks up tokens written by another process's store."""
+        from token_store import FileTokenStore
+        path = tmp_path / 'svc_tokens.json'
+        mine, theirs = FileTokenStore(path), FileTokenStore(path)
+        mine.save({'access_token': 'a'})
+        mine.flush()
+        assert mine.load_if_changed() is None
+        theirs.save({'access_token': 'b'})
+        theirs.flush()
+        assert mine.load_if_changed() == {'access_token': 'b'}
+        assert mine.load_if_changed() is None
+    
+    def test_tokens_saved_by_one_worker_are_used_by_another(self, tmp_path):
+        """Test an OAuth callback or logout handled by one instance reaches another sharing the store."""
+        import time
+        from apis.spotify.spotify_api import SpotifyAPI
+        with patch('apis.spotify.spotify_api.SpotifyAPI._load_credentials', return_value=create_mock_credentials('spotify')), \
+             patch('base_api.BaseAPI._get_tokens_file_path', return_value=tmp_path / 'spotify_tokens.json'):
+            first, second = SpotifyAPI(), SpotifyAPI()
+        assert not second.is_authenticated()
+        first._tokens = {'access_token': 'shared', 'refresh_token': 'r', 'expires_at': time.time() + 3600}
+        first._save_tokens()
+        first.token_store.flush()
+        assert second.is_authenticated()
+        assert second._get_headers()['Authorization'] == 'Bearer shared'
+        first._tokens = {}
+        first._save_tokens()
+        first.token_store.flush()
+        assert not second.is_authenticated()
+    
+    def test_sqlite_backend(self, tmp_path):
+        """Test the SQLite backend keeps services apart and tracks changes."""
+        from token_store import SqliteTokenStore
+        path = str(tmp_path / 'tokens.sqlite')
+        spotify, google = SqliteTokenStore('spotify', path), SqliteTokenStore('google', path)
+        assert spotify.load() == {}
+        spotify.save({'access_token': 's'})
+        spotify.flush()
+        assert google.load() == {}
+        assert SqliteTokenStore('spotify', path).load() == {'access_token': 's'}
+        assert spotify.load_if_changed() is None
+    
+    def test_refresh_adopts_token_from_other_worker(self, tmp_path):
+        """Test single-flight refresh reuses a token another worker already stored."""
+        import time
+        from apis.spotify.spotify_api import SpotifyAPI
+        from token_store import FileTokenStore
+        with patch('apis.spotify.spotify_api.SpotifyAPI._load_credentials', return_value=create_mock_credentials('spotify')):
+            api = SpotifyAPI()
+        path = tmp_path / 'spotify_tokens.json'
+        api.token_store = FileTokenStore(path)
+        api._tokens = {'access_token': 'old', 'refresh_token': 'r', 'expires_at': time.time() + 60}
+        other = FileTokenStore(path)
+        other.save({'access_token': 'fresh', 'refresh_token': 'r', 'expires_at': time.time() + 3600})
+        other.flush()
+        with patch.object(api, '_refresh_token') as refresh:
+            assert api.get_access_token() == 'fresh'
+        refresh.assert_not_called()
+    
+    def test_backend_missing_a_method_fails_at_construction(self):
+        """Test TokenStore is abstract, so an incomplete backend can't be instantiated."""
+        from token_store import TokenStore
+        
+        class ReadOnlyStore(TokenStore):
+            def _read(self):
+                return {}, None
+        
+        with pytest.raises(TypeError):
+            ReadOnlyStore()
+
+
+class TestStatusSnapshot:
+    """Unit tests for the cached service status snapshot."""
+    
+    @staticmethod
+    def _service(authenticated=True, error=None):
+        service = Mock()
+        if error:
+            service.get_status.side_effect = error
+        else:
+            service.get_status.return_value = {"authenticated": authenticated, "status": "ready"}
+        return service
+    
+    def test_reads_do_not_call_services(self):
+        """Test reading the snapshot never calls get_status."""
+        from status_snapshot import StatusSnapshot
+        spotify = self._service()
+        snapshot = StatusSnapshot({'spotify': spotify})
+        snapshot.refresh()
+        for _ in range(100):
+            result = snapshot.get()
+        assert spotify.get_status.call_count == 1
+        assert result['healthy'] is True
+        assert result['stale'] is False
+    
+    def test_pending_before_first_refresh(self):
+        """Test services report pending, and the snapshot is stale, before the first poll."""
+        from status_snapshot import StatusSnapshot
+        snapshot = StatusSnapshot({'spotify': self._service()})
+        result = snapshot.get()
+        assert result['services']['spotify']['status'] == 'pending'
+        assert result['stale'] is True
+        assert result['healthy'] is False
+    
+    def test_failing_service_reported_not_raised(self):
+        """Test a service whose status raises is reported as an error."""
+        from status_snapshot import StatusSnapshot
+        snapshot = StatusSnapshot({'ok': self._service(), 'broken': self._service(error=RuntimeError('selenium gone'))})
+        snapshot.refresh()
+        result = snapshot.get()
+        assert result['services']['broken'] == {"authenticated": False, "status": "error", "error": "selenium gone"}
+        assert result['authenticated_services'] == 1
+        assert result['healthy'] is False
+    
+    def test_stale_snapshot_served_and_refresh_requested(self):
+        """Test an old snapshot is still served, flagged stale, and wakes the refresher."""
+        import time
+        from status_snapshot import StatusSnapshot
+        snapshot = StatusSnapshot({'spotify': self._service()}, max_age=5)
+        snapshot.refresh()
+        snapshot._snapshot['taken_at'] = time.time() - 60
+        result = snapshot.get()
+        assert result['stale'] is True
+        assert result['services']['spotify']['authenticated'] is True
+        assert snapshot._wake.is_set()
+
+
+class TestServiceWarmUp:
+    """Unit tests for background service warm-up and readiness."""
+    
+    @staticmethod
+    def _slow_service(delay=0.3, error=None):
+        import time
+        
+        class Service:
+            def warm_up(self):
+                time.sleep(delay)
+                if error:
+                    raise error
+        return Service()
+    
+    @staticmethod
+    def _wait(registry, names, timeout=2.0):
+        import time
+        deadline = time.time() + timeout
+        while time.time() < deadline and any(registry.state(n)['state'] in ('constructing', 'restoring') for n in names):
+            time.sleep(0.01)
+    
+    def test_warm_ups_run_in_parallel(self):
+        """Test slow warm-ups overlap instead of adding up."""
+        import time
+        from service_registry import ServiceRegistry
+        registry = ServiceRegistry()
+        for name in ('spotify', 'google', 'facebook'):
+            registry.add(name, self._slow_service())
+        started = time.perf_counter()
+        registry.start()
+        assert time.perf_counter() - started < 0.1
+        self._wait(registry, ('spotify', 'google', 'facebook'))
+        assert time.perf_counter() - started < 0.8
+        assert all(registry.is_ready(name) for name in ('spotify', 'google', 'facebook'))
+    
+    def test_routes_answer_503_until_ready(self):
+        """Test a not-ready service's routes return 503 with its readiness state."""
+        from flask import Flask
+        from route_dispatch import compile_endpoint
+        from service_registry import ServiceRegistry
+        registry = ServiceRegistry()
+        registry.add('files', self._slow_service(delay=0.2))
+        registry.add('broken', self._slow_service(delay=0, error=RuntimeError('no chrome')))
+        app = Flask(__name__)
+        for name in ('files', 'broken'):
+            app.add_url_rule(f'/{name}/list', f'{name}_list', compile_endpoint(
+                'files', Mock(), 'list', {"method": "GET", "handler": lambda: {"files": []}}, f'{name}_list',
+                ready_guard=registry.readiness_guard(name)))
+        client = app.test_client()
+        registry.start()
+        response = client.get('/files/list')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert response.get_json()['state'] in ('constructing', 'restoring')
+        self._wait(registry, ('files', 'broken'))
+        assert client.get('/files/list').get_json() == {"files": []}
+        broken = client.get('/broken/list')
+        assert broken.status_code == 503
+        assert broken.get_json()['error'] == 'broken is not ready'
+        assert broken.get_json()['state'] == 'failed'
+        assert broken.get_json()['reason'] == 'no chrome'
+    
+    def test_services_without_warm_up_are_ready(self):
+        """Test services with nothing to warm up are ready immediately."""
+        from service_registry import ServiceRegistry
+        registry = ServiceRegistry()
+        registry.add('plain', object())
+        assert registry.is_ready('plain')
+        assert registry.readiness_guard('plain')() is None
+    
+    def test_deferred_construction_skips_restore(self):
+        """Test services built under deferred_warm_up leave token restore to warm_up()."""
+        from apis.spotify.spotify_api import SpotifyAPI
+        from service_registry import deferred_warm_up
+        with patch('apis.spotify.spotify_api.SpotifyAPI._load_credentials', return_value=create_mock_credentials('spotify')), \
+             patch('base_api.BaseAPI._try_restore_authentication') as restore:
+            with deferred_warm_up():
+                api = SpotifyAPI()
+            restore.assert_not_called()
+            with patch('base_api.watch_token'):
+                api.warm_up()
+            restore.assert_called_once()
+
+
+class TestServiceLifecycle:
+    """Unit tests for the per-service lifecycle state machine."""
+    
+    def test_progress_reported_while_restoring(self):
+        """Test warm-up progress is visible while the service is restoring."""
+        import threading
+        import time
+        from service_registry import ServiceRegistry, report_progress
+        release = threading.Event()
+        
+        class Service:
+            def warm_up(self):
+                report_progress("starting browser")
+                release.wait(2)
+        
+        registry = ServiceRegistry()
+        registry.add('whatsapp_personal', Service())
+        assert registry.state('whatsapp_personal')['state'] == 'constructing'
+        registry.start()
+        deadline = time.time() + 2
+        while registry.state('whatsapp_personal').get('progress') is None and time.time() < deadline:
+            time.sleep(0.01)
+        assert registry.state('whatsapp_personal') == {"state": "restoring", "progress": "starting browser"}
+        assert registry.overall() == 'starting'
+        release.set()
+    
+    def test_report_progress_outside_warm_up_is_noop(self):
+        """Test progress reports from request threads are ignored."""
+        from service_registry import report_progress
+        report_progress("refreshing token")
+    
+    def test_unauthenticated_service_is_degraded_but_serving(self):
+        """Test a warmed-up but unauthenticated service is degraded and still routable."""
+        from service_registry import ServiceRegistry
+        registry = ServiceRegistry()
+        service = Mock(spec=['warm_up', 'is_authenticated'])
+        service.is_authenticated.return_value = False
+        registry.add('spotify', service)
+        registry._warm_up('spotify', service)
+        assert registry.state('spotify')['state'] == 'degraded'
+        assert registry.is_ready('spotify')
+        assert registry.readiness_guard('spotify')() is None
+        assert registry.overall() == 'degraded'
+    
+    def test_snapshot_moves_between_ready_and_degraded(self):
+        """Test status snapshots update serving services but not warming ones."""
+        from service_registry import ServiceRegistry
+        from status_snapshot import StatusSnapshot
+        registry = ServiceRegistry()
+        spotify = Mock(spec=['get_status'])
+        spotify.get_status.return_value = {"authenticated": False}
+        registry.add('spotify', spotify)
+        whatsapp = Mock(spec=['warm_up', 'get_status'])
+        registry.add('whatsapp_personal', whatsapp)
+        snapshot = StatusSnapshot({'spotify': spotify, 'whatsapp_personal': whatsapp}, registry=registry)
+        snapshot.refresh()
+        assert registry.state('spotify')['state'] == 'degraded'
+        assert registry.state('whatsapp_personal')['state'] == 'constructing'
+        whatsapp.get_status.assert_not_called()
+        spotify.get_status.return_value = {"authenticated": True}
+        snapshot.refresh()
+        assert registry.state('spotify')['state'] == 'ready'
+    
+    def test_shutdown_hooks_run_once_newest_first(self):
+        """Test shutdown runs every hook once in reverse order, past a failing one."""
+        from service_registry import ServiceRegistry
+        registry = ServiceRegistry()
+        calls = []
+        registry.on_shutdown(lambda: calls.append('client'))
+        registry.on_shutdown(Mock(side_effect=RuntimeError("boom")))
+        registry.on_shutdown(lambda: calls.append('pool'))
+        registry.shutdown()
+        registry.shutdown()
+        assert calls == ['pool', 'client']
+
+
+class TestMetrics:
+    """Unit tests for the Prometheus-style metrics."""
+    
+    def test_counter_merges_thread_shards(self):
+        """Test increments from many threads add up at scrape time."""
+        import threading
+        from metrics import Counter
+        with patch('metrics._metrics', []):
+            counter = Counter('test_events_total', 'Test events', ('kind',))
+        
+        def work():
+            for _ in range(1000):
+                counter.inc('a')
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc('b', amount=2)
+        assert counter.value('a') == 4000
+        assert counter.value('b') == 2
+        assert counter.render()[2:] == ['test_events_total{kind="a"} 4000', 'test_events_total{kind="b"} 2']
+    
+    def test_histogram_renders_cumulative_buckets(self):
+        """Test histogram samples follow the text exposition format."""
+        from metrics import Histogram
+        with patch('metrics._metrics', []):
+            histogram = Histogram('test_seconds', 'Test latency', ('route',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 3):
+            histogram.observe(value, '/x')
+        assert histogram.render() == [
+            '# HELP test_seconds Test latency',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{route="/x",le="0.1"} 1',
+            'test_seconds_bucket{route="/x",le="1"} 2',
+            'test_seconds_bucket{route="/x",le="+Inf"} 3',
+            'test_seconds_sum{route="/x"} 3.550000',
+            'test_seconds_count{route="/x"} 3',
+        ]
+    
+    def test_render_includes_collectors(self):
+        """Test collector families are rendered and a failing collector is skipped."""
+        from metrics import render
+        
+        def broken():
+            raise RuntimeError("boom")
+            yield
+        
+        def gauge():
+            yield ('test_ratio', 'gauge', 'Test ratio', [({"host": 'a"b'}, 0.5)])
+        with patch('metrics._metrics', []), patch('metrics._collectors', [broken, gauge]):
+            assert render() == '# HELP test_ratio Test ratio\n# TYPE test_ratio gauge\ntest_ratio{host="a\\"b"} 0.5\n'
+    
+    def test_dispatcher_times_route(self):
+        """Test compiled routes record latency under their route path and status."""
+        from flask import Flask
+        from metrics import ROUTE_SECONDS
+        from route_dispatch import compile_endpoint
+        files_service = Mock()
+        files_service.get_file_stats.return_value = {"error": "disk gone"}
+        app = Flask(__name__)
+        config = {"method": "GET", "handler": files_service.get_file_stats}
+        app.add_url_rule('/files/stats', 'files_stats_get',
+                         compile_endpoint('files', files_service, 'stats', config, 'files_stats_get',
+                                          route_path='/files/stats'))
+        before = ROUTE_SECONDS.count('/files/stats', 'GET', '500')
+        assert app.test_client().get('/files/stats').status_code == 500
+        assert ROUTE_SECONDS.count('/files/stats', 'GET', '500') == before + 1
+    
+    def test_upstream_attempts_and_retries_are_counted(self):
+        """Test each upstream attempt is timed and a 429 counts as a retry."""
+        import time
+        from apis.spotify.spotify_api import SpotifyAPI
+        from metrics import UPSTREAM_RETRIES, UPSTREAM_SECONDS
+        with patch('apis.spotify.spotify_api.SpotifyAPI._load_credentials', return_value=create_mock_credentials('spotify')):
+            api = SpotifyAPI()
+        api._tokens = {'access_token': 'token', 'expires_at': time.time() + 3600}
+        throttled = Mock(status_code=429, headers={'Retry-After': '0'})
+        ok = Mock(status_code=200, headers={})
+        api.session.request = Mock(side_effect=[throttled, ok])
+        retries = UPSTREAM_RETRIES.value('spotify', '429')
+        attempts = UPSTREAM_SECONDS.count('spotify', 'POST', '200')
+        with patch('base_api.time.sleep'):
+            assert api._make_request('POST', '/me/player/next') is ok
+        assert UPSTREAM_RETRIES.value('spotify', '429') == retries + 1
+        assert UPSTREAM_SECONDS.count('spotify', 'POST', '200') == attempts + 1
+    
+    def test_token_refresh_outcomes_are_counted(self):
+        """Test a refresh already done by another caller counts as shared."""
+        import time
+        from apis.spotify.spotify_api import SpotifyAPI
+        from metrics import TOKEN_REFRESHES
+        with patch('apis.spotify.spotify_api.SpotifyAPI._load_credentials', return_value=create_mock_credentials('spotify')):
+            api = SpotifyAPI()
+        api._tokens = {'access_token': 'new', 'refresh_token': 'r', 'expires_at': time.time() + 3600}
+        shared = TOKEN_REFRESHES.value('spotify', '401', 'shared')
+        assert api._refresh_single_flight('old', trigger='401') is True
+        assert TOKEN_REFRESHES.value('spotify', '401', 'shared') == shared + 1
+    
+    def test_metric_subclass_must_render_samples(self):
+        """Test a metric type without _render_samples cannot be instantiated."""
+        from metrics import _Metric
+        
+        class Gauge(_Metric):
+            def _new_cells(self):
+                return [0.0]
+        with patch('metrics._metrics', []):
+            with pytest.raises(TypeError):
+                Gauge('test_gauge', 'Test gauge')
+    
+    def test_multiprocess_render_merges_worker_files(self, tmp_path):
+        """Test counters are summed across worker files and only live workers report collector samples."""
+        import json
+        import os
+        from metrics import Counter, render
+        with patch('metrics._metrics', []):
+            counter = Counter('test_events_total', 'Test events', ('kind',))
+        counter.inc('a', amount=2)
+        
+        def gauge():
+            yield ('test_ratio', 'gauge', 'Test ratio', [({}, 0.5)])
+        exited = {"pid": 999999999,
+                  "metrics": {"test_events_total": [[["a"], [3.0]], [["b"], [1.0]]]},
+                  "families": [["test_ratio", "gauge", "Test ratio", [[{}, 0.25]]]]}
+        (tmp_path / 'metrics_999999999.json').write_text(json.dumps(exited))
+        with patch('metrics.MULTIPROC_DIR', str(tmp_path)), \
+             patch('metrics._metrics', [counter]), patch('metrics._collectors', [gauge]):
+            text = render()
+        assert (tmp_path / f'metrics_{os.getpid()}.json').exists()
+        assert 'test_events_total{kind="a"} 5\ntest_events_total{kind="b"} 1\n' in text
+        assert f'test_ratio{{pid="{os.getpid()}"}} 0.5\n' in text
+        assert '0.25' not in text
+
+
+class TestFilesSearchIndex:
+    """Unit tests for the Files search index."""
+    
+    @pytest.fixture
+    def files_api(self, tmp_path):
+        """Create a Files API over a temporary directory with a few files."""
+        from apis.files.files_api import FilesAPI
+        base = tmp_path / 'data'
+        base.mkdir()
+        (base / 'mars.txt').write_text("Space exploration\nMars colonies by 2040\nmars rovers")
+        (base / 'solar.txt').write_text("Solar panels\nEnergy storage")
+        (base / 'notes.md').write_text("Mars in markdown")
+        return FilesAPI(str(base), index_path=str(tmp_path / 'index.sqlite'))
+    
+    def _names(self, result):
+        return sorted(r['name'] for r in result['results'])
+    
+    def test_search_matches_substrings_like_the_scan(self, files_api):
+        """Test word, partial word and multi-word queries match as substrings, case-insensitively."""
+        result = files_api.search_files('MARS')
+        assert self._names(result) == ['mars.txt']
+        assert [line['line_number'] for line in result['results'][0]['matching_lines']] == [2, 3]
+        assert self._names(files_api.search_files('xplor')) == ['mars.txt']
+        assert self._names(files_api.search_files('ar pan')) == ['solar.txt']
+        assert self._names(files_api.search_files('exploration mars')) == []
+        assert self._names(files_api.search_files('2040')) == ['mars.txt']
+        assert self._names(files_api.search_files('!!')) == []
+    
+    def test_writes_update_the_index(self, files_api):
+        """Test create, update and delete keep search results current."""
+        files_api.search_files('energy')
+        files_api.create_file('wind.txt', "Wind energy")
+        assert self._names(files_api.search_files('energy')) == ['solar.txt', 'wind.txt']
+        files_api.update_file('solar.txt', "Photovoltaics")
+        assert self._names(files_api.search_files('energy')) == ['wind.txt']
+        assert self._names(files_api.search_files('photo')) == ['solar.txt']
+        files_api.delete_file('wind.txt')
+        assert self._names(files_api.search_files('energy')) == []
+        assert 'energy' not in files_api.search_index._postings
+    
+    def test_restart_reindexes_only_changed_files(self, files_api, tmp_path):
+        """Test a new index reuses stored terms and re-reads files changed on disk."""
+        import os
+        from apis.files.files_api import FilesAPI
+        files_api.search_files('mars')
+        # Only the restarted instance should see these edits
+        files_api.catalog.stop()
+        changed = files_api.base_path / 'solar.txt'
+        changed.write_text("Hydrogen fuel cells")
+        os.utime(changed, ns=(changed.stat().st_atime_ns, changed.stat().st_mtime_ns + 10**9))
+        (files_api.base_path / 'mars.txt').unlink()
+        
+        restarted = FilesAPI(str(files_api.base_path), index_path=str(tmp_path / 'index.sqlite'))
+        with patch.object(restarted.search_index, '_read_document', wraps=restarted.search_index._read_document) as read:
+            assert self._names(restarted.search_files('hydrogen')) == ['solar.txt']
+        assert [call.args[0].name for call in read.call_args_list] == ['solar.txt']
+        assert self._names(restarted.search_files('mars')) == []
+    
+    def test_outside_edit_is_indexed_by_one_worker(self, files_api, tmp_path):
+        """Test a second worker reuses the stored row for an edit another worker already indexed."""
+        from apis.files.files_api import FilesAPI
+        other = FilesAPI(str(files_api.base_path), index_path=str(tmp_path / 'index.sqlite'))
+        files_api.search_files('mars')
+        other.search_files('mars')
+        # Deliver the edit to each worker's catalog by hand
+        files_api.catalog.stop()
+        other.catalog.stop()
+        (files_api.base_path / 'comet.txt').write_text("Halley returns")
+        files_api.catalog.rescan()
+        with patch.object(other.search_index, '_read_document') as read, \
+             patch.object(other.search_index, '_store') as store:
+            other.catalog.rescan()
+        read.assert_not_called()
+        store.assert_not_called()
+        assert self._names(other.search_files('halley')) == ['comet.txt']
+    
+    def test_api_writes_always_reindex(self, files_api):
+        """Test a same-size rewrite through the API is re-read even if the mtime did not move."""
+        import os
+        files_api.search_files('solar')
+        path = files_api.base_path / 'solar.txt'
+        stamp = path.stat().st_mtime_ns
+        files_api.update_file('solar.txt', "Lunar panels\nEnergy storage")
+        os.utime(path, ns=(stamp, stamp))
+        files_api.update_file('solar.txt', "Solar panels\nEnergy storage")
+        os.utime(path, ns=(stamp, stamp))
+        files_api.update_file('solar.txt', "Lunar panels\nEnergy storage")
+        assert self._names(files_api.search_files('lunar')) == ['solar.txt']
+    
+    def test_parse_query_clauses(self):
+        """Test ranked queries split into term, prefix and phrase clauses."""
+        from apis.files.search_index import parse_query
+        assert parse_query('Solar "wind  Energy" stor* mars-colony') == [
+            ('term', ['solar']), ('phrase', ['wind', 'energy']), ('prefix', ['stor']), ('phrase', ['mars', 'colony'])]
+    
+    def test_ranked_search_scores_phrases_and_prefixes(self, files_api):
+        """Test BM25 ranks denser matches first and phrases need adjacent words."""
+        files_api.create_file('rovers.txt', "Mars rovers\nmars rovers on mars")
+        result = files_api.ranked_search('mars')
+        assert [r['name'] for r in result['results']] == ['rovers.txt', 'mars.txt']
+        assert result['results'][0]['score'] > result['results'][1]['score']
+        assert [line['line_number'] for line in result['results'][1]['matching_lines']] == [2, 3]
+        assert [r['name'] for r in files_api.ranked_search('"mars colonies"')['results']] == ['mars.txt']
+        assert files_api.ranked_search('"colonies mars"')['total_matches'] == 0
+        assert sorted(r['name'] for r in files_api.ranked_search('stor* explor*')['results']) == ['mars.txt', 'solar.txt']
+    
+    def test_ranked_search_pages_with_a_heap(self, files_api):
+        """Test offset/limit pages through results without sorting every match."""
+        import heapq
+        for i in range(5):
+            files_api.create_file(f'log{i}.txt', "energy " * (i + 1))
+        first = files_api.ranked_search('energy', offset=0, limit=2)
+        second = files_api.ranked_search('energy', offset=2, limit=2)
+        assert first['total_matches'] == second['total_matches'] == 6
+        names = [r['name'] for r in first['results'] + second['results']]
+        assert len(names) == len(set(names)) == 4
+        with patch('apis.files.search_index.heapq.nlargest', wraps=heapq.nlargest) as nlargest:
+            files_api.ranked_search('energy', offset=2, limit=2)
+        assert nlargest.call_args.args[0] == 4
+
+
+class TestParallelScan:
+    """Unit tests for the parallel mmap scan."""
+    
+    @pytest.fixture
+    def corpus(self, tmp_path):
+        """Write files with known matching lines; return (paths, expected)."""
+        expected = {}
+        for n in range(6):
+            lines = [f"line {i} of doc {n}" + (" NEEDLE here" if i % (n + 3) == 0 else "") for i in range(1, 400)]
+            path = tmp_path / f"doc{n}.txt"
+            path.write_text('\n'.join(lines))
+            expected[path] = [(i, line) for i, line in enumerate(lines, 1) if 'needle' in line.lower()]
+        (tmp_path / 'empty.txt').write_text('')
+        return sorted(tmp_path.iterdir()), expected
+    
+    def test_chunked_scan_numbers_lines_like_a_decoded_scan(self, corpus):
+        """Test files split into many byte ranges report the same lines as splitting the text."""
+        from apis.files import parallel_scan
+        paths, expected = corpus
+        with patch.object(parallel_scan, 'SCAN_CHUNK_BYTES', 1000):
+            assert len(parallel_scan._chunks(paths[0], paths[0].stat().st_size)) > 5
+            found = dict(parallel_scan.scan_files(paths, b'needle'))
+        assert found == expected
+    
+    def test_process_pool_scan_stops_at_limit(self, corpus):
+        """Test the pooled scan matches the inline one and stops after ``limit`` files."""
+        from apis.files import parallel_scan
+        paths, expected = corpus
+        with patch.object(parallel_scan, 'PARALLEL_MIN_BYTES', 0), \
+             patch.object(parallel_scan, 'SCAN_WORKERS', 2), \
+             patch.object(parallel_scan, 'SCAN_CHUNK_BYTES', 4096):
+            assert dict(parallel_scan.scan_files(paths, b'needle')) == expected
+            assert len(list(parallel_scan.scan_files(paths, b'needle', limit=2))) == 2
+    
+    def test_broken_pool_is_replaced(self, tmp_path):
+        """Test a scan after a pool worker died runs on a new pool."""
+        import os
+        from concurrent.futures.process import BrokenProcessPool
+        from apis.files import parallel_scan
+        path = tmp_path / 'a.txt'
+        path.write_text('needle\n')
+        broken = parallel_scan._get_executor()
+        with pytest.raises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+        with patch.object(parallel_scan, 'PARALLEL_MIN_BYTES', 0), \
+             patch.object(parallel_scan, 'SCAN_WORKERS', 2):
+            assert dict(parallel_scan.scan_files([path], b'needle')) == {path: [(1, 'needle')]}
+        assert parallel_scan._executor is not broken
+    
+    def test_files_scan_mode_bypasses_the_index(self, tmp_path):
+        """Test scan mode finds what substring mode finds without consulting the index."""
+        from apis.files.files_api import FilesAPI
+        base = tmp_path / 'data'
+        base.mkdir()
+        (base / 'a.txt').write_text("Alpha\nbeta gamma")
+        (base / 'b.txt').write_text("Gamma ray")
+        api = FilesAPI(str(base), index_path=str(tmp_path / 'index.sqlite'))
+        with patch.object(api.search_index, 'candidates') as candidates:
+            scanned = api.search_files('gamma', mode='scan')
+        candidates.assert_not_called()
+        assert scanned['results'] == api.search_files('gamma')['results']
+        assert api.search_files('gamma', limit=1, mode='scan')['total_matches'] == 1
+
+
+class TestFilesPatternSearch:
+    """Unit tests for regex and glob search modes."""
+    
+    @pytest.fixture
+    def files_api(self, tmp_path):
+        """FilesAPI over a small mixed-extension directory."""
+        from apis.files.files_api import FilesAPI
+        base = tmp_path / 'data'
+        base.mkdir()
+        (base / 'app.txt').write_text("ERROR disk full\nwarning: retry 3\nerror: timeout after 30s")
+        (base / 'notes.md').write_text("# Errors\nerror budget is 1%")
+        (base / 'data.csv').write_text("id,error\n1,none")
+        return FilesAPI(str(base), index_path=str(tmp_path / 'index.sqlite'))
+    
+    @staticmethod
+    def _lines(result):
+        return {(r['name'], line['line_number']) for r in result['results'] for line in r['matching_lines']}
+    
+    def test_regex_mode_matches_lines(self, files_api):
+        """Test regex queries are case-insensitive and anchor at line boundaries."""
+        assert self._lines(files_api.search_files(r'^error\b', mode='regex')) == {('app.txt', 1), ('app.txt', 3)}
+        assert self._lines(files_api.search_files(r'\d+s$', mode='regex')) == {('app.txt', 3)}
+    
+    def test_glob_mode_and_extensions(self, files_api):
+        """Test glob wildcards stay within a line and extensions widen the file set."""
+        assert self._lines(files_api.search_files('err*30?', mode='glob')) == {('app.txt', 3)}
+        assert self._lines(files_api.search_files('error*full*timeout', mode='glob')) == set()
+        found = files_api.search_files('error', extensions=['md', '.csv'])
+        assert self._lines(found) == {('notes.md', 1), ('notes.md', 2), ('data.csv', 1)}
+        assert self._lines(files_api.search_files('[uvw]arning: retry ?', mode='glob')) == {('app.txt', 2)}
+        assert self._lines(files_api.search_files('[!w]arning', mode='glob')) == set()
+    
+    def test_invalid_regex_is_an_error(self, files_api):
+        """Test a pattern that does not compile returns an error instead of raising."""
+        result = files_api.search_files('(unclosed', mode='regex')
+        assert result['success'] is False
+        assert 'Invalid search pattern' in result['error']
+    
+    def test_invalid_pattern_route_returns_400(self, files_api):
+        """Test a bad regex or glob, or ranked mode with stream/extensions, is a 400 before any output."""
+        from flask import Flask
+        from apis.files.files_base_api import FilesBaseAPI
+        from route_dispatch import compile_endpoint
+        with patch('apis.files.files_base_api.FilesAPI', return_value=files_api):
+            service = FilesBaseAPI()
+        app = Flask(__name__)
+        app.add_url_rule('/files/search', 'files_search_get',
+                         compile_endpoint('files', service, 'search', service.get_endpoints()['search'],
+                                          'files_search_get'))
+        client = app.test_client()
+        for query in ('query=(unclosed&mode=regex', 'query=(unclosed&mode=regex&stream=true',
+                      'query=[z-a]&mode=glob&stream=true'):
+            response = client.get(f'/files/search?{query}')
+            assert response.status_code == 400
+            assert response.get_json()['error'].startswith('Invalid search pattern')
+        assert client.get('/files/search?query=disk&mode=regex&stream=true').status_code == 200
+        for query in ('query=disk&mode=ranked&stream=true', 'query=disk&mode=ranked&extensions=.md'):
+            response = client.get(f'/files/search?{query}')
+            assert response.status_code == 400
+            assert 'mode=ranked' in response.get_json()['error']
+        assert client.get('/files/search?query=disk&mode=ranked').status_code == 200
+    
+    def test_patterns_are_compiled_once(self, files_api):
+        """Test repeated queries hit the compiled pattern cache."""
+        from apis.files import parallel_scan
+        parallel_scan.compile_pattern.cache_clear()
+        files_api.search_files('warn.*retry', mode='regex')
+        files_api.search_files('warn.*retry', mode='regex')
+        info = parallel_scan.compile_pattern.cache_info()
+        assert info.misses == 1 and info.hits >= 1
+    
+    def test_catastrophic_pattern_times_out(self, files_api):
+        """Test a runaway regex is interrupted at the time budget and the pool stays usable."""
+        import time
+        from apis.files.parallel_scan import ScanTimeout
+        files_api.create_file('evil.txt', 'a' * 40 + '!')
+        with patch('apis.files.files_api.SEARCH_TIMEOUT', 0.3):
+            start = time.monotonic()
+            result = files_api.search_files('(a+)+b', mode='regex')
+            assert time.monotonic() - start < 5
+            assert result['success'] is True and result['timed_out'] is True
+            assert self._lines(files_api.search_files('disk', mode='regex')) == {('app.txt', 1)}
+        
+        stream = files_api.iter_search_results('(a+)+b', mode='regex')
+        with patch('apis.files.files_api.SEARCH_TIMEOUT', 0.3):
+            with pytest.raises(ScanTimeout):
+                list(stream)
+
+
+class TestFileCatalog:
+    """Unit tests for the in-memory file metadata catalog."""
+    
+    @pytest.fixture
+    def files_api(self, tmp_path):
+        """FilesAPI over a directory with two files."""
+        from apis.files.files_api import FilesAPI
+        base = tmp_path / 'data'
+        base.mkdir()
+        (base / 'a.txt').write_text('alpha')
+        (base / 'b.md').write_text('# beta')
+        api = FilesAPI(str(base), index_path=str(tmp_path / 'index.sqlite'))
+        yield api
+        api.catalog.stop()
+    
+    def test_writes_update_aggregates_without_rescanning(self, files_api):
+        """Test API writes keep listing and stats current with no directory scans."""
+        assert files_api.get_file_stats()['stats']['extensions'] == {'.txt': 1, '.md': 1}
+        with patch('apis.files.file_catalog.os.scandir') as scandir:
+            files_api.create_file('c.txt', 'gamma!')
+            files_api.update_file('a.txt', 'alpha alpha')
+            files_api.delete_file('b.md')
+            stats = files_api.get_file_stats()['stats']
+            listed = files_api.list_files('.txt')['files']
+        scandir.assert_not_called()
+        assert stats['total_files'] == 2
+        assert stats['total_size_bytes'] == len('gamma!') + len('alpha alpha')
+        assert stats['extensions'] == {'.txt': 2}
+        assert {f['name'] for f in listed} == {'a.txt', 'c.txt'}
+        assert files_api.list_files('.md')['files'] == []
+    
+    def test_rescan_picks_up_outside_changes_and_reindexes(self, files_api):
+        """Test a rescan applies changes made outside the API to stats and the search index."""
+        assert files_api.search_files('delta')['total_matches'] == 0
+        (files_api.base_path / 'd.txt').write_text('delta')
+        (files_api.base_path / 'a.txt').unlink()
+        files_api.catalog.rescan()
+        assert files_api.get_file_stats()['stats']['extensions'] == {'.txt': 1, '.md': 1}
+        assert [r['name'] for r in files_api.search_files('delta')['results']] == ['d.txt']
+        assert files_api.search_files('alpha')['total_matches'] == 0
+    
+    def test_watcher_sees_outside_changes(self, files_api):
+        """Test the inotify (or polling) watcher updates the catalog on its own."""
+        import time
+        files_api.catalog.poll_interval = 0.05
+        files_api.list_files()
+        (files_api.base_path / 'e.log').write_text('epsilon')
+        deadline = time.monotonic() + 5
+        while 'e.log' not in files_api.catalog.names() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert files_api.get_file_stats()['stats']['extensions'].get('.log') == 1
+    
+    @staticmethod
+    def _wait_for(condition):
+        import time
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return condition()
+    
+    def test_watcher_polls_after_directory_is_replaced(self, files_api):
+        """Test deleting and recreating the directory switches the watcher to polling, which keeps up."""
+        import shutil
+        catalog = files_api.catalog
+        if catalog.watch_mode != 'inotify':
+            pytest.skip("inotify not available")
+        catalog.poll_interval = 0.05
+        shutil.rmtree(files_api.base_path)
+        assert self._wait_for(lambda: catalog.watch_mode == 'polling')
+        files_api.base_path.mkdir()
+        (files_api.base_path / 'f.txt').write_text('phi')
+        assert self._wait_for(lambda: catalog.names() == ['f.txt'])
+    
+    def test_watcher_polls_after_an_error(self, files_api):
+        """Test a failure while reading events falls back to polling instead of ending the watcher."""
+        catalog = files_api.catalog
+        if catalog.watch_mode != 'inotify':
+            pytest.skip("inotify not available")
+        catalog.poll_interval = 0.05
+        with patch('apis.files.file_catalog._parse_events', side_effect=RuntimeError("boom")):
+            (files_api.base_path / 'g.txt').write_text('gamma')
+            assert self._wait_for(lambda: catalog.watch_mode == 'polling')
+        assert self._wait_for(lambda: 'g.txt' in catalog.names())
+        (files_api.base_path / 'h.txt').write_text('eta')
+        assert self._wait_for(lambda: 'h.txt' in catalog.names())
+        assert catalog._thread.is_alive()
@@ -0,0 +1,132 @@
+"""Single-flight and proactive OAuth token refresh.
+
+``TokenRefreshMixin._refresh_single_flight`` lets one thread per service
+call ``_refresh_token`` while concurrent callers wait on the same lock and
+then reuse its result, instead of each posting to the token URL and rewriting
+the tokens file. A failed refresh is not retried by the waiting threads for
+``REFRESH_FAILURE_BACKOFF`` seconds.
+
+``ProactiveRefresher`` is a daemon thread that renews watched tokens
+``TOKEN_REFRESH_LEAD`` seconds before expiry, ahead of the 5-minute window in
+which ``get_access_token`` would refresh inline, so request threads normally
+never pay refresh latency.
+
+Every call is counted in ``token_refresh_total`` by trigger (``expiry``,
+``401``, ``proactive``) and outcome (``refreshed``, ``failed``, ``shared``
+when another thread or worker already refreshed, ``backoff``).
+"""
+import os
+import threading
+import time
+import weakref
+from typing import Any, Dict, Optional
+
+from metrics import TOKEN_REFRESHES
+
+REFRESH_WINDOW = 300
+REFRESH_FAILURE_BACKOFF = 30
+TOKEN_REFRESH_LEAD = int(os.environ.get('TOKEN_REFRESH_LEAD', 600))
+TOKEN_REFRESH_INTERVAL = int(os.environ.get('TOKEN_REFRESH_INTERVAL', 60))
+
+
+class TokenRefreshMixin:
+    """Adds single-flight refresh to API base classes.
+
+    Expects the host class to provide ``service_name``, ``_tokens`` and
+    ``_refresh_token``, and optionally a ``token_store`` shared with the
+    other worker processes.
+    """
+
+    def _refresh_state(self) -> Dict[str, Any]:
+        # dict.setdefault is atomic, so concurrent first callers share one lock
+        return self.__dict__.setdefault('_refresh_flight', {"lock": threading.Lock(), "failed": None})
+
+    def _sync_tokens(self) -> None:
+        """Adopt tokens another worker saved (OAuth callback, refresh or logout)."""
+        store = getattr(self, 'token_store', None)
+        stored = store.load_if_changed() if store is not None else None
+        if stored is not None:
+            self._tokens = stored
+
+    def _token_expiring(self, within: float = REFRESH_WINDOW) -> bool:
+        """True when the access token expires within ``within`` seconds."""
+        return time.time() >= self._tokens.get('expires_at', 0) - within
+
+    def _refresh_single_flight(self, stale_token: Optional[str] = None, trigger: str = 'expiry') -> bool:
+        """Refresh unless another thread already replaced ``stale_token``."""
+        if stale_token is None:
+            stale_token = self._tokens.get('access_token')
+        state = self._refresh_state()
+        with state["lock"]:
+            current = self._tokens.get('access_token')
+            if current != stale_token:
+                TOKEN_REFRESHES.inc(self.service_name, trigger, 'shared')
+                return bool(current)
+            # Another worker process may already have refreshed it
+            store = getattr(self, 'token_store', None)
+            stored = store.load_if_changed() if store is not None else None
+            if stored and stored.get('access_token') not in (None, stale_token):
+                self._tokens = stored
+                TOKEN_REFRESHES.inc(self.service_name, trigger, 'shared')
+                return True
+            failed = state["failed"]
+            if failed and failed[0] == stale_token and time.time() - failed[1] < REFRESH_FAILURE_BACKOFF:
+                TOKEN_REFRESHES.inc(self.service_name, trigger, 'backoff')
+                return False
+            if self._refresh_token():
+                state["failed"] = None
+                TOKEN_REFRESHES.inc(self.service_name, trigger, 'refreshed')
+                return True
+            state["failed"] = (stale_token, time.time())
+            TOKEN_REFRESHES.inc(self.service_name, trigger, 'failed')
+            return False
+
+
+class ProactiveRefresher:
+    """Daemon thread renewing watched services' tokens before they expire."""
+
+    def __init__(self, lead: float = TOKEN_REFRESH_LEAD, interval: float = TOKEN_REFRESH_INTERVAL):
+        self.lead = lead
+        self.interval = interval
+        self._watched: 'weakref.WeakSet' = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, api) -> None:
+        """Keep ``api``'s token fresh; starts the thread on first use."""
+        with self._lock:
+            self._watched.add(api)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='token-refresher', daemon=True)
+                self._thread.start()
+
+    def refresh_due(self) -> int:
+        """Refresh every watched token inside the lead window; return how many were renewed."""
+        with self._lock:
+            apis = list(self._watched)
+        renewed = 0
+        for api in apis:
+            tokens = api._tokens
+            if not tokens.get('refresh_token') or not api._token_expiring(self.lead):
+                continue
+            try:
+                if api._refresh_single_flight(trigger='proactive'):
+                    renewed += 1
+                    print(f"🔄 {api.service_name}: Token renewed ahead of expiry")
+            except Exception as e:
+                print(f"⚠️ {api.service_name}: Background token refresh failed: {e}")
+        return renewed
+
+    def _run(self) -> None:
+        while True:
+            self.refresh_due()
+            time.sleep(self.interval)
+
+
+_refresher = ProactiveRefresher()
+
+
+def watch_token(api) -> None:
+    """Register ``api`` with the process-wide proactive refresher."""
+    if os.environ.get('TOKEN_REFRESH', 'on') != 'off':
+        _refresher.watch(api)
@@ -0,0 +1,208 @@
+"""Persistent OAuth token storage.
+
+Each API keeps its tokens in memory (``self._tokens``); that copy is
+authoritative. ``_save_tokens`` hands a snapshot to the service's
+``TokenStore``, which coalesces saves made within ``TOKEN_SAVE_DEBOUNCE``
+seconds and writes the latest one from a background timer. Pending snapshots
+are flushed at interpreter exit.
+
+Backends:
+
+- ``FileTokenStore``: ``auth/<service>_tokens.json``, written to a temp file,
+  fsynced and renamed over the original, so a crash mid-write leaves the old
+  file intact. An ``fcntl`` lock on ``<file>.lock`` serialises readers and
+  writers across worker processes.
+- ``SqliteTokenStore``: one ``tokens`` table in ``TOKEN_STORE_PATH``
+  (default ``auth/tokens.sqlite``), transactional writes, WAL mode.
+
+Select with ``TOKEN_STORE=file|sqlite``. ``load_if_changed()`` lets a worker
+pick up tokens another worker refreshed.
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, writes stay atomic
+    fcntl = None
+
+TOKEN_SAVE_DEBOUNCE = float(os.environ.get('TOKEN_SAVE_DEBOUNCE', 0.5))
+DEFAULT_SQLITE_PATH = os.environ.get('TOKEN_STORE_PATH', 'auth/tokens.sqlite')
+
+_stores: 'weakref.WeakSet[TokenStore]' = weakref.WeakSet()
+
+
+class TokenStore(ABC):
+    """Debounced background persistence over a ``_read`` / ``_write`` backend."""
+
+    def __init__(self, debounce: float = TOKEN_SAVE_DEBOUNCE):
+        self.debounce = debounce
+        self._pending: Optional[Dict[str, Any]] = None
+        self._timer: Optional[threading.Timer] = None
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._seen_version: Any = None
+        _stores.add(self)
+
+    def load(self) -> Dict[str, Any]:
+        """Read the stored tokens ({} when none)."""
+        tokens, self._seen_version = self._read()
+        return tokens
+
+    def load_if_changed(self) -> Optional[Dict[str, Any]]:
+        """Stored tokens if another writer changed them since our last read or write."""
+        if self._pending is not None:
+            return None  # our unsaved snapshot is newer than anything stored
+        version = self._version()
+        if version is None or version == self._seen_version:
+            return None
+        return self.load()
+
+    def save(self, tokens: Dict[str, Any]) -> None:
+        """Schedule ``tokens`` to be written; later saves in the window replace it."""
+        with self._pending_lock:
+            self._pending = dict(tokens)
+            if self._timer is None:
+                self._timer = threading.Timer(self.debounce, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """Write the pending snapshot now, if any."""
+        with self._write_lock:
+            with self._pending_lock:
+                tokens, self._pending = self._pending, None
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if tokens is None:
+                return
+            try:
+                self._seen_version = self._write(tokens)
+            except Exception as e:
+                print(f"Warning: Could not save tokens: {e}")
+
+    @abstractmethod
+    def _read(self) -> Tuple[Dict[str, Any], Any]:
+        """Stored tokens and their version."""
+        pass
+
+    @abstractmethod
+    def _write(self, tokens: Dict[str, Any]) -> Any:
+        """Persist ``tokens``; return the new version."""
+        pass
+
+    @abstractmethod
+    def _version(self) -> Any:
+        """Current stored version (None when nothing is stored)."""
+        pass
+
+
+class FileTokenStore(TokenStore):
+    """One JSON file per service, replaced atomically under a file lock."""
+
+    def __init__(self, path: Path, debounce: float = TOKEN_SAVE_DEBOUNCE):
+        super().__init__(debounce)
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + '.lock')
+
+    @contextmanager
+    def _locked(self, mode: int):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _version(self) -> Optional[Tuple[int, int]]:
+        # Every write renames a new file in, so the inode changes even when the mtime tick doesn't
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _read(self) -> Tuple[Dict[str, Any], Any]:
+        if not self.path.exists():
+            return {}, None
+        with self._locked(fcntl.LOCK_SH if fcntl else 0):
+            with open(self.path, 'r') as f:
+                return json.load(f), self._version()
+
+    def _write(self, tokens: Dict[str, Any]) -> Any:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f'.{self.path.name}.{os.getpid()}.tmp')
+        with self._locked(fcntl.LOCK_EX if fcntl else 0):
+            try:
+                with open(temp_path, 'w') as f:
+                    json.dump(tokens, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except BaseException:
+                temp_path.unlink(missing_ok=True)
+                raise
+            return self._version()
+
+
+class SqliteTokenStore(TokenStore):
+    """All services' tokens in one SQLite table, keyed by service name."""
+
+    def __init__(self, service_name: str, path: str = DEFAULT_SQLITE_PATH,
+                 debounce: float = TOKEN_SAVE_DEBOUNCE):
+        super().__init__(debounce)
+        self.service_name = service_name
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5)
+        self._conn_lock = threading.Lock()
+        with self._conn_lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS tokens ('
+                               'service TEXT PRIMARY KEY, value TEXT, updated_at REAL)')
+
+    def _version(self) -> Optional[float]:
+        with self._conn_lock:
+            row = self._conn.execute('SELECT updated_at FROM tokens WHERE service = ?',
+                                     (self.service_name,)).fetchone()
+        return row[0] if row else None
+
+    def _read(self) -> Tuple[Dict[str, Any], Any]:
+        with self._conn_lock:
+            row = self._conn.execute('SELECT value, updated_at FROM tokens WHERE service = ?',
+                                     (self.service_name,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else ({}, None)
+
+    def _write(self, tokens: Dict[str, Any]) -> Any:
+        updated_at = time.time()
+        with self._conn_lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO tokens VALUES (?, ?, ?)',
+                               (self.service_name, json.dumps(tokens), updated_at))
+        return updated_at
+
+
+def open_token_store(service_name: str, file_path: Path) -> TokenStore:
+    """Token store for one service, per ``TOKEN_STORE`` (default: JSON file)."""
+    if os.environ.get('TOKEN_STORE', 'file') == 'sqlite':
+        return SqliteTokenStore(service_name)
+    return FileTokenStore(file_path)
+
+
+@atexit.register
+def flush_token_stores() -> None:
+    """Write every pending snapshot (runs at interpreter exit)."""
+    for store in list(_stores):
+        store.flush()
@@ -0,0 +1,7 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from api_server import app
+
+__all__ = ['app']